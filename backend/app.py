@@ -1,80 +1,154 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from database import init_db, execute_sql_query
-from nl_to_sql import generate_sql_from_prompt, validate_sql_query
 from dotenv import load_dotenv
-import os
 
-# Load environment variables
+# Load environment variables before importing modules that read their configuration at import time
 load_dotenv()
 
+import io
+import time
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask_cors import CORS
+from database import init_db, get_pool, result_cache, plan_cache
+from nl_to_sql import warm_engine
+from pagination import fetch_page
+from response_format import compress_response
+from index_advisor import index_advisor
+from sessions import session_store
+from sql_templates import template_matcher
+from metrics import (
+    METRICS_SERVER_TIMING, timed, start_request, request_timings, observe_request, render_metrics,
+    server_timing_header, result_rows, response_bytes
+)
+from bulk_load import BulkLoadError, authorize_load, bulk_load, format_for_content_type, read_records
+from query_service import (
+    QueryError, sql_cache, coalescing_stats, parse_query_request, generate_sql, check_query_result,
+    build_query_response, parse_page_request, build_page_response, stream_query_results, stream_query_events,
+    parse_batch_request, generate_batch_sql, batch_executor, execute_batch_item, build_batch_response
+)
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend requests
 
-# Initialize database on startup
-init_db()
+# The schema is migrated before serving (flask --app app init-db, or the gunicorn
+# on_starting hook) and the NL to SQL engine is built on first use, so importing
+# this module stays cheap for every worker and test process
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the database schema and seed the sample data"""
+    result = init_db()
+    print(f"Database schema at version {result['version']}")
 
 @app.route('/query', methods=['POST'])
 def query():
     """
     Endpoint to convert natural language to SQL, execute query, and return results
     Accepts conversation history for context-aware responses
+    Set "stream": true to receive the results as NDJSON batches instead of a single JSON body
+    Set "format" to "rows" or "columnar" for a compact layout without repeated column names
+    Results are paginated: "page_size" rows are returned with a cursor for /query/page
     """
     try:
         # Get the message and conversation history from the request
-        data = request.get_json()
-        user_message = data.get('message', '')
-        conversation_history = data.get('history', [])  # List of previous messages
-        
-        if not user_message:
-            return jsonify({
-                'error': 'No message provided',
-                'status': 'error'
-            }), 400
+        query_request = parse_query_request(request.get_json())
         
-        # Convert natural language to SQL with conversation history
-        sql_result = generate_sql_from_prompt(user_message, conversation_history)
+        # Convert natural language to SQL with conversation history,
+        # reusing a previously generated query for the same question
+        sql_query, explanation, cache_hit = generate_sql(query_request)
         
-        if not sql_result['success']:
-            return jsonify({
-                'error': f"Failed to generate SQL: {sql_result.get('error', 'Unknown error')}",
-                'status': 'error'
-            }), 500
+        # Stream rows to the client as they are fetched
+        if query_request['stream']:
+            return Response(
+                stream_with_context(stream_query_results(sql_query, explanation, query_request['page_size'], cache_hit)),
+                mimetype='application/x-ndjson'
+            )
         
-        sql_query = sql_result['sql']
-        explanation = sql_result['explanation']
+        # Execute the first page of the SQL query
+        with timed('execute'):
+            query_result = fetch_page(sql_query, query_request['page_size'])
+        check_query_result(query_result, sql_query, explanation)
+        result_rows.observe(query_result['row_count'], '/query')
         
-        # Validate the SQL query
-        is_valid, validation_error = validate_sql_query(sql_query)
-        if not is_valid:
-            return jsonify({
-                'error': f"Invalid query: {validation_error}",
-                'status': 'error'
-            }), 400
+        # Return results
+        with timed('encode'):
+            response = jsonify(build_query_response(query_request, sql_query, explanation, cache_hit, query_result))
+        response_bytes.observe(response.content_length, '/query')
+        return response, 200
+    
+    except QueryError as e:
+        return jsonify(e.to_dict()), e.status_code
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/query/events', methods=['POST'])
+def query_events():
+    """
+    Server-sent events version of /query that reports progress as it happens
+    Streams the model's tokens, starts the query as soon as the generated SQL is
+    complete and validated, then pushes rows; takes the same body as /query
+    """
+    try:
+        query_request = parse_query_request(request.get_json())
+    except QueryError as e:
+        return jsonify(e.to_dict()), e.status_code
+    
+    return Response(
+        stream_with_context(stream_query_events(query_request)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    """
+    Answer a list of questions in one request
+    LLM calls run concurrently and the first page of each question's SQL runs on the
+    connection pool; every item carries its own result or error, in request order
+    """
+    try:
+        items = parse_batch_request(request.get_json())
+        outcomes = generate_batch_sql(items)
         
-        # Execute the SQL query
-        query_result = execute_sql_query(sql_query)
+        with timed('execute'):
+            results = list(batch_executor.map(execute_batch_item, range(len(items)), items, outcomes))
         
-        if not query_result['success']:
-            return jsonify({
-                'error': f"Query execution failed: {query_result.get('error', 'Unknown error')}",
-                'status': 'error',
-                'sql': sql_query,
-                'explanation': explanation
-            }), 500
+        with timed('encode'):
+            response = jsonify(build_batch_response(results))
+        response_bytes.observe(response.content_length, '/query/batch')
+        return response, 200
+    
+    except QueryError as e:
+        return jsonify(e.to_dict()), e.status_code
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/query/page', methods=['POST'])
+def query_page():
+    """
+    Fetch the next page of a previous /query result using its cursor
+    Re-runs the already validated SQL without calling the LLM again
+    """
+    try:
+        page_request = parse_page_request(request.get_json())
         
-        # Return results
-        response = {
-            'status': 'success',
-            'user_message': user_message,
-            'sql': sql_query,
-            'explanation': explanation,
-            'data': query_result['data'],
-            'columns': query_result['columns'],
-            'row_count': query_result['row_count']
-        }
+        with timed('execute'):
+            query_result = fetch_page(page_request['sql'], page_request['page_size'], page_request['offset'])
+        check_query_result(query_result, page_request['sql'])
+        result_rows.observe(query_result['row_count'], '/query/page')
         
-        return jsonify(response), 200
+        with timed('encode'):
+            response = jsonify(build_page_response(page_request, query_result))
+        response_bytes.observe(response.content_length, '/query/page')
+        return response, 200
+    
+    except QueryError as e:
+        return jsonify(e.to_dict()), e.status_code
     
     except Exception as e:
         return jsonify({
@@ -82,10 +156,92 @@ def query():
             'status': 'error'
         }), 500
 
+@app.before_request
+def start_timing():
+    """Start collecting stage timings for this request"""
+    g.request_start = time.perf_counter()
+    start_request()
+
+@app.after_request
+def record_timing(response):
+    """Record request metrics and add the optional Server-Timing header"""
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_request(endpoint, response.status_code, elapsed)
+    if METRICS_SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing_header(request_timings() + [('total', elapsed)])
+    return response
+
+@app.after_request
+def compress(response):
+    """Apply optional gzip/brotli compression based on Accept-Encoding"""
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage latency, row count and payload size histograms in the Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4'), 200
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({'status': 'healthy'}), 200
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the NL to SQL cache"""
+    return jsonify(sql_cache.stats()), 200
+
+@app.route('/coalesce/stats', methods=['GET'])
+def coalesce_stats():
+    """How many LLM calls and SQL executions were shared with an identical in-flight request"""
+    return jsonify(coalescing_stats()), 200
+
+@app.route('/templates/stats', methods=['GET'])
+def templates_stats():
+    """How many questions were answered by a local SQL template instead of the LLM"""
+    return jsonify(template_matcher.stats()), 200
+
+@app.route('/sessions/stats', methods=['GET'])
+def sessions_stats():
+    """Server-side conversation session counts, memory use and evictions"""
+    return jsonify(session_store.stats()), 200
+
+@app.route('/db/stats', methods=['GET'])
+def db_stats():
+    """Connection pool, result cache and plan cache metrics"""
+    return jsonify({
+        'pool': get_pool().stats(),
+        'result_cache': result_cache.stats(),
+        'plan_cache': plan_cache.stats()
+    }), 200
+
+@app.route('/db/indexes', methods=['GET'])
+def db_indexes():
+    """Existing indexes and the covering indexes suggested for frequently scanned tables"""
+    return jsonify(index_advisor.report()), 200
+
+@app.route('/admin/load/<table>', methods=['POST'])
+def admin_load(table):
+    """
+    Stream a CSV (text/csv) or JSONL (application/x-ndjson) request body into a table
+    Requires "Authorization: Bearer <BULK_LOAD_TOKEN>"; add ?replace=1 to replace the existing rows
+    """
+    if not authorize_load(request.headers.get('Authorization')):
+        return jsonify({'error': 'Bulk loading is disabled or the token is wrong', 'status': 'error'}), 403
+    
+    try:
+        fmt = format_for_content_type(request.content_type)
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        result = bulk_load({table: read_records(lines, fmt)}, replace=request.args.get('replace') == '1')
+    except BulkLoadError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+    
+    if not result['success']:
+        return jsonify({'status': 'error', **result}), 400
+    return jsonify({'status': 'success', **result}), 200
+
 if __name__ == '__main__':
+    init_db()
+    warm_engine()
     app.run(debug=True, host='0.0.0.0', port=5001)
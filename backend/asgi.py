@@ -0,0 +1,354 @@
+"""
+ASGI entry point for high-concurrency serving
+
+Serves the same /query API as app.py, but awaits the Gemini call on the event
+loop (LangChain's ainvoke path) instead of pinning a worker thread for the whole
+round trip. SQLite work runs in a bounded thread pool, and requests beyond the
+concurrency limit are rejected with 429 instead of queueing without bound.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+from dotenv import load_dotenv
+
+# Load environment variables before importing modules that read their configuration at import time
+load_dotenv()
+
+import os
+import time
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from database import init_db, get_pool, result_cache, plan_cache, DB_POOL_SIZE
+from nl_to_sql import warm_engine
+from pagination import fetch_page
+from response_format import RESPONSE_COMPRESSION, RESPONSE_COMPRESSION_MIN_BYTES
+from index_advisor import index_advisor
+from sessions import session_store
+from sql_templates import template_matcher
+from metrics import (
+    METRICS_SERVER_TIMING, timed, start_request, request_timings, observe_request, render_metrics,
+    server_timing_header, result_rows, response_bytes
+)
+from bulk_load import BulkLoadError, authorize_load, bulk_load, format_for_content_type, read_records, text_lines
+from query_service import (
+    QueryError, sql_cache, coalescing_stats, run_in_executor, iterate_in_executor, iterate_from_loop, parse_query_request,
+    agenerate_sql, check_query_result,
+    build_query_response, parse_page_request, build_page_response, stream_query_results, astream_query_events,
+    parse_batch_request, agenerate_batch_sql, execute_batch_item, build_batch_response
+)
+
+# Maximum /query requests in flight (mostly waiting on the LLM) before returning 429
+ASYNC_MAX_CONCURRENCY = int(os.getenv('ASYNC_MAX_CONCURRENCY', '256'))
+# Threads running SQLite queries; more than the connection pool size would only wait on it
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', str(DB_POOL_SIZE)))
+
+db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix='sqlite')
+
+class AdmissionControl:
+    """
+    Non-blocking concurrency limit for the event loop
+    
+    All calls happen on the loop thread, so plain counters are safe.
+    """
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+    
+    def try_acquire(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+    
+    def release(self):
+        self.in_flight -= 1
+    
+    def stats(self):
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'db_threads': ASYNC_DB_THREADS,
+        }
+
+admission = AdmissionControl(ASYNC_MAX_CONCURRENCY)
+
+def run_in_db_thread(fn, *args):
+    """Run a blocking database call in the bounded SQLite thread pool"""
+    return run_in_executor(db_executor, fn, *args)
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that holds its request's admission slot until the response ends
+
+    The slot is released around the whole response rather than inside the body
+    iterator: a client that disconnects before Starlette starts iterating
+    leaves the iterator unstarted, and its cleanup would never run.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release()
+            await self.body_iterator.aclose()
+
+def error_response(e):
+    return JSONResponse(e.to_dict(), status_code=e.status_code)
+
+def overloaded_response():
+    return JSONResponse({
+        'error': 'Server is at capacity, please retry shortly',
+        'status': 'error'
+    }, status_code=429, headers={'Retry-After': '1'})
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+async def query(request):
+    """Async /query: same request and response format as the Flask endpoint"""
+    if not admission.try_acquire():
+        return overloaded_response()
+    streaming = False
+    try:
+        query_request = parse_query_request(await read_json(request))
+        sql_query, explanation, cache_hit = await agenerate_sql(query_request, db_executor)
+        
+        if query_request['stream']:
+            # Batches are fetched in the SQLite thread pool and the admission slot is held until the stream ends
+            streaming = True
+            return AdmittedStreamingResponse(
+                iterate_in_executor(
+                    db_executor, stream_query_results(sql_query, explanation, query_request['page_size'], cache_hit)
+                ),
+                media_type='application/x-ndjson'
+            )
+        
+        with timed('execute'):
+            query_result = await run_in_db_thread(fetch_page, sql_query, query_request['page_size'])
+        check_query_result(query_result, sql_query, explanation)
+        result_rows.observe(query_result['row_count'], '/query')
+        
+        with timed('encode'):
+            response = JSONResponse(build_query_response(query_request, sql_query, explanation, cache_hit, query_result))
+        response_bytes.observe(len(response.body), '/query')
+        return response
+    
+    except QueryError as e:
+        return error_response(e)
+    
+    except Exception as e:
+        return JSONResponse({'error': str(e), 'status': 'error'}, status_code=500)
+    
+    finally:
+        if not streaming:
+            admission.release()
+
+async def query_events(request):
+    """Async /query/events: tokens are awaited on the event loop and rows fetched in the SQLite thread pool"""
+    if not admission.try_acquire():
+        return overloaded_response()
+    try:
+        query_request = parse_query_request(await read_json(request))
+    except QueryError as e:
+        admission.release()
+        return error_response(e)
+    
+    # The LLM call runs while the body streams, so the admission slot is held until it ends
+    return AdmittedStreamingResponse(
+        astream_query_events(query_request, db_executor),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+async def query_batch(request):
+    """Async /query/batch: LLM calls fan out on the event loop, pages run in the SQLite threads"""
+    if not admission.try_acquire():
+        return overloaded_response()
+    try:
+        items = parse_batch_request(await read_json(request))
+        outcomes = await agenerate_batch_sql(items, db_executor)
+        
+        with timed('execute'):
+            results = await asyncio.gather(*(
+                run_in_db_thread(execute_batch_item, index, item, outcome)
+                for index, (item, outcome) in enumerate(zip(items, outcomes))
+            ))
+        
+        with timed('encode'):
+            response = JSONResponse(build_batch_response(list(results)))
+        response_bytes.observe(len(response.body), '/query/batch')
+        return response
+    
+    except QueryError as e:
+        return error_response(e)
+    
+    except Exception as e:
+        return JSONResponse({'error': str(e), 'status': 'error'}, status_code=500)
+    
+    finally:
+        admission.release()
+
+async def query_page(request):
+    """Async /query/page"""
+    if not admission.try_acquire():
+        return overloaded_response()
+    try:
+        page_request = parse_page_request(await read_json(request))
+        with timed('execute'):
+            query_result = await run_in_db_thread(
+                fetch_page, page_request['sql'], page_request['page_size'], page_request['offset']
+            )
+        check_query_result(query_result, page_request['sql'])
+        result_rows.observe(query_result['row_count'], '/query/page')
+        
+        with timed('encode'):
+            response = JSONResponse(build_page_response(page_request, query_result))
+        response_bytes.observe(len(response.body), '/query/page')
+        return response
+    
+    except QueryError as e:
+        return error_response(e)
+    
+    except Exception as e:
+        return JSONResponse({'error': str(e), 'status': 'error'}, status_code=500)
+    
+    finally:
+        admission.release()
+
+async def metrics(request):
+    """Stage latency, row count and payload size histograms in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
+async def health(request):
+    """Health check endpoint"""
+    return JSONResponse({'status': 'healthy'})
+
+async def cache_stats(request):
+    """Hit/miss counters for the NL to SQL cache"""
+    return JSONResponse(sql_cache.stats())
+
+async def coalesce_stats(request):
+    """How many LLM calls and SQL executions were shared with an identical in-flight request"""
+    return JSONResponse(coalescing_stats())
+
+async def templates_stats(request):
+    """How many questions were answered by a local SQL template instead of the LLM"""
+    return JSONResponse(template_matcher.stats())
+
+async def sessions_stats(request):
+    """Server-side conversation session counts, memory use and evictions"""
+    return JSONResponse(session_store.stats())
+
+async def db_stats(request):
+    """Connection pool and concurrency limit metrics"""
+    return JSONResponse({
+        'pool': get_pool().stats(),
+        'result_cache': result_cache.stats(),
+        'plan_cache': plan_cache.stats(),
+        'admission': admission.stats()
+    })
+
+async def db_indexes(request):
+    """Existing indexes and the covering indexes suggested for frequently scanned tables"""
+    # Explaining every recorded query touches the database, so keep it off the event loop
+    return JSONResponse(await run_in_db_thread(index_advisor.report))
+
+async def admin_load(request):
+    """
+    Load a CSV (text/csv) or JSONL (application/x-ndjson) request body into a table
+    Requires "Authorization: Bearer <BULK_LOAD_TOKEN>"; add ?replace=1 to replace the existing rows
+    The body is streamed into the load from the db thread rather than read into memory
+    """
+    if not authorize_load(request.headers.get('authorization')):
+        return JSONResponse({'error': 'Bulk loading is disabled or the token is wrong', 'status': 'error'}, status_code=403)
+    
+    try:
+        fmt = format_for_content_type(request.headers.get('content-type'))
+        chunks = iterate_from_loop(request.stream(), asyncio.get_running_loop())
+        sources = {request.path_params['table']: read_records(text_lines(chunks), fmt)}
+        result = await run_in_db_thread(partial(bulk_load, sources, replace=request.query_params.get('replace') == '1'))
+    except BulkLoadError as e:
+        return JSONResponse({'error': str(e), 'status': 'error'}, status_code=400)
+    
+    if not result['success']:
+        return JSONResponse({'status': 'error', **result}, status_code=400)
+    return JSONResponse({'status': 'success', **result})
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Migrate the schema (one PRAGMA read when it is current) and build the NL to
+    # SQL engine in the background, so /health answers while LangChain loads
+    init_db()
+    warm_engine()
+    yield
+    db_executor.shutdown(wait=False)
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Record request metrics and add the optional Server-Timing header"""
+    
+    async def dispatch(self, request, call_next):
+        start = time.perf_counter()
+        # The endpoint runs in a copy of this context, so stages it records land in this list
+        start_request()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - start
+        route = request.scope.get('route')
+        observe_request(route.path if route else 'unmatched', response.status_code, elapsed)
+        if METRICS_SERVER_TIMING:
+            response.headers['Server-Timing'] = server_timing_header(request_timings() + [('total', elapsed)])
+        return response
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZip responses, except server-sent events, which must reach the client one event at a time"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == '/query/events':
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+middleware = [
+    Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+    Middleware(MetricsMiddleware),
+]
+if RESPONSE_COMPRESSION:
+    middleware.append(Middleware(CompressionMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_BYTES))
+
+app = Starlette(
+    routes=[
+        Route('/query', query, methods=['POST']),
+        Route('/query/events', query_events, methods=['POST']),
+        Route('/query/batch', query_batch, methods=['POST']),
+        Route('/query/page', query_page, methods=['POST']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/health', health, methods=['GET']),
+        Route('/cache/stats', cache_stats, methods=['GET']),
+        Route('/coalesce/stats', coalesce_stats, methods=['GET']),
+        Route('/templates/stats', templates_stats, methods=['GET']),
+        Route('/sessions/stats', sessions_stats, methods=['GET']),
+        Route('/db/stats', db_stats, methods=['GET']),
+        Route('/db/indexes', db_indexes, methods=['GET']),
+        Route('/admin/load/{table}', admin_load, methods=['POST']),
+    ],
+    middleware=middleware,
+    lifespan=lifespan,
+)
@@ -0,0 +1,64 @@
+"""
+Benchmark: N serial /query round trips vs one /query/batch request
+
+Uses the Flask app with a stub LLM that sleeps --latency seconds per call, so
+the serial run costs about N LLM latencies while the batch fans the calls out
+and should take about one (with N <= QUERY_BATCH_CONCURRENCY). The SQL and
+result caches and the SQL templates are disabled so every question reaches
+the LLM.
+
+Usage:
+    python benchmarks/bench_batch.py [--questions 50] [--latency 0.2]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.2, help='Simulated LLM latency in seconds')
+    args = parser.parse_args()
+
+    # Configuration is read at import time, so set it before importing the app
+    os.environ['QUERY_CACHE_MAX_ENTRIES'] = '0'
+    os.environ['DB_RESULT_CACHE_BYTES'] = '0'
+    os.environ['SQL_TEMPLATES'] = 'off'
+
+    from stub_llm import StubChatModel, few_shot_answers
+    from nl_to_sql import FEW_SHOT_EXAMPLES, NLToSQLEngine, set_engine
+    from database import init_db
+    from query_service import QUERY_BATCH_CONCURRENCY
+
+    init_db()
+    set_engine(NLToSQLEngine(llm=StubChatModel(latency=args.latency, answers=few_shot_answers())))
+    from app import app as flask_app
+
+    # Few-shot questions get their example SQL; the numbered repeats get the stub's default query
+    examples = [question for question, _ in FEW_SHOT_EXAMPLES]
+    questions = [
+        examples[i] if i < len(examples) else f"{examples[i % len(examples)]} (report {i})"
+        for i in range(args.questions)
+    ]
+
+    with flask_app.test_client() as client:
+        start = time.perf_counter()
+        serial_errors = sum(
+            1 for question in questions if client.post('/query', json={'message': question}).status_code != 200
+        )
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        body = client.post('/query/batch', json={'questions': questions}).get_json()
+        batch = time.perf_counter() - start
+
+    print(f"{args.questions} questions, {args.latency * 1000:.0f}ms stub LLM latency, "
+          f"batch concurrency {QUERY_BATCH_CONCURRENCY}\n")
+    print(f"serial /query: {serial:>7.2f}s  ({serial_errors} errors)")
+    print(f"/query/batch:  {batch:>7.2f}s  ({body['failed']} errors)  {serial / batch:.1f}x faster")
+
+if __name__ == '__main__':
+    main()
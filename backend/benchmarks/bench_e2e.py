@@ -0,0 +1,187 @@
+"""
+End-to-end benchmark of the /query pipeline with a deterministic stub LLM
+
+Gemini is replaced by StubChatModel answering each few-shot question from the
+prompt with that example's SQL, so everything else (prompt build, chain,
+validation, cost guard, SQLite, pagination, JSON) runs for real and offline.
+
+Two parts:
+  - load: drives POST /query on the Flask app through its test client at each
+    --concurrency level and reports p50/p95/p99 latency, throughput and peak RSS
+  - stages: times each pipeline stage on its own (prompt build, LLM call,
+    validation, execution, JSON encoding) over the same questions
+
+The SQL and result caches and the SQL templates are disabled unless --warm
+is given, so every request pays for the full pipeline. Results are written as JSON (to stdout or
+--output) so runs can be compared; a summary goes to stderr.
+
+Usage:
+    python benchmarks/bench_e2e.py [--concurrency 1 4 16] [--requests 300] [--latency 0] [--warm]
+                                   [--db /tmp/movies-1m.db] [--output results.json]
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import resource
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='Concurrent clients per level')
+    parser.add_argument('--requests', type=int, default=300, help='Requests per concurrency level')
+    parser.add_argument('--stage-repeat', type=int, default=20, help='Timed runs of each stage per question')
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated LLM latency in seconds')
+    parser.add_argument('--warm', action='store_true', help='Keep the SQL and result caches and the SQL templates enabled')
+    parser.add_argument('--db', help='Database file to query (e.g. one generated by bulk_load.py --synthetic)')
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    return parser.parse_args()
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize_ms(seconds):
+    values = sorted(value * 1000 for value in seconds)
+    return {
+        'p50': round(percentile(values, 0.50), 3),
+        'p95': round(percentile(values, 0.95), 3),
+        'p99': round(percentile(values, 0.99), 3),
+        'mean': round(sum(values) / len(values), 3) if values else 0.0,
+        'max': round(values[-1], 3) if values else 0.0,
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def run_load(flask_app, questions, concurrency, total):
+    """Send total /query requests from `concurrency` threads; returns the level's summary"""
+    def send(i):
+        with flask_app.test_client() as client:
+            start = time.perf_counter()
+            response = client.post('/query', json={'message': questions[i % len(questions)]})
+            response.get_data()
+            return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, range(total)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': sum(1 for _, status in results if status != 200),
+        'throughput_rps': round(total / elapsed, 1),
+        'latency_ms': summarize_ms([latency for latency, _ in results]),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def run_stages(engine, questions, repeat):
+    """Time each pipeline stage on its own, `repeat` times per question"""
+    from nl_to_sql import validate_sql_query
+    from database import check_query_cost
+    from full_text import rewrite_like_predicates
+    from pagination import fetch_page, paginate_sql, QUERY_PAGE_SIZE
+    from query_service import build_query_response
+
+    timings = {'prompt_build': [], 'llm_call': [], 'validation': [], 'execution': [], 'json_encode': []}
+
+    def timed(stage, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    for question in questions:
+        query_request = {'message': question, 'history': [], 'format': 'records', 'page_size': QUERY_PAGE_SIZE}
+        for _ in range(repeat):
+            messages = timed('prompt_build', lambda: engine.prompt_template.format_messages(**engine.build_inputs(question)))
+            parsed = timed('llm_call', lambda: engine.output_parser.parse(engine.llm.invoke(messages).content))
+            sql = parsed['sql']
+
+            def validate():
+                is_valid, error = validate_sql_query(sql)
+                if not is_valid:
+                    raise RuntimeError(f"Stub SQL failed validation: {error}")
+                checked = rewrite_like_predicates(sql)
+                check_query_cost(paginate_sql(checked, QUERY_PAGE_SIZE, 0))
+                return checked
+            sql = timed('validation', validate)
+
+            result = timed('execution', lambda: fetch_page(sql, QUERY_PAGE_SIZE))
+            # Flask's jsonify uses the same json module under the hood
+            timed('json_encode', lambda: json.dumps(build_query_response(query_request, sql, parsed['explanation'], False, result)))
+
+    return {stage: summarize_ms(values) for stage, values in timings.items()}
+
+def main():
+    args = parse_args()
+
+    # Configuration is read at import time, so set it before importing the app
+    if args.db:
+        os.environ['DATABASE_PATH'] = os.path.abspath(args.db)
+    if not args.warm:
+        os.environ['QUERY_CACHE_MAX_ENTRIES'] = '0'
+        os.environ['DB_RESULT_CACHE_BYTES'] = '0'
+        os.environ['SQL_TEMPLATES'] = 'off'
+
+    from stub_llm import StubChatModel, few_shot_answers
+    from nl_to_sql import FEW_SHOT_EXAMPLES, NLToSQLEngine, set_engine
+    from database import init_db
+
+    init_db()
+    engine = NLToSQLEngine(llm=StubChatModel(latency=args.latency, answers=few_shot_answers()))
+    set_engine(engine)
+    from app import app as flask_app
+
+    questions = [question for question, _ in FEW_SHOT_EXAMPLES]
+    levels = []
+    for concurrency in args.concurrency:
+        level = run_load(flask_app, questions, concurrency, args.requests)
+        levels.append(level)
+        latency = level['latency_ms']
+        print(f"concurrency {concurrency:>3}: {level['throughput_rps']:>8.1f} req/s  p50 {latency['p50']:.1f}ms  "
+              f"p95 {latency['p95']:.1f}ms  p99 {latency['p99']:.1f}ms  errors {level['errors']}  "
+              f"rss {level['peak_rss_mb']}MB", file=sys.stderr)
+
+    stages = run_stages(engine, questions, args.stage_repeat)
+    for stage, summary in stages.items():
+        print(f"{stage:<13} p50 {summary['p50']:>8.3f}ms  p95 {summary['p95']:>8.3f}ms", file=sys.stderr)
+
+    from database import DATABASE_PATH
+    results = {
+        'benchmark': 'e2e',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {
+            'requests_per_level': args.requests,
+            'stage_repeat': args.stage_repeat,
+            'llm_latency_s': args.latency,
+            'caches': 'warm' if args.warm else 'disabled',
+            'database': DATABASE_PATH,
+            'questions': len(questions),
+        },
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'load': levels,
+        'stages_ms': stages,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: payload size and encode time of the /query result formats
+
+Encodes synthetic movie-style result sets at 10k and 100k rows in each
+response format ('records', 'rows', 'columnar') and reports JSON size, encode
+time, and compressed size with gzip (and brotli, if installed).
+
+Usage:
+    python benchmarks/bench_encoding.py [--rows 10000 100000] [--repeat 3]
+"""
+import os
+import sys
+import gzip
+import json
+import random
+import argparse
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_format import RESPONSE_FORMATS, encode_rows, brotli
+
+COLUMNS = ['title', 'year', 'genre', 'total_revenue', 'imdb_rating']
+GENRES = ['Action', 'Crime', 'Drama', 'Fantasy', 'Sci-Fi', 'Thriller', 'War']
+
+def synthetic_rows(count, seed=42):
+    """Rows shaped like a movies JOIN box_office JOIN ratings result"""
+    rng = random.Random(seed)
+    return [
+        (f"Movie {i}", rng.randint(1950, 2024), rng.choice(GENRES),
+         round(rng.uniform(1, 3000), 1), round(rng.uniform(1, 10), 1))
+        for i in range(count)
+    ]
+
+def best_of(repeat, fn):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench(row_count, repeat):
+    rows = synthetic_rows(row_count)
+    print(f"\n{row_count:,} rows")
+    print(f"{'format':<10} {'encode ms':>10} {'json KB':>10} {'gzip KB':>10} {'gzip ms':>9}"
+          + (f" {'br KB':>9} {'br ms':>8}" if brotli else ''))
+
+    for response_format in RESPONSE_FORMATS:
+        def encode():
+            body = {'columns': COLUMNS, 'row_count': row_count, **encode_rows(COLUMNS, rows, response_format)}
+            return json.dumps(body).encode('utf-8')
+
+        encode_time, payload = best_of(repeat, encode)
+        gzip_time, gzipped = best_of(repeat, lambda: gzip.compress(payload, compresslevel=5))
+        line = (f"{response_format:<10} {encode_time * 1000:>10.1f} {len(payload) / 1024:>10.1f}"
+                f" {len(gzipped) / 1024:>10.1f} {gzip_time * 1000:>9.1f}")
+        if brotli:
+            br_time, br = best_of(repeat, lambda: brotli.compress(payload, quality=4))
+            line += f" {len(br) / 1024:>9.1f} {br_time * 1000:>8.1f}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for row_count in args.rows:
+        bench(row_count, args.repeat)
+
+if __name__ == '__main__':
+    main()
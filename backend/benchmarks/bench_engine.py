@@ -0,0 +1,60 @@
+"""
+Micro-benchmark: per-request overhead of building the NL to SQL chain
+
+Compares the old behaviour (client, schema, parser and prompt rebuilt on every
+call) with a single shared NLToSQLEngine, using a stubbed LLM so only local
+overhead is measured.
+
+Usage:
+    python benchmarks/bench_engine.py [--iterations 500] [--include-client]
+"""
+import os
+import sys
+import argparse
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_llm import StubChatModel
+from nl_to_sql import NLToSQLEngine, create_llm
+
+QUESTION = "Top rated movies"
+
+def per_request(iterations, include_client):
+    """Build a fresh engine for every call, as generate_sql_from_prompt used to"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        llm = create_llm() if include_client else StubChatModel()
+        engine = NLToSQLEngine(llm=llm)
+        if not include_client:
+            engine.generate(QUESTION)
+    return time.perf_counter() - start
+
+def shared_engine(iterations):
+    """Reuse one engine for every call"""
+    engine = NLToSQLEngine(llm=StubChatModel())
+    start = time.perf_counter()
+    for _ in range(iterations):
+        engine.generate(QUESTION)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--include-client', action='store_true',
+                        help='Also time constructing the real Gemini client (no network calls are made)')
+    args = parser.parse_args()
+
+    if args.include_client:
+        os.environ.setdefault('GOOGLE_API_KEY', 'benchmark-dummy-key')
+        elapsed = per_request(args.iterations, include_client=True)
+        print(f"Gemini client + chain construction: {elapsed / args.iterations * 1000:.3f} ms/request")
+
+    rebuilt = per_request(args.iterations, include_client=False)
+    shared = shared_engine(args.iterations)
+    print(f"Rebuilt per request: {rebuilt / args.iterations * 1000:.3f} ms/request")
+    print(f"Shared engine:       {shared / args.iterations * 1000:.3f} ms/request")
+    print(f"Overhead removed:    {(rebuilt - shared) / args.iterations * 1000:.3f} ms/request")
+
+if __name__ == '__main__':
+    main()
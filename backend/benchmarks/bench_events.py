@@ -0,0 +1,72 @@
+"""
+Benchmark: time to first row of POST /query (stream) vs POST /query/events
+
+Both endpoints stream rows, but /query waits for the model's whole response
+before validating the SQL, while /query/events starts as soon as the "sql"
+value has streamed and lets the model finish the explanation afterwards.
+Uses the Flask app with a stub LLM that streams its response over --latency
+seconds, and reports for each endpoint the median time to the first row and
+to the end of the response.
+
+Usage:
+    python benchmarks/bench_events.py [--latency 1.0] [--requests 10]
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def timed_request(client, path, body, first_row_marker):
+    """(seconds to the first chunk containing rows, seconds to the end of the body)"""
+    start = time.perf_counter()
+    first_row = None
+    response = client.post(path, json=body, buffered=False)
+    for chunk in response.response:
+        if first_row is None and first_row_marker in chunk:
+            first_row = time.perf_counter() - start
+    response.close()
+    return first_row, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=1.0, help='Seconds the stub LLM takes to stream a response')
+    parser.add_argument('--requests', type=int, default=10)
+    args = parser.parse_args()
+
+    # Every request has to reach the LLM
+    os.environ['QUERY_CACHE_MAX_ENTRIES'] = '0'
+    os.environ['DB_RESULT_CACHE_BYTES'] = '0'
+    os.environ['SQL_TEMPLATES'] = 'off'
+
+    from stub_llm import StubChatModel, few_shot_answers
+    from nl_to_sql import FEW_SHOT_EXAMPLES, NLToSQLEngine, set_engine
+    from database import init_db
+
+    init_db()
+    set_engine(NLToSQLEngine(llm=StubChatModel(latency=args.latency, answers=few_shot_answers())))
+    from app import app as flask_app
+    client = flask_app.test_client()
+
+    questions = [question for question, _ in FEW_SHOT_EXAMPLES]
+    endpoints = [
+        ('/query (stream)', '/query', {'stream': True, 'format': 'rows'}, b'"type": "rows"'),
+        ('/query/events', '/query/events', {'format': 'rows'}, b'event: rows'),
+    ]
+    print(f"{args.requests} requests per endpoint, stub LLM streams each response over {args.latency * 1000:.0f}ms\n")
+    print(f"{'endpoint':<18} {'first row ms':>13} {'complete ms':>12}")
+    for name, path, body, marker in endpoints:
+        first_rows = []
+        totals = []
+        for index in range(args.requests):
+            first_row, total = timed_request(client, path, {**body, 'message': questions[index % len(questions)]}, marker)
+            if first_row is not None:
+                first_rows.append(first_row)
+            totals.append(total)
+        first_row_ms = f"{statistics.median(first_rows) * 1000:.0f}" if first_rows else '-'
+        print(f"{name:<18} {first_row_ms:>13} {statistics.median(totals) * 1000:>12.0f}")
+
+if __name__ == '__main__':
+    main()
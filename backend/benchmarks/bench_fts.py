@@ -0,0 +1,105 @@
+"""
+Benchmark: LIKE '%term%' scans vs FTS5 MATCH lookups on a large cast table
+
+Builds a throwaway database with a synthetic cast table (1M rows by default),
+indexes it with the same FTS5 setup init_db uses, then times the few-shot
+style name searches as written with LOWER(...) LIKE and after
+rewrite_like_predicates, checking both return the same rows.
+
+Usage:
+    python benchmarks/bench_fts.py [--rows 1000000] [--repeat 3]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import create_fts_indexes
+from full_text import rewrite_like_predicates
+
+FIRST_NAMES = ['Tom', 'Meryl', 'Denzel', 'Cate', 'Leonardo', 'Viola', 'Morgan', 'Frances', 'Samuel', 'Emma',
+               'Christopher', 'Greta', 'Martin', 'Kathryn', 'Quentin', 'Sofia', 'Ridley', 'Ava', 'Spike', 'Jane']
+LAST_NAMES = ['Hanks', 'Streep', 'Washington', 'Blanchett', 'DiCaprio', 'Davis', 'Freeman', 'McDormand',
+              'Jackson', 'Stone', 'Nolan', 'Gerwig', 'Scorsese', 'Bigelow', 'Tarantino', 'Coppola', 'Scott',
+              'DuVernay', 'Lee', 'Campion', 'Okafor', 'Lindqvist', 'Moreau', 'Tanaka', 'Haddad']
+ROLE_TYPES = ['Actor', 'Actor', 'Actor', 'Director', 'Writer', 'Producer']
+
+QUERIES = [
+    "SELECT DISTINCT c.movie_id FROM cast c WHERE LOWER(c.person_name) LIKE '%tom hanks%' AND c.role_type = 'Actor'",
+    "SELECT DISTINCT c.movie_id FROM cast c WHERE LOWER(c.person_name) LIKE '%nolan%' AND c.role_type = 'Director'",
+    "SELECT c.person_name, c.character_name FROM cast c WHERE LOWER(c.character_name) LIKE '%joker%'",
+]
+
+def build_database(path, row_count, seed=42):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('''
+        CREATE TABLE movies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, year INTEGER NOT NULL,
+            genre TEXT NOT NULL, director TEXT NOT NULL, runtime INTEGER, description TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE cast (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, movie_id INTEGER NOT NULL, person_name TEXT NOT NULL,
+            role_type TEXT NOT NULL, character_name TEXT
+        )
+    ''')
+    # Unique surnames per row keep the name column's cardinality realistic
+    conn.executemany(
+        'INSERT INTO cast (movie_id, person_name, role_type, character_name) VALUES (?, ?, ?, ?)',
+        (
+            (i // 10 + 1,
+             f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{'' if rng.random() < 0.05 else f'-{i % 50000}'}",
+             rng.choice(ROLE_TYPES),
+             'Joker' if rng.random() < 0.0005 else f'Character {i}')
+            for i in range(row_count)
+        )
+    )
+    conn.commit()
+
+    start = time.perf_counter()
+    create_fts_indexes(conn.cursor())
+    conn.commit()
+    return conn, time.perf_counter() - start
+
+def best_of(repeat, fn):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        conn, index_time = build_database(os.path.join(directory, 'bench.db'), args.rows)
+        print(f"{args.rows:,} cast rows loaded in {time.perf_counter() - start:.1f}s "
+              f"(FTS index built in {index_time:.1f}s)\n")
+
+        print(f"{'LIKE ms':>9} {'MATCH ms':>9} {'speedup':>8} {'rows':>7}  query")
+        for sql in QUERIES:
+            rewritten = rewrite_like_predicates(sql)
+            like_time, like_rows = best_of(args.repeat, lambda: conn.execute(sql).fetchall())
+            match_time, match_rows = best_of(args.repeat, lambda: conn.execute(rewritten).fetchall())
+            same = sorted(like_rows) == sorted(match_rows)
+            print(f"{like_time * 1000:>9.1f} {match_time * 1000:>9.1f} {like_time / match_time:>7.0f}x "
+                  f"{len(match_rows):>7}  {sql[:70]}{'' if same else '  [results differ]'}")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
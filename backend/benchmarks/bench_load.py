@@ -0,0 +1,90 @@
+"""
+Load test: requests/sec of the threaded Flask app vs the async ASGI app
+
+Gemini is replaced by a stub that sleeps for --latency seconds, so the test
+shows how many concurrent LLM round trips each serving mode sustains. The
+Flask app is driven by --workers threads (one per simulated worker thread);
+the ASGI app is driven by --concurrency concurrent clients on one event loop.
+The SQL and result caches and the SQL templates are disabled, so every
+request in both runs reaches the LLM.
+
+Requires httpx for the ASGI client:
+    pip install httpx
+
+Usage:
+    python benchmarks/bench_load.py [--requests 200] [--latency 0.5] [--workers 8] [--concurrency 200]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+def question(i):
+    return f"Top rated movies (load test {i})"
+
+def bench_flask(total, workers):
+    from app import app as flask_app
+
+    def send(i):
+        with flask_app.test_client() as client:
+            return client.post('/query', json={'message': question(i)}).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(send, range(total)))
+    return time.perf_counter() - start, statuses
+
+async def bench_asgi(total, concurrency):
+    from asgi import app as asgi_app
+    limit = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url='http://bench') as client:
+        async def send(i):
+            async with limit:
+                response = await client.post('/query', json={'message': question(i)})
+                return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(send(i) for i in range(total)))
+    return time.perf_counter() - start, statuses
+
+def report(label, total, elapsed, statuses):
+    ok = sum(1 for status in statuses if status == 200)
+    throttled = sum(1 for status in statuses if status == 429)
+    print(f"{label:<28} {total / elapsed:>8.1f} req/s   {elapsed:>6.2f}s   ok={ok} 429={throttled}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.5, help='Simulated LLM latency in seconds')
+    parser.add_argument('--workers', type=int, default=8, help='Flask worker threads')
+    parser.add_argument('--concurrency', type=int, default=200, help='Concurrent ASGI clients')
+    args = parser.parse_args()
+
+    # Configuration is read at import time, so set it before importing the app.
+    # Both runs send the same questions, so the second would otherwise hit the caches
+    os.environ['QUERY_CACHE_MAX_ENTRIES'] = '0'
+    os.environ['DB_RESULT_CACHE_BYTES'] = '0'
+    os.environ['SQL_TEMPLATES'] = 'off'
+
+    from stub_llm import StubChatModel
+    from nl_to_sql import NLToSQLEngine, set_engine
+    from database import init_db
+
+    init_db()
+    set_engine(NLToSQLEngine(llm=StubChatModel(latency=args.latency)))
+
+    elapsed, statuses = bench_flask(args.requests, args.workers)
+    report(f"Flask ({args.workers} threads)", args.requests, elapsed, statuses)
+
+    elapsed, statuses = asyncio.run(bench_asgi(args.requests, args.concurrency))
+    report(f"ASGI ({args.concurrency} clients)", args.requests, elapsed, statuses)
+
+if __name__ == '__main__':
+    main()
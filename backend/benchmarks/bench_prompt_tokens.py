@@ -0,0 +1,67 @@
+"""
+Benchmark: prompt size with and without relevant-schema pruning
+
+Renders the full prompt for a fixed question set with SCHEMA_PRUNING off
+(every table and few-shot example) and on (selected tables and examples), and
+reports approximate token counts. Tokens are counted with tiktoken when it is
+installed, otherwise estimated as characters / 4.
+
+Usage:
+    python benchmarks/bench_prompt_tokens.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_llm import StubChatModel
+from nl_to_sql import NLToSQLEngine
+
+QUESTIONS = [
+    "Top rated movies",
+    "Movies that made over 1 billion",
+    "Which movies did Leonardo DiCaprio act in",
+    "Count movies by genre",
+    "Show me movies with box office over 500 million and ratings above 8.5",
+    "Which actors appeared in Christopher Nolan films?",
+    "List movies with Rotten Tomatoes score above 90",
+    "Show the most profitable movies (revenue minus budget)",
+    "What are the longest movies?",
+    "Compare domestic vs international revenue for Sci-Fi movies",
+]
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+
+    def count_tokens(text):
+        return len(_encoding.encode(text))
+    TOKENIZER = 'tiktoken cl100k_base'
+except ImportError:
+    def count_tokens(text):
+        return len(text) // 4
+    TOKENIZER = 'chars / 4 estimate'
+
+def prompt_tokens(engine, question):
+    messages = engine.prompt_template.format_messages(**engine.build_inputs(question))
+    return sum(count_tokens(message.content) for message in messages)
+
+def main():
+    full = NLToSQLEngine(llm=StubChatModel(), schema_pruning=False)
+    pruned = NLToSQLEngine(llm=StubChatModel(), schema_pruning=True)
+
+    print(f"Token counts ({TOKENIZER})\n")
+    print(f"{'question':<62} {'full':>6} {'pruned':>7} {'saved':>6}")
+    totals = [0, 0]
+    for question in QUESTIONS:
+        before = prompt_tokens(full, question)
+        after = prompt_tokens(pruned, question)
+        totals[0] += before
+        totals[1] += after
+        print(f"{question[:62]:<62} {before:>6} {after:>7} {1 - after / before:>6.0%}")
+
+    count = len(QUESTIONS)
+    print(f"{'average':<62} {totals[0] / count:>6.0f} {totals[1] / count:>7.0f} {1 - totals[1] / totals[0]:>6.0%}")
+
+if __name__ == '__main__':
+    main()
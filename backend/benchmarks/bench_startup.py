@@ -0,0 +1,174 @@
+"""
+Benchmark: cold start cost of a server process
+
+Measures, in fresh interpreter processes:
+  - import: time to import the server module, from `python -X importtime`,
+    with the heaviest top-level imports listed
+  - first /health: time from spawning the server until GET /health returns 200
+
+Importing the server must not load LangChain or the Gemini client; that is
+checked on every run. Medians over --runs are compared with a baseline file
+and the script exits with status 1 if either number regressed by more than
+--tolerance. The first run on a machine (or --update-baseline) records the
+baseline instead. The database is migrated into a temporary file first, so
+the numbers do not include seeding.
+
+Usage:
+    python benchmarks/bench_startup.py [--server flask|asgi] [--runs 5] [--tolerance 0.2] [--update-baseline]
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'startup_baseline.json')
+
+SERVERS = {
+    'flask': ('app', [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', '{port}']),
+    'asgi': ('asgi', [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', '{port}', '--log-level', 'warning']),
+}
+
+# Modules that must only be imported when the first engine is built
+LAZY_PREFIXES = ('langchain', 'langchain_core', 'langchain_google_genai', 'google.generativeai', 'google.ai')
+
+# Differences below this are noise whatever the tolerance
+MIN_REGRESSION_MS = 20
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+def parse_importtime(stderr):
+    """(module, cumulative µs, nesting depth) for every line of -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(2)), len(match.group(3)) // 2))
+    return imports
+
+def measure_import(module, env):
+    """Import time of module in ms, the top-level imports it pulled in, and any eagerly loaded LLM modules"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        sys.exit(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    imports = parse_importtime(completed.stderr)
+    # A module's line comes after the lines of the imports it triggered, which are one level deeper
+    total = 0
+    children = []
+    pending = []
+    for name, cumulative, depth in imports:
+        if depth == 1:
+            pending.append((name, cumulative))
+        elif depth == 0:
+            if name == module:
+                total, children = cumulative, pending
+            pending = []
+    eager = sorted({name for name, _, _ in imports if name.startswith(LAZY_PREFIXES)})
+    return total / 1000, children, eager
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def measure_first_health(command, env, timeout=60):
+    """ms from spawning the server until GET /health returns 200"""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}/health'
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [part.format(port=port) for part in command],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                sys.exit(f"Server exited with status {process.returncode}:\n{process.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.005)
+        sys.exit(f"No response from {url} after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def compare(results, baseline, tolerance):
+    """Names of the metrics that regressed past the tolerance"""
+    regressions = []
+    for metric, value in results.items():
+        limit = baseline.get(metric)
+        if limit is not None and value > max(limit * (1 + tolerance), limit + MIN_REGRESSION_MS):
+            regressions.append(metric)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=SERVERS, default='flask')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown vs the baseline (0.2 = 20%%)')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    module, command = SERVERS[args.server]
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, 'DATABASE_PATH': os.path.join(directory, 'startup.db')}
+        subprocess.run([sys.executable, 'database.py'], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        import_times = []
+        first_health_times = []
+        for _ in range(args.runs):
+            import_ms, children, eager = measure_import(module, env)
+            import_times.append(import_ms)
+            first_health_times.append(measure_first_health(command, env))
+
+    results = {
+        'import_ms': round(statistics.median(import_times), 1),
+        'first_health_ms': round(statistics.median(first_health_times), 1),
+    }
+    print(f"{args.server}: import {module} {results['import_ms']}ms, first /health {results['first_health_ms']}ms "
+          f"(median of {args.runs})\n")
+    print("Heaviest imports:")
+    for name, cumulative in sorted(children, key=lambda child: -child[1])[:10]:
+        print(f"  {cumulative / 1000:>8.1f}ms  {name}")
+
+    if eager:
+        print(f"\nFAIL: importing {module} loaded {', '.join(eager)}; these must load when the engine is built")
+        sys.exit(1)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(args.server)
+
+    if baseline is None or args.update_baseline:
+        baselines[args.server] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline for {args.server} written to {args.baseline}")
+        return
+
+    print(f"\nBaseline: import {baseline.get('import_ms')}ms, first /health {baseline.get('first_health_ms')}ms")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"FAIL: {', '.join(regressions)} regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == '__main__':
+    main()
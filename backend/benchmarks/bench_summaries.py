@@ -0,0 +1,108 @@
+"""
+Benchmark: few-shot queries against the base tables vs the materialized summaries
+
+Bulk loads a synthetic catalog (100k movies by default) into a throwaway
+database, then times each aggregate few-shot question as it was written
+against movies/box_office/ratings/cast and as it is now written against
+movie_facts and the genre/year/person summaries, checking both return the
+same rows. Also times how long the triggers take to keep the summaries
+current for a batch of box office updates.
+
+Usage:
+    python benchmarks/bench_summaries.py [--movies 100000] [--cast-per-movie 10] [--repeat 3]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_load import bulk_load, synthetic_catalog
+
+# (question, SQL against the base tables, SQL against the summaries as in FEW_SHOT_EXAMPLES)
+QUERIES = [
+    ("Top rated movies",
+     "SELECT m.title, m.year, r.imdb_rating FROM movies m JOIN ratings r ON m.id = r.movie_id ORDER BY r.imdb_rating DESC LIMIT 10",
+     "SELECT f.title, f.year, f.imdb_rating FROM movie_facts f ORDER BY f.imdb_rating DESC LIMIT 10"),
+    ("Movies that made over 1 billion",
+     "SELECT m.title, m.year, b.total_revenue FROM movies m JOIN box_office b ON m.id = b.movie_id WHERE b.total_revenue > 1000 ORDER BY b.total_revenue DESC",
+     "SELECT f.title, f.year, f.total_revenue FROM movie_facts f WHERE f.total_revenue > 1000 ORDER BY f.total_revenue DESC"),
+    ("Movies with box office over 500 million and ratings above 8.5",
+     "SELECT m.title, m.year, b.total_revenue, r.imdb_rating FROM movies m JOIN box_office b ON m.id = b.movie_id JOIN ratings r ON m.id = r.movie_id WHERE b.total_revenue > 500 AND r.imdb_rating > 8.5 ORDER BY b.total_revenue DESC",
+     "SELECT f.title, f.year, f.total_revenue, f.imdb_rating FROM movie_facts f WHERE f.total_revenue > 500 AND f.imdb_rating > 8.5 ORDER BY f.total_revenue DESC"),
+    ("Count movies by genre",
+     "SELECT genre, COUNT(*) as count FROM movies GROUP BY genre ORDER BY count DESC",
+     "SELECT genre, movie_count as count FROM genre_summary ORDER BY count DESC"),
+    ("Most profitable movies",
+     "SELECT m.title, m.year, (b.total_revenue - b.budget) as profit FROM movies m JOIN box_office b ON m.id = b.movie_id WHERE b.budget IS NOT NULL ORDER BY profit DESC LIMIT 10",
+     "SELECT f.title, f.year, f.profit FROM movie_facts f WHERE f.budget IS NOT NULL ORDER BY f.profit DESC LIMIT 10"),
+    ("Movies with best return on investment",
+     "SELECT m.title, m.year, b.budget, b.total_revenue, ROUND(((b.total_revenue - b.budget) / b.budget * 100), 2) as roi_percent FROM movies m JOIN box_office b ON m.id = b.movie_id WHERE b.budget > 0 ORDER BY roi_percent DESC LIMIT 10",
+     "SELECT f.title, f.year, f.budget, f.total_revenue, f.roi_percent FROM movie_facts f WHERE f.budget > 0 ORDER BY f.roi_percent DESC LIMIT 10"),
+    ("Average rating by genre",
+     "SELECT m.genre, COUNT(*) as movie_count, ROUND(AVG(r.imdb_rating), 2) as avg_imdb_rating FROM movies m JOIN ratings r ON m.id = r.movie_id GROUP BY m.genre ORDER BY avg_imdb_rating DESC",
+     "SELECT genre, movie_count, avg_imdb_rating FROM genre_summary ORDER BY avg_imdb_rating DESC"),
+    ("Directors with the highest total box office",
+     "SELECT c.person_name, COUNT(DISTINCT m.id) as movie_count, TOTAL(b.total_revenue) as total_revenue FROM cast c JOIN movies m ON m.id = c.movie_id JOIN box_office b ON m.id = b.movie_id WHERE c.role_type = 'Director' GROUP BY c.person_name ORDER BY total_revenue DESC LIMIT 10",
+     "SELECT person_name, movie_count, total_revenue FROM person_summary WHERE role_type = 'Director' ORDER BY total_revenue DESC LIMIT 10"),
+]
+
+def best_of(repeat, fn):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def compare(base_rows, summary_rows):
+    """'same', 'ties' when only rows tied on the sort column differ, or 'DIFFERENT'"""
+    if sorted(base_rows) == sorted(summary_rows):
+        return 'same'
+    if [row[-1] for row in base_rows] == [row[-1] for row in summary_rows]:
+        return 'ties'
+    return 'DIFFERENT'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=100000)
+    parser.add_argument('--cast-per-movie', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--updates', type=int, default=1000, help='Box office rows updated to time trigger maintenance')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        result = bulk_load(synthetic_catalog(args.movies, args.cast_per_movie), db_path=path)
+        if not result['success']:
+            sys.exit(f"Load failed: {result['error']}")
+        print(f"{args.movies:,} movies, {result['rows']['cast']:,} cast rows loaded in {result['seconds']}s "
+              f"(summaries included)\n")
+
+        conn = sqlite3.connect(path)
+        print(f"{'base ms':>9} {'summary ms':>11} {'speedup':>8} {'rows':>6} {'result':>9}  question")
+        for question, base_sql, summary_sql in QUERIES:
+            base_time, base_rows = best_of(args.repeat, lambda: conn.execute(base_sql).fetchall())
+            summary_time, summary_rows = best_of(args.repeat, lambda: conn.execute(summary_sql).fetchall())
+            print(f"{base_time * 1000:>9.1f} {summary_time * 1000:>11.2f} {base_time / summary_time:>7.0f}x "
+                  f"{len(summary_rows):>6} {compare(base_rows, summary_rows):>9}  {question}")
+
+        movie_ids = random.Random(42).sample(range(1, args.movies + 1), min(args.updates, args.movies))
+        start = time.perf_counter()
+        with conn:
+            conn.executemany(
+                'UPDATE box_office SET total_revenue = total_revenue + 1 WHERE movie_id = ?',
+                ((movie_id,) for movie_id in movie_ids)
+            )
+        elapsed = time.perf_counter() - start
+        print(f"\n{len(movie_ids):,} box office updates with summary maintenance: {elapsed * 1000:.0f}ms "
+              f"({elapsed / len(movie_ids) * 1000:.2f}ms per row)")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Deterministic stand-in for Gemini used by the benchmarks
+
+Answers with the same fenced JSON block the real model returns, so the full
+prompt -> LLM -> StructuredOutputParser chain runs unchanged without network.
+With `answers` set, the SQL is looked up by the question in the last message
+(see few_shot_answers), so different questions exercise different queries.
+Streaming splits the response into `chunk_size` character chunks spread
+evenly over the latency, the way tokens arrive from the real model.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from nl_to_sql import FEW_SHOT_EXAMPLES
+from query_cache import normalize_question
+
+DEFAULT_SQL = "SELECT * FROM movies ORDER BY year DESC LIMIT 10"
+
+def render_response(sql, explanation):
+    """Format a response the way Gemini does for StructuredOutputParser"""
+    body = json.dumps({'sql': sql, 'explanation': explanation}, indent=2)
+    return f"```json\n{body}\n```"
+
+def few_shot_answers():
+    """Map each few-shot question in the prompt (normalized) to its example SQL"""
+    return {normalize_question(question): sql for question, sql in FEW_SHOT_EXAMPLES}
+
+class StubChatModel(BaseChatModel):
+    """Chat model that returns a canned SQL answer after a fixed simulated latency"""
+
+    latency: float = 0.0
+    sql: str = DEFAULT_SQL
+    answers: dict = {}
+    chunk_size: int = 8
+
+    @property
+    def _llm_type(self):
+        return 'stub'
+
+    def _response_text(self, messages):
+        sql = self.answers.get(normalize_question(messages[-1].content), self.sql) if messages else self.sql
+        return render_response(sql, 'Stubbed response')
+
+    def _respond(self, messages):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._response_text(messages)))])
+
+    def _chunks(self, messages):
+        text = self._response_text(messages)
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = self._chunks(messages)
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        chunks = self._chunks(messages)
+        for chunk in chunks:
+            if self.latency:
+                await asyncio.sleep(self.latency / len(chunks))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
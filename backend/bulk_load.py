@@ -0,0 +1,466 @@
+"""
+Bulk loading of large catalogs into the movies database
+
+Streams CSV or JSONL rows into movies, box_office, ratings and cast using
+large transactions, with journaling and syncing turned off and index/trigger
+maintenance deferred until every row is in. Also generates deterministic
+synthetic catalogs (N movies, M cast rows each) for benchmarking at scale.
+
+Usage:
+    python bulk_load.py --movies movies.csv --box-office box_office.jsonl --ratings ratings.csv --cast cast.csv
+    python bulk_load.py --synthetic 100000 --cast-per-movie 10 [--replace]
+"""
+import io
+import os
+import csv
+import hmac
+import json
+import time
+import random
+import sqlite3
+import argparse
+from itertools import islice
+from database import (
+    DATABASE_PATH, create_tables, create_indexes, create_fts_indexes, FTS_INDEXES,
+    create_summary_tables, rebuild_summaries,
+)
+
+# Rows per executemany batch and per transaction
+BULK_LOAD_BATCH_SIZE = int(os.getenv('BULK_LOAD_BATCH_SIZE', '50000'))
+BULK_LOAD_COMMIT_ROWS = int(os.getenv('BULK_LOAD_COMMIT_ROWS', '1000000'))
+
+# Bearer token for POST /admin/load/<table>; loading over HTTP is disabled when unset
+BULK_LOAD_TOKEN = os.getenv('BULK_LOAD_TOKEN', '')
+
+CONTENT_TYPE_FORMATS = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+
+# Loadable columns per table, in load order (movies first so foreign keys resolve)
+TABLE_COLUMNS = {
+    'movies': ('id', 'title', 'year', 'genre', 'director', 'runtime', 'description'),
+    'box_office': ('id', 'movie_id', 'domestic_revenue', 'international_revenue', 'total_revenue', 'budget', 'opening_weekend'),
+    'ratings': ('id', 'movie_id', 'imdb_rating', 'rotten_tomatoes', 'metacritic', 'audience_score'),
+    'cast': ('id', 'movie_id', 'person_name', 'role_type', 'character_name'),
+}
+
+class BulkLoadError(ValueError):
+    """Raised for unknown tables, unknown file formats or rows without loadable columns"""
+
+def detect_format(path):
+    """Return 'csv' or 'jsonl' from a file name"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    raise BulkLoadError(f"Cannot tell the format of {path}; use a .csv or .jsonl file")
+
+def read_records(lines, fmt):
+    """
+    Stream dict records from an iterable of text lines
+
+    CSV needs a header row; empty CSV fields are loaded as NULL. JSONL has one
+    object per line; blank lines are skipped.
+    """
+    if fmt == 'csv':
+        for record in csv.DictReader(lines):
+            yield {key: (value if value != '' else None) for key, value in record.items()}
+    elif fmt == 'jsonl':
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise BulkLoadError(f"Unknown format '{fmt}', expected 'csv' or 'jsonl'")
+
+class _ChunkStream(io.RawIOBase):
+    """Raw binary stream over an iterable of byte chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b''
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+def text_lines(chunks):
+    """Stream UTF-8 text lines from an iterable of byte chunks, e.g. an HTTP request body"""
+    return io.TextIOWrapper(io.BufferedReader(_ChunkStream(chunks)), encoding='utf-8', newline='')
+
+def format_for_content_type(content_type):
+    """Return the record format for an HTTP Content-Type header"""
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type not in CONTENT_TYPE_FORMATS:
+        raise BulkLoadError(f"Unsupported Content-Type '{media_type}', expected one of: {', '.join(CONTENT_TYPE_FORMATS)}")
+    return CONTENT_TYPE_FORMATS[media_type]
+
+def authorize_load(authorization):
+    """Check an Authorization header against BULK_LOAD_TOKEN"""
+    return bool(BULK_LOAD_TOKEN) and hmac.compare_digest(authorization or '', f'Bearer {BULK_LOAD_TOKEN}')
+
+def read_file(path, fmt=None):
+    """Stream dict records from a CSV or JSONL file"""
+    fmt = fmt or detect_format(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from read_records(f, fmt)
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, isolation_level=None)  # Transactions are managed explicitly
+    conn.execute('PRAGMA cache_size = -262144')  # 256MB page cache while loading
+    return conn
+
+def _set_journal_mode(conn, mode):
+    """
+    Switch journal_mode and return the mode in effect afterwards
+
+    Leaving WAL needs exclusive access, so while other connections (such as a
+    running server's read pool) have the database open, SQLite refuses with
+    'database is locked' and the current mode is kept.
+    """
+    try:
+        return conn.execute(f'PRAGMA journal_mode = {mode}').fetchone()[0]
+    except sqlite3.OperationalError as e:
+        if 'locked' not in str(e):
+            raise
+        return conn.execute('PRAGMA journal_mode').fetchone()[0]
+
+def _defer_maintenance(conn, tables):
+    """
+    Drop the indexes and triggers on the tables being loaded
+
+    Returns:
+        tuple: (index SQL, trigger SQL) to recreate once the rows are in
+    """
+    placeholders = ', '.join('?' for _ in tables)
+    objects = conn.execute(
+        f"SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+        f"AND sql IS NOT NULL AND tbl_name IN ({placeholders})",
+        list(tables)
+    ).fetchall()
+    for object_type, name, _ in objects:
+        conn.execute(f'DROP {object_type.upper()} IF EXISTS {name}')
+    indexes = [sql for object_type, _, sql in objects if object_type == 'index']
+    triggers = [sql for object_type, _, sql in objects if object_type == 'trigger']
+    return indexes, triggers
+
+def _insert_rows(conn, table, records, batch_size, commit_rows, into=None):
+    """
+    Insert records for table in batches, into table itself or the staging table into
+
+    Returns:
+        tuple: (rows inserted, columns loaded), with no columns when there were no records
+    """
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        return 0, ()
+
+    columns = [column for column in TABLE_COLUMNS[table] if column in first]
+    if not columns:
+        raise BulkLoadError(f"Rows for {table} have none of its columns: {', '.join(TABLE_COLUMNS[table])}")
+    statement = f"INSERT INTO {into or table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
+    def values():
+        yield tuple(first.get(column) for column in columns)
+        for record in records:
+            yield tuple(record.get(column) for column in columns)
+
+    inserted = 0
+    uncommitted = 0
+    pending = values()
+    conn.execute('BEGIN')
+    while True:
+        batch = list(islice(pending, batch_size))
+        if not batch:
+            break
+        conn.executemany(statement, batch)
+        inserted += len(batch)
+        uncommitted += len(batch)
+        if uncommitted >= commit_rows:
+            conn.execute('COMMIT')
+            conn.execute('BEGIN')
+            uncommitted = 0
+    conn.execute('COMMIT')
+    return inserted, columns
+
+def _staging_table(table):
+    """Name of the temporary table a replace load of table is staged in"""
+    return f'temp.bulk_load_{table}'
+
+def _stage_rows(conn, table, records, batch_size, commit_rows):
+    """Insert records into a temporary copy of table; returns (rows inserted, columns loaded)"""
+    staging = _staging_table(table)
+    conn.execute(f'DROP TABLE IF EXISTS {staging}')
+    conn.execute(f'CREATE TABLE {staging} AS SELECT * FROM {table} WHERE 0')
+    return _insert_rows(conn, table, records, batch_size, commit_rows, into=staging)
+
+def _replace_with_staged(conn, staged, journal_mode, loading_journal_mode):
+    """
+    Replace the rows of each staged table with its staging table's rows in one transaction
+
+    Args:
+        staged (dict): Table -> columns loaded into its staging table, in load order
+    """
+    # With journal_mode OFF a failed transaction cannot be rolled back
+    if _set_journal_mode(conn, journal_mode) == 'off' != journal_mode:
+        raise BulkLoadError('Cannot turn journaling back on for the replace; the staged rows were not swapped in')
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        for table in reversed(list(staged)):
+            conn.execute(f'DELETE FROM {table}')
+        for table, columns in staged.items():
+            if columns:
+                column_list = ', '.join(columns)
+                conn.execute(f'INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {_staging_table(table)}')
+        conn.execute('COMMIT')
+    finally:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        for table in staged:
+            conn.execute(f'DROP TABLE IF EXISTS {_staging_table(table)}')
+        _set_journal_mode(conn, loading_journal_mode)
+
+def bulk_load(sources, replace=False, db_path=None, batch_size=BULK_LOAD_BATCH_SIZE, commit_rows=BULK_LOAD_COMMIT_ROWS):
+    """
+    Load rows into the catalog tables as fast as SQLite allows
+
+    While loading, journal_mode is OFF and synchronous is OFF, and the loaded
+    tables' indexes and triggers (including the FTS sync triggers) are dropped.
+    If other connections have the database open (a running server), SQLite
+    cannot change the journal mode and the load keeps the current one, usually
+    WAL; the mode used is reported in the result.
+    Afterwards they are recreated, the FTS indexes and summary tables are
+    rebuilt in one pass, the planner statistics are refreshed and the journal
+    settings are restored. A crash mid-load can leave the database corrupt, so
+    load into a copy or keep a backup of anything you cannot regenerate.
+
+    Appended rows are committed every commit_rows rows, so a bad row part way
+    through leaves the rows before it loaded. With replace, rows are loaded
+    into temporary staging tables first and swapped in with one journaled
+    transaction, so a failed load leaves the existing rows untouched.
+
+    Args:
+        sources (dict): Table name -> iterable of dict records (e.g. read_file(path))
+        replace (bool): Replace the tables' existing rows instead of appending
+        db_path (str): Database file (defaults to DATABASE_PATH)
+        batch_size (int): Rows per executemany call
+        commit_rows (int): Rows per transaction
+
+    Returns:
+        dict: Contains 'success', 'rows' (rows inserted per table), 'journal_mode' (used while
+              loading) and 'seconds', or 'error'
+    """
+    unknown = set(sources) - set(TABLE_COLUMNS)
+    if unknown:
+        raise BulkLoadError(f"Unknown table(s): {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    conn = _connect(db_path or DATABASE_PATH)
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    tables = [table for table in TABLE_COLUMNS if table in sources]
+    rows = {}
+    try:
+        create_tables(conn.cursor())
+        create_indexes(conn.cursor())
+        create_fts_indexes(conn.cursor())
+        create_summary_tables(conn.cursor())
+
+        # With readers attached the load stays in the current mode (WAL for a running server)
+        loading_journal_mode = _set_journal_mode(conn, 'OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+
+        indexes, triggers = _defer_maintenance(conn, tables)
+        try:
+            if replace:
+                staged = {}
+                for table in tables:
+                    rows[table], staged[table] = _stage_rows(conn, table, sources[table], batch_size, commit_rows)
+                    print(f"Staged {rows[table]:,} rows for {table}")
+                _replace_with_staged(conn, staged, journal_mode, loading_journal_mode)
+            else:
+                for table in tables:
+                    rows[table], _ = _insert_rows(conn, table, sources[table], batch_size, commit_rows)
+                    print(f"Loaded {rows[table]:,} rows into {table}")
+        finally:
+            # Rebuild what was dropped even if the load failed part way
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            conn.execute('BEGIN')
+            for sql in indexes + triggers:
+                conn.execute(sql)
+            for name, table, _ in FTS_INDEXES:
+                if table in tables:
+                    conn.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+            rebuild_summaries(conn.cursor())
+            conn.execute('COMMIT')
+
+        # Full statistics: the cost guard sizes index searches from sqlite_stat1, and a
+        # sampled ANALYZE caps rows per key near the sample size (about 1s per 1M rows)
+        conn.execute('ANALYZE')
+    except (sqlite3.Error, ValueError) as e:
+        return {'success': False, 'error': str(e), 'rows': rows}
+    finally:
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+        _set_journal_mode(conn, journal_mode)
+        conn.close()
+
+    return {
+        'success': True,
+        'rows': rows,
+        'journal_mode': loading_journal_mode,
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+# Vocabulary for synthetic catalogs
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Horror',
+          'Romance', 'Sci-Fi', 'Thriller', 'War', 'Western', 'Documentary']
+TITLE_WORDS = ['Silent', 'Last', 'Broken', 'Golden', 'Hidden', 'Midnight', 'Crimson', 'Lost', 'Iron', 'Distant',
+               'River', 'Empire', 'Harbor', 'Signal', 'Garden', 'Storm', 'Kingdom', 'Mirror', 'Frontier', 'Echo']
+FIRST_NAMES = ['Tom', 'Meryl', 'Denzel', 'Cate', 'Leonardo', 'Viola', 'Morgan', 'Frances', 'Samuel', 'Emma',
+               'Christopher', 'Greta', 'Martin', 'Kathryn', 'Quentin', 'Sofia', 'Ridley', 'Ava', 'Spike', 'Jane',
+               'Akira', 'Agnes', 'Pedro', 'Chloe', 'Bong', 'Lupita', 'Wong', 'Claire', 'Hirokazu', 'Mati']
+LAST_NAMES = ['Hanks', 'Streep', 'Washington', 'Blanchett', 'DiCaprio', 'Davis', 'Freeman', 'McDormand', 'Jackson',
+              'Stone', 'Nolan', 'Gerwig', 'Scorsese', 'Bigelow', 'Tarantino', 'Coppola', 'Scott', 'DuVernay', 'Lee',
+              'Campion', 'Okafor', 'Lindqvist', 'Moreau', 'Tanaka', 'Haddad', 'Kurosawa', 'Varda', 'Almodovar', 'Zhao']
+CHARACTER_NAMES = ['Alex', 'Sam', 'Jordan', 'Riley', 'Morgan', 'Casey', 'Quinn', 'Avery', 'Rowan', 'Sage']
+PLOT_SUBJECTS = ['a retired detective', 'two estranged siblings', 'a young pilot', 'a small-town teacher',
+                 'an exiled prince', 'a crew of thieves', 'a grieving scientist', 'a reluctant soldier']
+PLOT_EVENTS = ['uncovers a conspiracy', 'must survive one last winter', 'sets out to find a missing friend',
+               'is pulled into a war', 'plans an impossible heist', 'confronts a buried family secret']
+
+def person_name(index):
+    """Deterministic, mostly unique person name for a person index"""
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    generation = index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f"{first} {last}" if generation == 0 else f"{first} {last} {generation + 1}"
+
+def next_movie_id(db_path=None):
+    """Return the id after the largest movie id in the database (1 for an empty or new database)"""
+    conn = _connect(db_path or DATABASE_PATH)
+    try:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM movies').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 1  # No movies table yet
+    finally:
+        conn.close()
+
+def synthetic_catalog(movie_count, cast_per_movie=10, seed=42, first_id=1):
+    """
+    Deterministic synthetic catalog for benchmarking
+
+    Each table gets its own seeded generator, so the same arguments always
+    produce the same rows regardless of the order the tables are consumed in.
+    The people pool grows with the catalog (about five credits per person), and
+    every movie's director also appears in its cast as 'Director'.
+
+    Args:
+        movie_count (int): Number of movies (box office and ratings get one row each)
+        cast_per_movie (int): Cast rows per movie, including the director
+        seed (int): Random seed
+        first_id (int): Id of the first movie; pass next_movie_id() to append to a populated database
+
+    Returns:
+        dict: Table name -> generator of dict records, ready for bulk_load
+    """
+    people = max(len(FIRST_NAMES) * len(LAST_NAMES), movie_count * cast_per_movie // 5)
+
+    def director_of(movie_id):
+        return person_name((movie_id * 7919) % people)
+
+    def movies():
+        rng = random.Random(f'{seed}-movies')
+        for movie_id in range(first_id, first_id + movie_count):
+            yield {
+                'id': movie_id,
+                'title': f"The {rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {movie_id}",
+                'year': rng.randint(1920, 2025),
+                'genre': rng.choice(GENRES),
+                'director': director_of(movie_id),
+                'runtime': rng.randint(75, 200),
+                'description': f"{rng.choice(PLOT_SUBJECTS).capitalize()} {rng.choice(PLOT_EVENTS)}.",
+            }
+
+    def box_office():
+        rng = random.Random(f'{seed}-box_office')
+        for movie_id in range(first_id, first_id + movie_count):
+            budget = round(rng.uniform(1, 300), 1)
+            domestic = round(budget * rng.lognormvariate(0, 0.8), 1)
+            international = round(domestic * rng.uniform(0.3, 2.5), 1)
+            yield {
+                'movie_id': movie_id,
+                'domestic_revenue': domestic,
+                'international_revenue': international,
+                'total_revenue': round(domestic + international, 1),
+                'budget': budget,
+                'opening_weekend': round(domestic * rng.uniform(0.1, 0.4), 1),
+            }
+
+    def ratings():
+        rng = random.Random(f'{seed}-ratings')
+        for movie_id in range(first_id, first_id + movie_count):
+            imdb = round(min(9.5, max(1.0, rng.gauss(6.5, 1.1))), 1)
+            yield {
+                'movie_id': movie_id,
+                'imdb_rating': imdb,
+                'rotten_tomatoes': min(100, max(0, int(imdb * 10 + rng.randint(-20, 15)))),
+                'metacritic': min(100, max(0, int(imdb * 10 + rng.randint(-25, 10)))),
+                'audience_score': min(100, max(0, int(imdb * 10 + rng.randint(-10, 10)))),
+            }
+
+    def cast():
+        rng = random.Random(f'{seed}-cast')
+        for movie_id in range(first_id, first_id + movie_count):
+            yield {'movie_id': movie_id, 'person_name': director_of(movie_id), 'role_type': 'Director', 'character_name': None}
+            for position in range(1, cast_per_movie):
+                role_type = 'Writer' if position % 7 == 0 else 'Producer' if position % 9 == 0 else 'Actor'
+                yield {
+                    'movie_id': movie_id,
+                    'person_name': person_name(rng.randrange(people)),
+                    'role_type': role_type,
+                    'character_name': rng.choice(CHARACTER_NAMES) if role_type == 'Actor' else None,
+                }
+
+    return {'movies': movies(), 'box_office': box_office(), 'ratings': ratings(), 'cast': cast()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for table in TABLE_COLUMNS:
+        parser.add_argument(f"--{table.replace('_', '-')}", dest=table, metavar='FILE', help=f'CSV or JSONL rows for {table}')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='Generate N synthetic movies instead of reading files')
+    parser.add_argument('--cast-per-movie', type=int, default=10, help='Cast rows per synthetic movie')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic generator')
+    parser.add_argument('--replace', action='store_true', help="Replace the loaded tables' existing rows in one transaction")
+    parser.add_argument('--db', default=DATABASE_PATH, help='Database file')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        # Appended movies continue after the existing ids
+        first_id = 1 if args.replace else next_movie_id(args.db)
+        sources = synthetic_catalog(args.synthetic, args.cast_per_movie, args.seed, first_id)
+    else:
+        sources = {table: read_file(getattr(args, table)) for table in TABLE_COLUMNS if getattr(args, table)}
+    if not sources:
+        parser.error('Give at least one table file or --synthetic N')
+
+    result = bulk_load(sources, replace=args.replace, db_path=args.db)
+    print(json.dumps(result, indent=2))
+    if not result['success']:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,39 @@
 import sqlite3
 import os
+import re
+import sys
+import time
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+from singleflight import SingleFlight
+from sql_params import SQLSyntaxError, parameterize_sql, params_key
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'movies.db')
+DATABASE_PATH = os.getenv('DATABASE_PATH') or os.path.join(os.path.dirname(__file__), 'movies.db')
+
+# Read connection pool settings
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))  # bytes
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '65536'))  # page cache per connection
+DB_CACHED_STATEMENTS = int(os.getenv('DB_CACHED_STATEMENTS', '512'))  # prepared statements kept per connection
+
+# Rows fetched per batch when streaming results
+DB_STREAM_BATCH_SIZE = int(os.getenv('DB_STREAM_BATCH_SIZE', '500'))
+
+# Memory budget for cached query results (0 disables the cache)
+DB_RESULT_CACHE_BYTES = int(os.getenv('DB_RESULT_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+# Cost check verdicts remembered per query shape
+QUERY_PLAN_CACHE_ENTRIES = int(os.getenv('QUERY_PLAN_CACHE_ENTRIES', '1000'))
+
+# Query cost guard
+QUERY_MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', '100000'))  # rows returned by one execution
+QUERY_TIMEOUT_SECONDS = float(os.getenv('QUERY_TIMEOUT_SECONDS', '10'))  # wall clock per execution (0 = none)
+QUERY_MAX_JOIN_ROWS = int(os.getenv('QUERY_MAX_JOIN_ROWS', '10000000'))  # row combinations of nested loops
+QUERY_MAX_SORTED_SCAN_ROWS = int(os.getenv('QUERY_MAX_SORTED_SCAN_ROWS', '5000000'))  # full scan that must be sorted/grouped
 
 def get_db_connection():
     """Create and return a database connection"""
@@ -11,14 +43,587 @@ def get_db_connection():
     conn.execute('PRAGMA foreign_keys = ON')
     return conn
 
-def init_db():
+def get_read_connection():
+    """
+    Create a read-only connection tuned for query execution
+    
+    The database is opened through a mode=ro URI with query_only set, so even a
+    query that slips past validation cannot modify data. mmap and a larger page
+    cache keep hot pages in memory between queries on the same connection.
+    """
+    uri = f"file:{quote(DATABASE_PATH)}?mode=ro"
+    # Queries run as parameterized shapes, so a large statement cache skips re-preparing them
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+    return conn
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the timeout"""
+
+class ConnectionPool:
     """
-    Initialize the database with all tables and dummy data
-    Schema definition is documented in schema.json
+    Bounded pool of long-lived read-only connections
+    
+    Connections are opened lazily up to max_size and handed out LIFO, so the
+    most recently used connection (with the warmest page cache) is reused first.
+    """
+    
+    def __init__(self, factory=get_read_connection, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def _acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+        
+        if conn is None:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+        
+        waited = 0.0
+        if conn is None:
+            # Pool exhausted: block until another request returns a connection
+            start = time.perf_counter()
+            try:
+                conn = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise PoolTimeout(f"No database connection available after {self.timeout}s")
+            finally:
+                waited = time.perf_counter() - start
+        
+        with self._lock:
+            self.checkouts += 1
+            self._in_use += 1
+            if waited:
+                self.waits += 1
+                self.total_wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return conn
+    
+    def _release(self, conn):
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with-block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+    
+    def close_all(self):
+        """Close idle connections so the next checkout reopens the database"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self):
+        """Return checkout and wait-time metrics"""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open_connections': self._created,
+                'in_use': self._in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'total_wait_ms': round(self.total_wait_seconds * 1000, 3),
+                'avg_wait_ms': round(self.total_wait_seconds / self.waits * 1000, 3) if self.waits else 0.0,
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 3),
+            }
+
+_SQL_LITERAL = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+def normalize_sql(sql):
+    """
+    Canonical form of a query for cache keys
+    
+    Collapses whitespace, lowercases and drops a trailing semicolon outside of
+    quoted strings, so formatting differences between otherwise identical LLM
+    outputs map to the same key. String literals are left untouched.
+    """
+    parts = _SQL_LITERAL.split(sql.strip().rstrip(';').strip())
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i]).lower()
+    return ''.join(parts)
+
+def _estimate_size(value):
+    """Rough in-memory size in bytes of a query result"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+class ResultCache:
+    """
+    LRU cache of query results bounded by an estimated size in bytes
+    
+    Every lookup compares SQLite's PRAGMA data_version (read on a dedicated
+    connection, since the value is only meaningful per connection) with the
+    version the entries were stored under. Any commit to the database by
+    another connection or process bumps it, and the whole cache is dropped.
+    """
+    
+    def __init__(self, max_bytes=DB_RESULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._version_conn = None
+        self._lock = threading.Lock()
+    
+    def data_version(self):
+        """Return a token that changes whenever the database contents change"""
+        with self._lock:
+            if self._version_conn is None:
+                self._version_conn = get_read_connection()
+            data_version = self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+        # data_version doesn't notice the file itself being replaced, so include its identity
+        return (os.stat(DATABASE_PATH).st_ino, data_version)
+    
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.current_bytes = 0
+            self._version = version
+    
+    def get(self, key, version):
+        """Return the cached result for key, or None on a miss or after a data change"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, key, result, version):
+        """Store a result, evicting least recently used entries to stay within the byte budget"""
+        size = _estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def stats(self):
+        """Return hit/miss/eviction counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+class QueryTimeout(Exception):
+    """Raised when a query runs past QUERY_TIMEOUT_SECONDS"""
+
+@contextmanager
+def query_deadline(conn, seconds=QUERY_TIMEOUT_SECONDS):
+    """
+    Interrupt SQLite work on conn that runs longer than seconds
+    
+    A progress handler is polled every 1000 VM instructions and aborts the
+    statement once the deadline passes; SQLite then raises
+    OperationalError('interrupted'), which is translated to QueryTimeout.
+    """
+    if not seconds:
+        yield
+        return
+    
+    deadline = time.monotonic() + seconds
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 1000)
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if str(e) == 'interrupted':
+            raise QueryTimeout(f"Query exceeded the {seconds:g}s time limit") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+_PLAN_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?')
+_PLAN_SEARCH = re.compile(
+    r'^SEARCH (?:TABLE )?(\w+)(?: AS (\w+))? USING (AUTOMATIC )?(?:COVERING |PARTIAL )*'
+    r'(?:INDEX (\w+)|INTEGER PRIMARY KEY|PRIMARY KEY) \((.*)\)'
+)
+# alias.column = alias.column, and the columns of JOIN ... USING (...)
+_JOIN_EQUALITY = re.compile(r'"?(\w+)"?\."?(\w+)"?\s*=\s*"?(\w+)"?\."?(\w+)"?')
+_JOIN_USING = re.compile(r'\bUSING\s*\(([^)]*)\)', re.IGNORECASE)
+# An outer LIMIT stops nested loops once enough rows come out, unless every row
+# combination has to be produced first to group, aggregate or de-duplicate them
+# (sorts show up in the plan as a temp B-tree). A filter that matches almost
+# nothing can still run until the query deadline.
+_OUTER_LIMIT = re.compile(r'\bLIMIT\s+(?:\?|\d+)(?:\s*(?:OFFSET|,)\s*(?:\?|\d+))?\s*$', re.IGNORECASE)
+_COMBINATION_FILTERS = re.compile(
+    r'\b(?:HAVING|GROUP|DISTINCT|OVER|COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\b',
+    re.IGNORECASE
+)
+_SQL_KEYWORDS = {
+    'where', 'join', 'inner', 'left', 'right', 'full', 'cross', 'natural', 'on', 'using',
+    'group', 'order', 'limit', 'having', 'union', 'except', 'intersect', 'as', 'window',
+}
+
+def table_aliases(sql, tables):
+    """Map each alias (and table name) used in sql to its table"""
+    aliases = {}
+    for table in tables:
+        for match in re.finditer(rf'\b{re.escape(table)}\b(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+            aliases[table.lower()] = table
+            alias = match.group(1)
+            if alias and alias.lower() not in _SQL_KEYWORDS:
+                aliases[alias.lower()] = table
+    return aliases
+
+def _estimate_rows(conn, table):
+    """Cheap row count estimate: the largest rowid is a B-tree seek, not a scan"""
+    try:
+        return conn.execute(f'SELECT MAX(_rowid_) FROM "{table}"').fetchone()[0] or 0
+    except sqlite3.Error:
+        return 0
+
+def _estimate_search_rows(conn, table, index, constraints):
+    """
+    Rows an index SEARCH visits per lookup: sqlite_stat1's average rows per key
+    for its leading equality constraints, or the table size without statistics
+    """
+    equalities = 0
+    for term in constraints.split(' AND '):
+        if not re.fullmatch(r'\w+=\?', term.strip()):
+            break
+        equalities += 1
+    if equalities and index is None:
+        return 1  # Rowid or primary key lookup
+    if equalities:
+        try:
+            row = conn.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = ? AND idx = ?', (table, index)).fetchone()
+        except sqlite3.Error:
+            row = None  # Never analyzed
+        stats = row[0].split() if row else []
+        if len(stats) > equalities and stats[equalities].isdigit():
+            return int(stats[equalities])
+    return _estimate_rows(conn, table)
+
+def _join_columns(sql):
+    """(alias, column) pairs compared with another table's column; '*' stands for any alias in USING"""
+    joined = set()
+    for left, left_column, right, right_column in _JOIN_EQUALITY.findall(sql):
+        if left.lower() != right.lower():
+            joined.add((left.lower(), left_column.lower()))
+            joined.add((right.lower(), right_column.lower()))
+    for columns in _JOIN_USING.findall(sql):
+        joined.update(('*', column.strip().strip('"').lower()) for column in columns.split(','))
+    return joined
+
+def _is_join_lookup(alias, constraints, joined):
+    """Whether a SEARCH is driven by a join equality rather than by constants alone"""
+    for term in constraints.split(' AND '):
+        column = re.match(r'\w+', term.strip()).group(0).lower()
+        # The rowid of these tables is their INTEGER PRIMARY KEY id
+        for name in ('id', 'rowid') if column == 'rowid' else (column,):
+            if (alias, name) in joined or ('*', name) in joined:
+                return True
+    return False
+
+def explain_query_plan(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN rows (id, parent, notused, detail) for sql on conn"""
+    # EXPLAIN never starts a read transaction, so on its own it keeps planning against
+    # whatever schema this connection loaded last; reading sqlite_master reloads it
+    conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+    schema_version = conn.execute('PRAGMA schema_version').fetchone()[0]
+    # Cached EXPLAIN statements keep their old plan, so key them by schema version
+    return conn.execute(f'EXPLAIN QUERY PLAN {sql}\n-- schema {schema_version}', params).fetchall()
+
+class PlanCache:
+    """
+    LRU of cost check verdicts keyed by query shape
+
+    Queries that differ only in their literal values share a plan, so the
+    EXPLAIN QUERY PLAN check runs once per shape. Entries are keyed by the
+    result cache's data version too, so new indexes and table sizes are seen.
+    """
+    
+    def __init__(self, max_entries=QUERY_PLAN_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return verdict
+    
+    def set(self, key, verdict):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self):
+        """Return hit/miss counters and the number of shapes cached"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'shapes': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+def check_query_cost(sql):
+    """
+    Inspect EXPLAIN QUERY PLAN for a query and reject plans that are too expensive
+    
+    Rejects:
+        - Nested loops (cartesian-style joins) whose estimated row combinations
+          exceed QUERY_MAX_JOIN_ROWS, unless an outer LIMIT stops them early
+          (no grouping, aggregate, de-duplication or sort in the query). A loop
+          is a full scan, or an index search constrained only by constants,
+          sized from sqlite_stat1; searches on a join column are not counted
+        - Full scans of tables larger than QUERY_MAX_SORTED_SCAN_ROWS that also
+          need a temporary sort/group B-tree, so no LIMIT can stop them early
+    
+    The verdict is cached per query shape (the SQL with its literals lifted out).
+    
+    Args:
+        sql (str): Validated SELECT query
+        
+    Returns:
+        dict: Contains 'allowed' (bool), 'reasons' (list of rejection reasons)
+              and 'plan' (list of plan detail lines)
+    """
+    try:
+        shape, params = parameterize_sql(sql)
+    except SQLSyntaxError:
+        # Let execution report the SQL error
+        return {'allowed': True, 'reasons': [], 'plan': []}
+    
+    key = (shape, result_cache.data_version())
+    verdict = plan_cache.get(key)
+    if verdict is None:
+        verdict = _check_query_cost(shape, params)
+        plan_cache.set(key, verdict)
+    return verdict
+
+def _check_query_cost(sql, params):
+    try:
+        with get_pool().connection() as conn:
+            plan = explain_query_plan(conn, sql, params)
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            aliases = table_aliases(sql, tables)
+            joined = _join_columns(sql)
+            
+            # Loops grouped by parent node: loops under the same parent run nested. Each
+            # is (description, table, rows per pass, full scan): full scans, and searches
+            # that only constants constrain, so every outer row repeats the same search
+            loops_by_parent = {}
+            sizes = {}
+            for node_id, parent, _, detail in plan:
+                scan = _PLAN_SCAN.match(detail)
+                search = _PLAN_SEARCH.match(detail)
+                match = scan or search
+                if not match or detail.startswith('SCAN CONSTANT ROW') or 'VIRTUAL TABLE' in detail:
+                    continue
+                table = match.group(1) if match.group(2) else aliases.get(match.group(1).lower())
+                if table is None:
+                    continue  # Subquery or CTE: its own tables are checked as separate nodes
+                if table not in sizes:
+                    sizes[table] = _estimate_rows(conn, table)
+                if scan:
+                    loop = (table, table, sizes[table], True)
+                else:
+                    alias = (match.group(2) or match.group(1)).lower()
+                    automatic, index, constraints = search.group(3), search.group(4), search.group(5)
+                    if automatic or _is_join_lookup(alias, constraints, joined):
+                        continue
+                    loop = (f"{table} where {constraints}", table, _estimate_search_rows(conn, table, index, constraints), False)
+                loops_by_parent.setdefault(parent, []).append(loop)
+    except sqlite3.Error:
+        # Let execution report the SQL error
+        return {'allowed': True, 'reasons': [], 'plan': []}
+    
+    reasons = []
+    details = [row[3] for row in plan]
+    sorts = any(detail.startswith('USE TEMP B-TREE') for detail in details)
+    limited = bool(_OUTER_LIMIT.search(sql)) and not sorts and not _COMBINATION_FILTERS.search(sql)
+    
+    for loops in loops_by_parent.values():
+        if len(loops) > 1 and not limited:
+            combinations = 1
+            for _, _, rows, _ in loops:
+                combinations *= max(rows, 1)
+            if combinations > QUERY_MAX_JOIN_ROWS:
+                names = ' x '.join(f"{description} ({rows:,} rows)" for description, _, rows, _ in loops)
+                reasons.append(
+                    f"Cartesian join: {names} is about {combinations:,} row combinations "
+                    f"(limit {QUERY_MAX_JOIN_ROWS:,}); join the tables on movie_id"
+                )
+        if sorts:
+            for _, table, _, full_scan in loops:
+                if full_scan and sizes[table] > QUERY_MAX_SORTED_SCAN_ROWS:
+                    reasons.append(
+                        f"Full scan of {table} ({sizes[table]:,} rows) must be sorted or grouped before "
+                        f"any row is returned (limit {QUERY_MAX_SORTED_SCAN_ROWS:,}); add a filter"
+                    )
+    
+    return {'allowed': not reasons, 'reasons': reasons, 'plan': details}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Results of recently executed queries, keyed by query shape and bound values
+result_cache = ResultCache()
+
+# Cost check verdicts, keyed by query shape
+plan_cache = PlanCache()
+
+# Concurrent executions of the same SQL text share one SQLite run
+query_flight = SingleFlight('sql')
+
+def get_pool():
+    """Return the process-wide read connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+# Indexes for the foreign keys every join uses and the columns questions filter on
+DEFAULT_INDEXES = [
+    ('idx_box_office_movie_id', 'box_office', ('movie_id',)),
+    ('idx_ratings_movie_id', 'ratings', ('movie_id',)),
+    ('idx_cast_movie_id', 'cast', ('movie_id',)),
+    ('idx_cast_person_name', 'cast', ('person_name',)),
+    ('idx_cast_role_type', 'cast', ('role_type',)),
+    ('idx_movies_genre', 'movies', ('genre',)),
+    ('idx_movies_year', 'movies', ('year',)),
+]
+
+def create_indexes(cursor, indexes=DEFAULT_INDEXES):
+    """Create the given (name, table, columns) indexes if they do not exist yet"""
+    for name, table, columns in indexes:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})')
+
+# FTS5 indexes over the free-text columns, as (name, table, columns); see schema.json
+FTS_INDEXES = [
+    ('cast_fts', 'cast', ('person_name', 'character_name')),
+    ('movies_fts', 'movies', ('title', 'description')),
+]
+
+def create_fts_indexes(cursor, indexes=FTS_INDEXES):
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    Create external-content FTS5 tables and the triggers that keep them in sync
     
+    The FTS tables store only the index; rows are read from the base table by
+    rowid. A table created here for an already populated base table is rebuilt
+    from it once.
+    """
+    for name, table, columns in indexes:
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{column}' for column in columns)
+        old_values = ', '.join(f'old.{column}' for column in columns)
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5(
+                {column_list}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {name} (rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {name} ({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE ON {table} BEGIN
+                INSERT INTO {name} ({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {name} (rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        ''')
+        
+        if not exists:
+            cursor.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+
+def create_tables(cursor):
+    """Create the four catalog tables if they do not exist"""
     # Create movies table (core movie information)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS movies (
@@ -70,8 +675,258 @@ def init_db():
             FOREIGN KEY (movie_id) REFERENCES movies(id)
         )
     ''')
+
+# Materialized summaries (see schema.json): one denormalized row per movie with
+# profit and ROI precomputed, and per-genre, per-year and per-person aggregates.
+# Triggers on the base tables keep them current row by row.
+MOVIE_FACTS_COLUMNS = (
+    'movie_id', 'title', 'year', 'genre', 'director', 'runtime',
+    'domestic_revenue', 'international_revenue', 'total_revenue', 'budget', 'opening_weekend',
+    'profit', 'roi_percent', 'imdb_rating', 'rotten_tomatoes', 'metacritic', 'audience_score',
+)
+
+# Box office and ratings are one row per movie; if a movie has several, the first one wins
+_MOVIE_FACTS_SELECT = '''
+    SELECT m.id, m.title, m.year, m.genre, m.director, m.runtime,
+           b.domestic_revenue, b.international_revenue, b.total_revenue, b.budget, b.opening_weekend,
+           b.total_revenue - b.budget,
+           CASE WHEN b.budget > 0 THEN ROUND((b.total_revenue - b.budget) / b.budget * 100, 2) END,
+           r.imdb_rating, r.rotten_tomatoes, r.metacritic, r.audience_score
+    FROM movies m
+    LEFT JOIN box_office b ON b.id = (SELECT MIN(id) FROM box_office WHERE movie_id = m.id)
+    LEFT JOIN ratings r ON r.id = (SELECT MIN(id) FROM ratings WHERE movie_id = m.id)
+'''
+
+# Aggregate tables as (name, key columns and types, SQL selecting the keys a movie_facts
+# row counts towards). They store running sums and counts, so a movie is added or
+# removed with a delta; the averages are generated columns over the sums.
+AGGREGATE_SUMMARIES = [
+    ('genre_summary', (('genre', 'TEXT'),), 'SELECT {row}.genre'),
+    ('year_summary', (('year', 'INTEGER'),), 'SELECT {row}.year'),
+    ('person_summary', (('person_name', 'TEXT'), ('role_type', 'TEXT')),
+     'SELECT DISTINCT person_name, role_type FROM cast WHERE movie_id = {row}.movie_id'),
+]
+
+# Running sums as (column, value for one movie_facts row, aggregate over movie_facts f)
+_AGGREGATE_SUMS = [
+    ('movie_count', '1', 'COUNT(*)'),
+    ('total_revenue', 'COALESCE({row}.total_revenue, 0)', 'TOTAL(f.total_revenue)'),
+    ('total_budget', 'COALESCE({row}.budget, 0)', 'TOTAL(f.budget)'),
+    ('total_profit', 'COALESCE({row}.profit, 0)', 'TOTAL(f.profit)'),
+    ('revenue_count', '{row}.total_revenue IS NOT NULL', 'COUNT(f.total_revenue)'),
+    ('rating_sum', 'COALESCE({row}.imdb_rating, 0)', 'TOTAL(f.imdb_rating)'),
+    ('rating_count', '{row}.imdb_rating IS NOT NULL', 'COUNT(f.imdb_rating)'),
+]
+
+SUMMARY_INDEXES = [
+    ('idx_movie_facts_genre', 'movie_facts', ('genre',)),
+    ('idx_movie_facts_year', 'movie_facts', ('year',)),
+    ('idx_movie_facts_total_revenue', 'movie_facts', ('total_revenue',)),
+    ('idx_movie_facts_profit', 'movie_facts', ('profit',)),
+    ('idx_movie_facts_roi_percent', 'movie_facts', ('roi_percent',)),
+    ('idx_movie_facts_imdb_rating', 'movie_facts', ('imdb_rating',)),
+    ('idx_person_summary_role_revenue', 'person_summary', ('role_type', 'total_revenue')),
+]
+
+# A person's career span: earliest and latest release year of their credited movies
+_PERSON_SPAN = '''
+    SELECT {aggregate}(f.year) FROM cast c JOIN movie_facts f ON f.movie_id = c.movie_id
+    WHERE c.person_name = person_summary.person_name AND c.role_type = person_summary.role_type
+'''
+
+def _person_summary_select(credits):
+    # person_summary rows computed from scratch for the (person_name, role_type, movie_id) rows `credits` selects
+    sums = ', '.join(aggregate for _, _, aggregate in _AGGREGATE_SUMS)
+    return f'''
+        SELECT c.person_name, c.role_type, {sums}, MIN(f.year), MAX(f.year)
+        FROM ({credits}) c
+        JOIN movie_facts f ON f.movie_id = c.movie_id
+        GROUP BY c.person_name, c.role_type
+    '''
+
+def _summary_columns(table):
+    keys = next(keys for name, keys, _ in AGGREGATE_SUMMARIES if name == table)
+    columns = [key for key, _ in keys] + [column for column, _, _ in _AGGREGATE_SUMS]
+    if table == 'person_summary':
+        columns += ['first_year', 'last_year']
+    return ', '.join(columns)
+
+def _refresh_movie_facts(movie_id):
+    # Delete and re-insert (not REPLACE, which skips delete triggers) so the aggregates see both sides
+    return f'''
+        DELETE FROM movie_facts WHERE movie_id = {movie_id};
+        INSERT INTO movie_facts ({', '.join(MOVIE_FACTS_COLUMNS)}) {_MOVIE_FACTS_SELECT} WHERE m.id = {movie_id};
+    '''
+
+def _refresh_person(row):
+    # Recompute one person_summary row after a credit changes (it may duplicate another credit)
+    credits = (
+        'SELECT DISTINCT person_name, role_type, movie_id FROM cast '
+        f'WHERE person_name = {row}.person_name AND role_type = {row}.role_type'
+    )
+    return f'''
+        DELETE FROM person_summary WHERE person_name = {row}.person_name AND role_type = {row}.role_type;
+        INSERT INTO person_summary ({_summary_columns('person_summary')}) {_person_summary_select(credits)};
+    '''
+
+def _aggregate_add(table, keys, key_select):
+    key_columns = ', '.join(key for key, _ in keys)
+    values = ', '.join(value.format(row='new') for _, value, _ in _AGGREGATE_SUMS)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column, _, _ in _AGGREGATE_SUMS)
+    if table == 'person_summary':
+        values += ', new.year, new.year'
+        updates += ', first_year = MIN(first_year, excluded.first_year), last_year = MAX(last_year, excluded.last_year)'
+    # WHERE true keeps ON CONFLICT from being parsed as part of the SELECT
+    return f'''
+        INSERT INTO {table} ({_summary_columns(table)})
+        SELECT *, {values} FROM ({key_select.format(row='new')}) WHERE true
+        ON CONFLICT ({key_columns}) DO UPDATE SET {updates};
+    '''
+
+def _aggregate_remove(table, keys, key_select):
+    matches = f"({', '.join(key for key, _ in keys)}) IN ({key_select.format(row='old')})"
+    updates = ', '.join(f'{column} = {column} - ({value.format(row="old")})' for column, value, _ in _AGGREGATE_SUMS)
+    sql = f'''
+        UPDATE {table} SET {updates} WHERE {matches};
+        DELETE FROM {table} WHERE movie_count <= 0 AND {matches};
+    '''
+    if table == 'person_summary':
+        # The span only needs recomputing for people whose first or last movie was removed
+        sql += f'''
+            UPDATE person_summary SET
+                first_year = ({_PERSON_SPAN.format(aggregate='MIN')}),
+                last_year = ({_PERSON_SPAN.format(aggregate='MAX')})
+            WHERE {matches} AND old.year IN (first_year, last_year);
+        '''
+    return sql
+
+def _summary_triggers():
+    """(name, table, event, body) for every trigger that maintains the summaries"""
+    triggers = []
+    # Base table changes refresh the affected movie's movie_facts row (and the old
+    # movie's, if a row moved to another movie)
+    for table, movie_id in (('movies', 'id'), ('box_office', 'movie_id'), ('ratings', 'movie_id')):
+        triggers += [
+            (f'{table}_facts_insert', table, 'INSERT', _refresh_movie_facts(f'new.{movie_id}')),
+            (f'{table}_facts_delete', table, 'DELETE', _refresh_movie_facts(f'old.{movie_id}')),
+            (f'{table}_facts_update', table, 'UPDATE', _refresh_movie_facts(f'new.{movie_id}')),
+            (f'{table}_facts_move', table, f'UPDATE WHEN old.{movie_id} IS NOT new.{movie_id}',
+             _refresh_movie_facts(f'old.{movie_id}')),
+        ]
     
-    # Check if movies table is empty
+    # Credit changes recompute the people involved
+    triggers += [
+        ('cast_summary_insert', 'cast', 'INSERT', _refresh_person('new')),
+        ('cast_summary_delete', 'cast', 'DELETE', _refresh_person('old')),
+        ('cast_summary_update', 'cast', 'UPDATE', _refresh_person('old') + _refresh_person('new')),
+    ]
+    
+    # movie_facts rows are added to and removed from the aggregates as deltas
+    triggers += [
+        ('movie_facts_insert', 'movie_facts', 'INSERT',
+         ''.join(_aggregate_add(*summary) for summary in AGGREGATE_SUMMARIES)),
+        ('movie_facts_delete', 'movie_facts', 'DELETE',
+         ''.join(_aggregate_remove(*summary) for summary in AGGREGATE_SUMMARIES)),
+    ]
+    return triggers
+
+SUMMARY_TRIGGERS = _summary_triggers()
+
+def _create_summary_triggers(cursor, table=None):
+    for name, trigger_table, event, body in SUMMARY_TRIGGERS:
+        if table is None or trigger_table == table:
+            event, _, condition = event.partition(' WHEN ')
+            when = f'WHEN {condition}' if condition else ''
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {trigger_table} {when} BEGIN {body} END')
+
+def create_summary_tables(cursor):
+    """
+    Create the materialized summary tables and the triggers that keep them current
+    
+    movie_facts has one row per movie; genre_summary, year_summary and
+    person_summary hold running sums per genre, year and (person_name,
+    role_type). Tables created here for an already populated catalog are
+    filled from it once.
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movie_facts'"
+    ).fetchone()
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS movie_facts (
+            movie_id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            genre TEXT NOT NULL,
+            director TEXT NOT NULL,
+            runtime INTEGER,
+            domestic_revenue REAL,
+            international_revenue REAL,
+            total_revenue REAL,
+            budget REAL,
+            opening_weekend REAL,
+            profit REAL,
+            roi_percent REAL,
+            imdb_rating REAL,
+            rotten_tomatoes INTEGER,
+            metacritic INTEGER,
+            audience_score INTEGER
+        )
+    ''')
+    for table, keys, _ in AGGREGATE_SUMMARIES:
+        key_columns = ''.join(f'{key} {key_type} NOT NULL,\n' for key, key_type in keys)
+        span_columns = 'first_year INTEGER,\nlast_year INTEGER,\n' if table == 'person_summary' else ''
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key_columns}
+                movie_count INTEGER NOT NULL,
+                total_revenue REAL NOT NULL,
+                total_budget REAL NOT NULL,
+                total_profit REAL NOT NULL,
+                revenue_count INTEGER NOT NULL,
+                rating_sum REAL NOT NULL,
+                rating_count INTEGER NOT NULL,
+                {span_columns}
+                avg_revenue REAL GENERATED ALWAYS AS (ROUND(total_revenue / NULLIF(revenue_count, 0), 2)),
+                avg_imdb_rating REAL GENERATED ALWAYS AS (ROUND(rating_sum / NULLIF(rating_count, 0), 2)),
+                PRIMARY KEY ({', '.join(key for key, _ in keys)})
+            )
+        ''')
+    create_indexes(cursor, SUMMARY_INDEXES)
+    _create_summary_triggers(cursor)
+    
+    if not exists:
+        rebuild_summaries(cursor)
+
+def rebuild_summaries(cursor):
+    """
+    Recompute every summary table from the base tables in a few set-based statements
+    
+    Used after bulk loads, which drop the maintenance triggers while loading.
+    The movie_facts triggers are dropped while it runs, so the aggregates are
+    computed once with GROUP BY rather than row by row.
+    """
+    for name, table, _, _ in SUMMARY_TRIGGERS:
+        if table == 'movie_facts':
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    
+    cursor.execute('DELETE FROM movie_facts')
+    cursor.execute(f"INSERT INTO movie_facts ({', '.join(MOVIE_FACTS_COLUMNS)}) {_MOVIE_FACTS_SELECT}")
+    
+    sums = ', '.join(aggregate for _, _, aggregate in _AGGREGATE_SUMS)
+    for table, keys, _ in AGGREGATE_SUMMARIES:
+        cursor.execute(f'DELETE FROM {table}')
+        if table == 'person_summary':
+            select = _person_summary_select('SELECT DISTINCT person_name, role_type, movie_id FROM cast')
+        else:
+            key = keys[0][0]
+            select = f'SELECT f.{key}, {sums} FROM movie_facts f GROUP BY f.{key}'
+        cursor.execute(f'INSERT INTO {table} ({_summary_columns(table)}) {select}')
+    
+    _create_summary_triggers(cursor, 'movie_facts')
+
+def seed_sample_data(cursor):
+    """Insert the 15 sample movies with their box office, ratings and cast if the catalog is empty"""
     cursor.execute('SELECT COUNT(*) FROM movies')
     count = cursor.fetchone()[0]
     
@@ -248,43 +1103,142 @@ def init_db():
             VALUES (?, ?, ?, ?)
         ''', cast_data)
         
-        conn.commit()
         print(f"Database initialized with {len(movies_data)} movies, {len(box_office_data)} box office records, {len(ratings_data)} rating records, and {len(cast_data)} cast members")
     else:
         print(f"Database already contains {count} movies")
+
+def create_schema(cursor):
+    """Create the catalog tables, their indexes and FTS indexes, and the summary tables"""
+    create_tables(cursor)
+    create_indexes(cursor)
+    create_fts_indexes(cursor)
+    create_summary_tables(cursor)
+
+# Schema migrations in the order they are applied; PRAGMA user_version records
+# how many a database has had. Append new steps, never reorder or edit old ones.
+MIGRATIONS = [
+    create_schema,
+    seed_sample_data,
+]
+DB_SCHEMA_VERSION = len(MIGRATIONS)
+
+def init_db(db_path=None):
+    """
+    Create or upgrade the database schema and seed the sample data
+    
+    Runs the MIGRATIONS the database has not had yet in one transaction and
+    records the new version in PRAGMA user_version, so it is safe to run any
+    number of times: an up-to-date database costs one PRAGMA read. BEGIN
+    IMMEDIATE serializes workers that start at the same time. Run it before
+    serving (flask --app app init-db, python database.py, or gunicorn's
+    on_starting hook) rather than at import time. Schema definition is
+    documented in schema.json.
     
-    conn.close()
+    Args:
+        db_path (str): Database file (defaults to DATABASE_PATH)
+        
+    Returns:
+        dict: Contains 'from_version', 'version' and 'applied' (names of the migrations run)
+    """
+    conn = sqlite3.connect(db_path or DATABASE_PATH, isolation_level=None)  # Transactions are managed explicitly
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= DB_SCHEMA_VERSION:
+            return {'from_version': version, 'version': version, 'applied': []}
+        
+        # WAL lets pooled readers run concurrently with writers; the mode is persistent
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA foreign_keys = ON')
+        
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            from_version = conn.execute('PRAGMA user_version').fetchone()[0]
+            pending = MIGRATIONS[from_version:]
+            for migration in pending:
+                migration(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {max(from_version, DB_SCHEMA_VERSION)}')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+    
+    applied = [migration.__name__ for migration in pending]
+    if applied:
+        print(f"Database migrated from version {from_version} to {DB_SCHEMA_VERSION}: {', '.join(applied)}")
+    return {'from_version': from_version, 'version': max(from_version, DB_SCHEMA_VERSION), 'applied': applied}
 
-def execute_sql_query(sql):
+def execute_sql_query(sql, as_dicts=True):
     """
     Execute a SQL query and return results
     
+    Literals are lifted out of the SQL and bound as parameters (see
+    sql_params.parameterize_sql), so queries that differ only in their values
+    reuse one prepared statement from the connection's statement cache.
+    
+    Results are served from the result cache when the same query shape ran
+    with the same values since the database last changed, and identical queries
+    already running on another thread are not executed again. Either way the
+    returned result may be shared and must be treated as read-only.
+    
     Args:
         sql (str): SQL query to execute
+        as_dicts (bool): Return rows as {column: value} dicts; when False rows are
+                         plain tuples in column order, which is cheaper for compact responses
         
     Returns:
         dict: Contains 'data' (list of rows), 'columns' (column names), 'row_count'
+              and 'truncated' (True when more than QUERY_MAX_ROWS rows matched)
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        
-        # Get column names
-        columns = [description[0] for description in cursor.description] if cursor.description else []
+        shape, params = parameterize_sql(sql)
+    except SQLSyntaxError as e:
+        return {'success': False, 'error': str(e), 'data': [], 'columns': [], 'row_count': 0}
+    key = (shape, params_key(params), as_dicts)
+    
+    if result_cache.max_bytes:
+        version = result_cache.data_version()
+        cached = result_cache.get(key, version)
+        if cached is not None:
+            return cached
+    
+    result = query_flight.do(key, lambda: _execute_sql_query(shape, params, as_dicts))
+    
+    if result_cache.max_bytes and result['success']:
+        result_cache.set(key, result, version)
+    return result
+
+def _execute_sql_query(sql, params, as_dicts):
+    try:
+        with get_pool().connection() as conn, query_deadline(conn):
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            
+            # Get column names
+            columns = [description[0] for description in cursor.description] if cursor.description else []
+            
+            # Fetch results up to the row cap (one extra row detects truncation)
+            rows = cursor.fetchmany(QUERY_MAX_ROWS + 1)
+            cursor.close()
         
-        # Fetch all results
-        rows = cursor.fetchall()
-        conn.close()
+        truncated = len(rows) > QUERY_MAX_ROWS
+        if truncated:
+            rows = rows[:QUERY_MAX_ROWS]
         
-        # Convert rows to list of dictionaries
-        data = [dict(row) for row in rows]
+        # Convert rows to list of dictionaries or tuples
+        if as_dicts:
+            data = [dict(row) for row in rows]
+        else:
+            data = [tuple(row) for row in rows]
         
         return {
             'success': True,
             'data': data,
             'columns': columns,
-            'row_count': len(data)
+            'row_count': len(data),
+            'truncated': truncated
         }
     
     except Exception as e:
@@ -295,3 +1249,43 @@ def execute_sql_query(sql):
             'columns': [],
             'row_count': 0
         }
+
+def stream_sql_query(sql, batch_size=DB_STREAM_BATCH_SIZE):
+    """
+    Execute a SQL query and yield its results incrementally
+    
+    Rows are pulled with fetchmany, so only one batch is held in memory at a
+    time. The pooled connection stays checked out until the generator is
+    exhausted or closed (e.g. when the client disconnects). The time limit
+    applies to executing the statement and to fetching each batch, not to
+    time spent waiting on the client. Literals are bound as parameters, as in
+    execute_sql_query.
+    
+    Args:
+        sql (str): SQL query to execute
+        batch_size (int): Number of rows per yielded batch
+        
+    Yields:
+        tuple: ('columns', [column names]) first, then ('rows', [row tuples]) per batch
+    """
+    shape, params = parameterize_sql(sql)
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        with query_deadline(conn):
+            cursor.execute(shape, params)
+        
+        columns = [description[0] for description in cursor.description] if cursor.description else []
+        yield 'columns', columns
+        
+        try:
+            while True:
+                with query_deadline(conn):
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield 'rows', [tuple(row) for row in rows]
+        finally:
+            cursor.close()
+
+if __name__ == '__main__':
+    init_db()
@@ -0,0 +1,74 @@
+"""
+Full-text search helpers
+
+Rewrites `LIKE '%term%'` predicates on columns covered by an FTS5 index (see
+FTS_INDEXES in database.py) into indexed MATCH lookups, so name and title
+questions no longer scan the whole table.
+"""
+import os
+import re
+from database import FTS_INDEXES, table_aliases
+
+# Off by default: FTS matches whole words, so the rewrite can return fewer rows than the LIKE
+FTS_REWRITE_LIKE = os.getenv('FTS_REWRITE_LIKE', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+# [LOWER(][alias.]column[)] [NOT] LIKE '%term%' [ESCAPE ...]
+_LIKE_PREDICATE = re.compile(
+    r"(LOWER\(\s*)?(?:(\w+)\.)?(\w+)(\s*\))?\s+(NOT\s+)?LIKE\s+'%((?:[^'%_]|'')+)%'(\s*ESCAPE\b)?",
+    re.IGNORECASE
+)
+
+# Terms that tokenize the same way in FTS5 as they read in the LIKE pattern
+_SEARCH_TERM = re.compile(r"[\w .'-]*\w[\w .'-]*")
+
+def fts_match_subquery(fts_name, column, term):
+    """Build `(SELECT rowid FROM fts WHERE fts MATCH 'column : "term" *')` for a search term"""
+    # Inside the SQL literal single quotes stay doubled; the FTS phrase needs no further escaping
+    phrase = ' '.join(term.lower().split())
+    return f"(SELECT rowid FROM {fts_name} WHERE {fts_name} MATCH '{column} : \"{phrase}\" *')"
+
+def rewrite_like_predicates(sql):
+    """
+    Replace `LIKE '%term%'` filters on full-text indexed columns with FTS5 lookups
+
+    `LOWER(c.person_name) LIKE '%tom hanks%'` becomes
+    `c.id IN (SELECT rowid FROM cast_fts WHERE cast_fts MATCH 'person_name : "tom hanks" *')`.
+    FTS matches whole words (with the last word as a prefix), not arbitrary
+    substrings, so terms containing wildcards or other punctuation, NOT LIKE and
+    LIKE ... ESCAPE are left alone.
+
+    Args:
+        sql (str): Validated SELECT query
+
+    Returns:
+        str: The query with every rewritable predicate replaced
+    """
+    fts_by_table = {table: (name, columns) for name, table, columns in FTS_INDEXES}
+    aliases = table_aliases(sql, list(fts_by_table))
+    tables_in_query = set(aliases.values())
+
+    def replace(match):
+        lower, qualifier, column, close, negated, term, escape = match.groups()
+        # A closing parenthesis without LOWER( belongs to some other expression
+        if bool(lower) != bool(close) or negated or escape or not _SEARCH_TERM.fullmatch(term):
+            return match.group(0)
+
+        if qualifier:
+            table = aliases.get(qualifier.lower())
+        else:
+            # A bare column name is only rewritten when a single indexed table in the query has it
+            owners = [name for name in tables_in_query if column in fts_by_table[name][1]]
+            table = owners[0] if len(owners) == 1 else None
+        if table is None or column not in fts_by_table[table][1]:
+            return match.group(0)
+
+        if not qualifier:
+            # Once a table is aliased its own name can no longer qualify columns
+            qualifier = next((alias for alias, name in aliases.items() if name == table and alias != table), None)
+            if qualifier is None:
+                # The bare table name needs quoting: CAST is a keyword
+                qualifier = f'"{table}"'
+        fts_name = fts_by_table[table][0]
+        return f'{qualifier}.id IN {fts_match_subquery(fts_name, column, term)}'
+
+    return _LIKE_PREDICATE.sub(replace, sql)
@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for serving app.py
+
+Run from the backend directory, where gunicorn picks this file up:
+    gunicorn app:app
+
+The master migrates the database once and imports the LangChain/Gemini
+modules before forking (preload_app), so workers share those pages instead of
+each importing them. Every worker then builds its own engine, and with it its
+own Gemini client, in a background thread after the fork.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+preload_app = True
+
+def on_starting(server):
+    from database import init_db
+    from nl_to_sql import preload_llm_modules
+    init_db()
+    preload_llm_modules()
+
+def post_worker_init(worker):
+    from nl_to_sql import warm_engine
+    warm_engine()
@@ -0,0 +1,236 @@
+"""
+Index advisor for generated SQL
+
+Records the SQL the app executes, replays EXPLAIN QUERY PLAN over the most
+frequent queries to find full table scans, and suggests (or, when enabled,
+creates) covering indexes led by the columns those queries filter on.
+"""
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from database import get_db_connection, get_pool, normalize_sql, table_aliases, explain_query_plan
+
+INDEX_ADVISOR = os.getenv('INDEX_ADVISOR', 'on').lower() not in ('0', 'off', 'false', 'no')
+INDEX_ADVISOR_AUTO_CREATE = os.getenv('INDEX_ADVISOR_AUTO_CREATE', 'off').lower() in ('1', 'on', 'true', 'yes')
+INDEX_ADVISOR_MIN_SCANS = int(os.getenv('INDEX_ADVISOR_MIN_SCANS', '5'))  # executions before an index is suggested
+INDEX_ADVISOR_MAX_QUERIES = int(os.getenv('INDEX_ADVISOR_MAX_QUERIES', '500'))  # distinct queries remembered
+INDEX_ADVISOR_ANALYZE_EVERY = int(os.getenv('INDEX_ADVISOR_ANALYZE_EVERY', '100'))  # recordings between auto-create passes
+
+# Widest index worth suggesting; beyond this only the filter columns are indexed
+MAX_INDEX_COLUMNS = 6
+
+_PLAN_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+_IDENTIFIER = re.compile(r'(?<![\w.])(?:(\w+)\.)?(\w+)\b')
+# Comparisons against constants; column = column comparisons are joins, not filters
+_LITERAL = r"(?:''|-?[\d.]+|\?|:\w+)"
+_EQUALITY_AFTER = re.compile(rf'^\s*(?:==?\s*{_LITERAL}|IN\s*\(|IS\b)', re.IGNORECASE)
+_EQUALITY_BEFORE = re.compile(rf'{_LITERAL}\s*==?\s*$')
+_RANGE_AFTER = re.compile(rf'^\s*(?:[<>]=?\s*{_LITERAL}|BETWEEN\b)', re.IGNORECASE)
+_RANGE_BEFORE = re.compile(rf'{_LITERAL}\s*[<>]=?\s*$')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_USE_RANK = {'eq': 0, 'range': 1, 'ref': 2}
+
+def _column_uses(sql, alias_tables, table_columns):
+    """
+    Return {table: {column: 'eq' | 'range' | 'ref'}} for every column reference in sql
+
+    Qualified references are resolved through the alias map; bare names are
+    attributed to a table only when exactly one table in the query has that column.
+    """
+    sql = _STRING_LITERAL.sub("''", sql)
+    uses = {}
+    for match in _IDENTIFIER.finditer(sql):
+        qualifier, column = match.group(1), match.group(2)
+        if qualifier:
+            table = alias_tables.get(qualifier.lower())
+            if table is None or column not in table_columns[table]:
+                continue
+        else:
+            owners = [table for table in set(alias_tables.values()) if column in table_columns[table]]
+            if len(owners) != 1:
+                continue
+            table = owners[0]
+
+        following = sql[match.end():]
+        preceding = sql[max(0, match.start() - 40):match.start()]
+        if column == 'id':
+            kind = 'ref'  # Already the rowid
+        elif _EQUALITY_AFTER.match(following) or _EQUALITY_BEFORE.search(preceding):
+            kind = 'eq'
+        elif _RANGE_AFTER.match(following) or _RANGE_BEFORE.search(preceding):
+            kind = 'range'
+        else:
+            kind = 'ref'
+
+        columns = uses.setdefault(table, {})
+        # Keep the most index-friendly use seen for each column
+        if column not in columns or _USE_RANK[kind] < _USE_RANK[columns[column]]:
+            columns[column] = kind
+    return uses
+
+def suggest_index(table, uses):
+    """
+    Build the (table, columns) of a covering index for one scanned table
+
+    Equality filters lead, then range filters, then the remaining referenced
+    columns so the query can be answered from the index alone.
+
+    Returns:
+        tuple: (table, columns) or None when the query does not filter on the table
+    """
+    filters = [column for column, kind in uses.items() if kind == 'eq']
+    filters += [column for column, kind in uses.items() if kind == 'range']
+    if not filters:
+        return None
+    columns = filters + [column for column, kind in uses.items() if kind == 'ref' and column != 'id']
+    if len(columns) > MAX_INDEX_COLUMNS:
+        columns = filters[:MAX_INDEX_COLUMNS]
+    return table, tuple(columns)
+
+def index_name(table, columns):
+    return f"idx_auto_{table}_{'_'.join(columns)}"
+
+class IndexAdvisor:
+    """
+    Tracks how often each normalized SQL query runs and turns the full scans of
+    frequent queries into index suggestions
+
+    Args:
+        max_queries (int): Distinct queries remembered (least recently seen are dropped)
+        min_scans (int): Executions of scanning queries needed before an index is suggested
+        auto_create (bool): Create suggested indexes in the background every analyze_every recordings
+        analyze_every (int): Recordings between automatic passes
+    """
+
+    def __init__(self, max_queries=500, min_scans=5, auto_create=False, analyze_every=100):
+        self.max_queries = max_queries
+        self.min_scans = min_scans
+        self.auto_create = auto_create
+        self.analyze_every = analyze_every
+        self.recorded = 0
+        self.created = []
+        self._queries = OrderedDict()  # normalized sql -> [sql, count]
+        self._lock = threading.Lock()
+
+    def record(self, sql):
+        """Count one execution of sql"""
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._queries.get(key)
+            if entry is None:
+                entry = self._queries[key] = [sql, 0]
+            entry[1] += 1
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+            self.recorded += 1
+            run_pass = self.auto_create and self.analyze_every and self.recorded % self.analyze_every == 0
+
+        if run_pass:
+            # Off the request path: EXPLAIN and CREATE INDEX can take a while on a large catalog
+            threading.Thread(target=self.create_indexes, daemon=True).start()
+
+    def analyze(self):
+        """
+        Explain every recorded query and collect index suggestions for its full scans
+
+        Returns:
+            list: Suggestions sorted by how many executions they would help, each a dict
+                  with 'table', 'columns', 'sql', 'scans' and 'queries'
+        """
+        with self._lock:
+            queries = [tuple(entry) for entry in self._queries.values()]
+
+        suggestions = {}
+        with get_pool().connection() as conn:
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            table_columns = {
+                table: {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')} for table in tables
+            }
+            for sql, count in queries:
+                try:
+                    plan = explain_query_plan(conn, sql)
+                except sqlite3.Error:
+                    continue
+                aliases = table_aliases(sql, tables)
+                uses = _column_uses(sql, aliases, table_columns)
+                for _, _, _, detail in plan:
+                    match = _PLAN_FULL_SCAN.match(detail)
+                    if not match:
+                        continue
+                    table = match.group(1) if match.group(2) else aliases.get(match.group(1).lower())
+                    if table is None or table not in uses:
+                        continue
+                    suggestion = suggest_index(table, uses[table])
+                    if suggestion is None:
+                        continue
+                    entry = suggestions.setdefault(suggestion, {'scans': 0, 'queries': 0})
+                    entry['scans'] += count
+                    entry['queries'] += 1
+
+        report = [
+            {
+                'table': table,
+                'columns': list(columns),
+                'sql': f'CREATE INDEX IF NOT EXISTS {index_name(table, columns)} ON {table} ({", ".join(columns)})',
+                **counts,
+            }
+            for (table, columns), counts in suggestions.items()
+        ]
+        return sorted(report, key=lambda item: -item['scans'])
+
+    def create_indexes(self):
+        """
+        Create every suggested index whose queries ran at least min_scans times
+
+        Returns:
+            list: The CREATE INDEX statements that were executed
+        """
+        statements = [item['sql'] for item in self.analyze() if item['scans'] >= self.min_scans]
+        if not statements:
+            return []
+
+        conn = get_db_connection()
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.created.extend(statements)
+        print(f"Index advisor created {len(statements)} index(es)")
+        return statements
+
+    def report(self):
+        """Existing indexes, current suggestions and recording counters"""
+        with get_pool().connection() as conn:
+            indexes = [
+                {'name': name, 'table': table, 'sql': sql}
+                for name, table, sql in conn.execute(
+                    "SELECT name, tbl_name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY tbl_name, name"
+                )
+            ]
+        with self._lock:
+            counters = {
+                'recorded': self.recorded,
+                'distinct_queries': len(self._queries),
+                'created': list(self.created),
+            }
+        return {
+            'indexes': indexes,
+            'suggestions': [{**item, 'ready': item['scans'] >= self.min_scans} for item in self.analyze()],
+            'min_scans': self.min_scans,
+            'auto_create': self.auto_create,
+            **counters,
+        }
+
+index_advisor = IndexAdvisor(
+    max_queries=INDEX_ADVISOR_MAX_QUERIES,
+    min_scans=INDEX_ADVISOR_MIN_SCANS,
+    auto_create=INDEX_ADVISOR_AUTO_CREATE,
+    analyze_every=INDEX_ADVISOR_ANALYZE_EVERY,
+)
@@ -0,0 +1,147 @@
+"""
+In-process metrics for the /query pipeline
+
+Histograms and counters rendered in the Prometheus text format for /metrics,
+plus per-request stage timings for the optional Server-Timing header. Pure
+standard library: nothing is sent anywhere, /metrics is scraped.
+"""
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Add a Server-Timing header with the stage timings to every response
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, documentation, buckets=SECONDS_BUCKETS, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.labels = tuple(labels)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][position] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((values, [list(data[0]), data[1], data[2]]) for values, data in self._series.items())
+        for label_values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, [('le', _format_number(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_number(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+stage_seconds = Histogram(
+    'nl2sql_stage_duration_seconds', 'Time spent in each stage of a /query request', labels=('stage',)
+)
+request_seconds = Histogram(
+    'nl2sql_request_duration_seconds', 'Total request handling time', labels=('endpoint', 'status')
+)
+requests_total = Counter('nl2sql_requests_total', 'Requests handled', labels=('endpoint', 'status'))
+result_rows = Histogram('nl2sql_result_rows', 'Rows returned per query page', buckets=ROW_BUCKETS, labels=('endpoint',))
+response_bytes = Histogram(
+    'nl2sql_response_bytes', 'Uncompressed JSON response body size', buckets=BYTE_BUCKETS, labels=('endpoint',)
+)
+template_lookups = Counter(
+    'nl2sql_template_lookups_total', 'Questions tried against the local SQL templates before the LLM', labels=('result',)
+)
+
+REGISTRY = [stage_seconds, request_seconds, requests_total, result_rows, response_bytes, template_lookups]
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+# Stage timings of the request being handled; each thread and asyncio task sees its own
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def start_request():
+    """Begin collecting stage timings for the current request"""
+    _request_timings.set([])
+
+def request_timings():
+    """(stage, seconds) pairs recorded so far for the current request"""
+    return list(_request_timings.get() or [])
+
+def record_stage(stage, seconds):
+    """Observe a stage duration and attach it to the current request"""
+    stage_seconds.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as one stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def observe_request(endpoint, status, seconds):
+    requests_total.inc(endpoint, str(status))
+    request_seconds.observe(seconds, endpoint, str(status))
+
+def server_timing_header(timings):
+    """Format stage timings as a Server-Timing header value (durations in ms)"""
+    return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in timings)
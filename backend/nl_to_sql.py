@@ -1,14 +1,31 @@
 import os
+import re
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+import hashlib
+import importlib
+import threading
+from schema_retrieval import SchemaRetriever
+from metrics import timed
+from sql_params import SQLSyntaxError, tokenize_sql
 
+# Send only the tables and few-shot examples relevant to each question
+SCHEMA_PRUNING = os.getenv('SCHEMA_PRUNING', 'on').lower() in ('1', 'on', 'true', 'yes')
+SCHEMA_MAX_EXAMPLES = int(os.getenv('SCHEMA_MAX_EXAMPLES', '4'))
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.json')
+
+# LangChain and the Gemini client take most of the process's import time, so they are
+# imported when the first engine is built rather than when this module is imported
+LLM_MODULES = ('langchain_google_genai', 'langchain.prompts', 'langchain.output_parsers')
+
+def preload_llm_modules():
+    """Import the LangChain and Gemini modules now, e.g. in a pre-fork master so every worker shares them"""
+    for name in LLM_MODULES:
+        importlib.import_module(name)
 
 def load_schema():
     """Load database schema from schema.json"""
-    schema_path = os.path.join(os.path.dirname(__file__), 'schema.json')
-    with open(schema_path, 'r') as f:
+    with open(SCHEMA_PATH, 'r') as f:
         return json.load(f)
 
 def parse_schema_description(schema):
@@ -51,55 +68,38 @@ def parse_schema_description(schema):
             schema_desc += "\n"
         schema_desc += "\n"
     
+    # Full-text indexes, for the tables being described
+    table_names = {table['name'] for table in schema['tables']}
+    fts_indexes = [fts for fts in schema.get('full_text_indexes', []) if fts['table'] in table_names]
+    if fts_indexes:
+        schema_desc += "Full-Text Indexes (FTS5, rowid = the table's id):\n"
+        for fts in fts_indexes:
+            schema_desc += f"  - {fts['name']} on {fts['table']}({', '.join(fts['columns'])})"
+            if 'description' in fts:
+                schema_desc += f": {fts['description']}"
+            schema_desc += "\n"
+        schema_desc += "\n"
+    
     return schema_desc
 
-def generate_sql_from_prompt(user_prompt, conversation_history=None):
-    """
-    Convert natural language prompt to SQL query using Google Gemini via LangChain
-    
-    Args:
-        user_prompt (str): User's natural language question
-        conversation_history (list): Optional list of previous messages in format:
-                                    [{'role': 'user', 'content': '...', 'sql': '...', 'explanation': '...'}, ...]
-        
-    Returns:
-        dict: Contains 'sql' query and 'explanation'
-    """
-    try:
-        # Initialize Gemini model via LangChain
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=os.getenv('GOOGLE_API_KEY'),
-            temperature=0
-        )
-        
-        # Load schema and parse description
-        schema = load_schema()
-        schema_desc = parse_schema_description(schema)
-        
-        # Build conversation context if history exists
-        conversation_context = ""
-        if conversation_history and len(conversation_history) > 0:
-            conversation_context = "\n## Previous Conversation:\n"
-            for msg in conversation_history[-5:]:  # Include last 5 exchanges for context
-                if msg.get('role') == 'user':
-                    conversation_context += f"\nUser: {msg.get('content', '')}"
-                elif msg.get('role') == 'assistant':
-                    conversation_context += f"\nAssistant SQL: {msg.get('sql', '')}"
-                    conversation_context += f"\nAssistant Explanation: {msg.get('explanation', '')}\n"
-            conversation_context += "\n"
-        
-        # Define output schema
-        response_schemas = [
-            ResponseSchema(name="sql", description="The SQL query string"),
-            ResponseSchema(name="explanation", description="Brief explanation of what the query does")
-        ]
-        output_parser = StructuredOutputParser.from_response_schemas(response_schemas)
-        format_instructions = output_parser.get_format_instructions()
-        
-        # Create prompt template
-        prompt_template = ChatPromptTemplate.from_messages([
-            ("system", """You are a SQLite expert. Convert natural language to SQL queries.
+# Few-shot (question, SQL) pairs shown to the model
+FEW_SHOT_EXAMPLES = [
+    ("Show all movies", "SELECT * FROM movies ORDER BY year DESC LIMIT 10"),
+    ("Top rated movies", "SELECT f.title, f.year, f.imdb_rating FROM movie_facts f ORDER BY f.imdb_rating DESC LIMIT 10"),
+    ("Movies that made over 500 million", "SELECT f.title, f.year, f.total_revenue FROM movie_facts f WHERE f.total_revenue > 500 ORDER BY f.total_revenue DESC"),
+    ("Movies that made over 1 billion", "SELECT f.title, f.year, f.total_revenue FROM movie_facts f WHERE f.total_revenue > 1000 ORDER BY f.total_revenue DESC"),
+    ("Which movies did Tom Hanks act in", "SELECT DISTINCT m.title, m.year FROM movies m JOIN cast c ON m.id = c.movie_id WHERE c.id IN (SELECT rowid FROM cast_fts WHERE cast_fts MATCH 'person_name : \"tom hanks\"') AND c.role_type = 'Actor' ORDER BY m.year DESC"),
+    ("Movies directed by Christopher Nolan", "SELECT DISTINCT m.title, m.year FROM movies m JOIN cast c ON m.id = c.movie_id WHERE c.id IN (SELECT rowid FROM cast_fts WHERE cast_fts MATCH 'person_name : \"nolan\"') AND c.role_type = 'Director' ORDER BY m.year DESC"),
+    ("Movies about prison", "SELECT m.title, m.year FROM movies m WHERE m.id IN (SELECT rowid FROM movies_fts WHERE movies_fts MATCH 'description : prison*') ORDER BY m.year DESC"),
+    ("Movies with box office over 500 million and ratings above 8.5", "SELECT f.title, f.year, f.total_revenue, f.imdb_rating FROM movie_facts f WHERE f.total_revenue > 500 AND f.imdb_rating > 8.5 ORDER BY f.total_revenue DESC"),
+    ("Count movies by genre", "SELECT genre, movie_count as count FROM genre_summary ORDER BY count DESC"),
+    ("Most profitable movies", "SELECT f.title, f.year, f.profit FROM movie_facts f WHERE f.budget IS NOT NULL ORDER BY f.profit DESC LIMIT 10"),
+    ("Movies with best return on investment", "SELECT f.title, f.year, f.budget, f.total_revenue, f.roi_percent FROM movie_facts f WHERE f.budget > 0 ORDER BY f.roi_percent DESC LIMIT 10"),
+    ("Average rating by genre", "SELECT genre, movie_count, avg_imdb_rating FROM genre_summary ORDER BY avg_imdb_rating DESC"),
+    ("Directors with the highest total box office", "SELECT person_name, movie_count, total_revenue FROM person_summary WHERE role_type = 'Director' ORDER BY total_revenue DESC LIMIT 10"),
+]
+
+SYSTEM_PROMPT = """You are a SQLite expert. Convert natural language to SQL queries.
 
 ## Schema:
 {schema_desc}
@@ -107,100 +107,440 @@ def generate_sql_from_prompt(user_prompt, conversation_history=None):
 ## Rules:
 1. Generate ONLY SELECT queries (no INSERT, UPDATE, DELETE, DROP)
 2. Use exact column names from schema
-3. Use table aliases: m (movies), b (box_office), r (ratings), c (cast)
-4. Text search: Use LIKE with '%' wildcards and LOWER() for case-insensitive matching
+3. Use table aliases: m (movies), b (box_office), r (ratings), c (cast), f (movie_facts)
+4. Text search: people (cast.person_name, cast.character_name) and titles/plots (movies.title, movies.description)
+   have full-text indexes cast_fts and movies_fts; search them with MATCH, e.g.
+   c.id IN (SELECT rowid FROM cast_fts WHERE cast_fts MATCH 'person_name : "tom hanks"').
+   For other text columns use LIKE with '%' wildcards and LOWER() for case-insensitive matching
 5. Use DISTINCT with cast table queries
 6. ORDER BY meaningfully (rating DESC, revenue DESC, year DESC)
 7. Default LIMIT 10 for "top" queries
 8. IMPORTANT: All revenue and budget columns are in MILLIONS (USD)
    - When users ask "over 500 million", use: WHERE total_revenue > 500
    - When users ask "over 1 billion", use: WHERE total_revenue > 1000
+9. Prefer the summary tables: movie_facts instead of joining movies, box_office and ratings, and
+   genre_summary, year_summary and person_summary for per-genre, per-year and per-person counts, totals and averages
 
 ## Examples:
+{examples}
+{format_instructions}"""
 
-Q: "Show all movies"
-A: SELECT * FROM movies ORDER BY year DESC LIMIT 10
-
-Q: "Top rated movies"
-A: SELECT m.title, m.year, r.imdb_rating FROM movies m JOIN ratings r ON m.id = r.movie_id ORDER BY r.imdb_rating DESC LIMIT 10
+def format_examples(examples):
+    """Render (question, SQL) pairs in the prompt's Q/A format"""
+    return "".join(f'\nQ: "{question}"\nA: {sql}\n' for question, sql in examples)
 
-Q: "Movies that made over 500 million"
-A: SELECT m.title, m.year, b.total_revenue FROM movies m JOIN box_office b ON m.id = b.movie_id WHERE b.total_revenue > 500 ORDER BY b.total_revenue DESC
-
-Q: "Movies that made over 1 billion"
-A: SELECT m.title, m.year, b.total_revenue FROM movies m JOIN box_office b ON m.id = b.movie_id WHERE b.total_revenue > 1000 ORDER BY b.total_revenue DESC
-
-Q: "Which movies did Tom Hanks act in"
-A: SELECT DISTINCT m.title, m.year FROM movies m JOIN cast c ON m.id = c.movie_id WHERE LOWER(c.person_name) LIKE '%tom hanks%' AND c.role_type = 'Actor' ORDER BY m.year DESC
+def create_llm():
+    """Create the Gemini chat model used for SQL generation"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=os.getenv('GOOGLE_API_KEY'),
+        temperature=0
+    )
 
-Q: "Movies directed by Christopher Nolan"
-A: SELECT DISTINCT m.title, m.year FROM movies m JOIN cast c ON m.id = c.movie_id WHERE LOWER(c.person_name) LIKE '%nolan%' AND c.role_type = 'Director' ORDER BY m.year DESC
+# Messages of earlier conversation included in the prompt
+CONTEXT_MESSAGES = 5
+CONTEXT_HEADER = "\n## Previous Conversation:\n"
 
-Q: "Movies with box office over 500 million and ratings above 8.5"
-A: SELECT m.title, m.year, b.total_revenue, r.imdb_rating FROM movies m JOIN box_office b ON m.id = b.movie_id JOIN ratings r ON m.id = r.movie_id WHERE b.total_revenue > 500 AND r.imdb_rating > 8.5 ORDER BY b.total_revenue DESC
+def render_context_message(msg):
+    """Render one history message as it appears in the prompt's context block"""
+    if msg.get('role') == 'user':
+        return f"\nUser: {msg.get('content', '')}"
+    if msg.get('role') == 'assistant':
+        return f"\nAssistant SQL: {msg.get('sql', '')}\nAssistant Explanation: {msg.get('explanation', '')}\n"
+    return ""
 
-Q: "Count movies by genre"
-A: SELECT genre, COUNT(*) as count FROM movies GROUP BY genre ORDER BY count DESC
+def build_conversation_context(conversation_history):
+    """
+    Render the last 5 messages of conversation history into the prompt's context block
+    
+    Args:
+        conversation_history (list): Previous messages in format:
+                                    [{'role': 'user', 'content': '...', 'sql': '...', 'explanation': '...'}, ...]
+        
+    Returns:
+        str: Context block, or an empty string when there is no history
+    """
+    if not conversation_history:
+        return ""
+    
+    messages = conversation_history[-CONTEXT_MESSAGES:]  # Include last 5 messages for context
+    return CONTEXT_HEADER + "".join(render_context_message(msg) for msg in messages) + "\n"
 
-Q: "Most profitable movies"
-A: SELECT m.title, m.year, (b.total_revenue - b.budget) as profit FROM movies m JOIN box_office b ON m.id = b.movie_id WHERE b.budget IS NOT NULL ORDER BY profit DESC LIMIT 10
+def chunk_text(chunk):
+    """Text of a streamed message chunk, whose content is a string or a list of parts"""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part if isinstance(part, str) else part.get('text', '') for part in content)
 
-Q: "Movies with best return on investment"
-A: SELECT m.title, m.year, b.budget, b.total_revenue, ROUND(((b.total_revenue - b.budget) / b.budget * 100), 2) as roi_percent FROM movies m JOIN box_office b ON m.id = b.movie_id WHERE b.budget > 0 ORDER BY roi_percent DESC LIMIT 10
+class SQLStreamParser:
+    """
+    Picks the "sql" and "explanation" values out of a partially streamed response
+    
+    The model answers with a fenced JSON object (see the format instructions),
+    writing the SQL before the explanation. Each value is available as soon as
+    its closing quote has streamed, so the SQL can be validated and run while
+    the explanation is still being generated.
+    """
+    
+    FIELDS = ('sql', 'explanation')
+    
+    def __init__(self):
+        self.text = ""
+        self.values = {}
+    
+    def feed(self, chunk):
+        """
+        Add the next piece of streamed text
+        
+        Returns:
+            list: Names of the fields this chunk completed
+        """
+        self.text += chunk
+        completed = []
+        for field in self.FIELDS:
+            if field not in self.values:
+                value = self._read_string(field)
+                if value is not None:
+                    self.values[field] = value
+                    completed.append(field)
+        return completed
+    
+    @property
+    def sql(self):
+        return self.values.get('sql')
+    
+    @property
+    def explanation(self):
+        return self.values.get('explanation')
+    
+    def _read_string(self, field):
+        match = re.search(rf'"{field}"\s*:\s*"', self.text)
+        if match is None:
+            return None
+        escaped = False
+        for end in range(match.end(), len(self.text)):
+            char = self.text[end]
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                try:
+                    return json.loads(self.text[match.end() - 1:end + 1])
+                except ValueError:
+                    # Left to the full parse once the response is complete
+                    return None
+        return None
 
-{format_instructions}"""),
+class NLToSQLEngine:
+    """
+    Long-lived natural language to SQL converter
+    
+    The LLM client, prompt template, output parser and chain are built once and
+    shared across requests (and threads). The schema description is precomputed
+    and only rebuilt when schema.json's mtime changes.
+    
+    With schema pruning enabled, each prompt only describes the tables relevant
+    to the question (plus their join paths) and the most similar few-shot
+    examples, instead of the whole schema and every example.
+    """
+    
+    def __init__(self, llm=None, schema_path=SCHEMA_PATH, schema_pruning=SCHEMA_PRUNING):
+        self.schema_path = schema_path
+        self.schema_pruning = schema_pruning
+        self._lock = threading.Lock()
+        self._schema_mtime = None
+        self.schema = None
+        self.schema_desc = ""
+        self.examples = format_examples(FEW_SHOT_EXAMPLES)
+        self.retriever = None
+        self._schema_version = ""
+        
+        from langchain.prompts import ChatPromptTemplate
+        from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+        
+        # Define output schema
+        response_schemas = [
+            ResponseSchema(name="sql", description="The SQL query string"),
+            ResponseSchema(name="explanation", description="Brief explanation of what the query does")
+        ]
+        self.output_parser = StructuredOutputParser.from_response_schemas(response_schemas)
+        self.format_instructions = self.output_parser.get_format_instructions()
+        
+        self.prompt_template = ChatPromptTemplate.from_messages([
+            ("system", SYSTEM_PROMPT),
             ("human", "{user_question}")
         ])
         
-        # Create chain: prompt -> LLM -> parser
-        chain = prompt_template | llm | output_parser
+        # Create chain once: prompt -> LLM -> parser (reuses the client's connection pool)
+        self.llm = llm if llm is not None else create_llm()
+        self.chain = self.prompt_template | self.llm | self.output_parser
+        # Without the parser, for streaming the raw response text
+        self.token_chain = self.prompt_template | self.llm
+        
+        self.reload_schema_if_changed()
+    
+    def reload_schema_if_changed(self):
+        """Reload schema.json and rebuild the schema description if the file changed on disk"""
+        mtime = os.stat(self.schema_path).st_mtime_ns
+        if mtime == self._schema_mtime:
+            return
+        
+        with self._lock:
+            if mtime == self._schema_mtime:
+                return
+            with open(self.schema_path, 'rb') as f:
+                raw = f.read()
+            self.schema = json.loads(raw)
+            self.schema_desc = parse_schema_description(self.schema)
+            if self.schema_pruning:
+                self.retriever = SchemaRetriever(self.schema, FEW_SHOT_EXAMPLES, max_examples=SCHEMA_MAX_EXAMPLES)
+            self._schema_version = hashlib.sha256(raw).hexdigest()[:16]
+            self._schema_mtime = mtime
+    
+    @property
+    def schema_version(self):
+        """Fingerprint of the current schema.json, used to invalidate cached queries"""
+        self.reload_schema_if_changed()
+        return self._schema_version
+    
+    def build_inputs(self, user_prompt, conversation_history=None, conversation_context=None):
+        """
+        Return the variables the chain is invoked with for a question
+
+        A pre-rendered conversation_context (from a server-side session) is used
+        as is; otherwise it is rendered from conversation_history.
+        """
+        self.reload_schema_if_changed()
+        if conversation_context is None:
+            conversation_context = build_conversation_context(conversation_history)
+        schema_desc = self.schema_desc
+        examples = self.examples
+        
+        retriever = self.retriever
+        if retriever is not None:
+            # Previous SQL in the context keeps follow-up questions on the same tables
+            schema = retriever.select_schema(f"{user_prompt}\n{conversation_context}")
+            schema_desc = parse_schema_description(schema)
+            tables = [table['name'] for table in schema['tables']]
+            examples = format_examples(retriever.select_examples(user_prompt, tables))
         
-        # Invoke the chain with all variables
-        result = chain.invoke({
+        return {
             "schema_desc": schema_desc,
             "conversation_context": conversation_context,
-            "format_instructions": format_instructions,
+            "examples": examples,
+            "format_instructions": self.format_instructions,
             "user_question": user_prompt
-        })
+        }
+    
+    def generate(self, user_prompt, conversation_history=None, conversation_context=None):
+        """
+        Convert natural language prompt to SQL query
+        
+        Args:
+            user_prompt (str): User's natural language question
+            conversation_history (list): Optional list of previous messages
+            conversation_context (str): Optional pre-rendered context block, used instead of the history
+            
+        Returns:
+            dict: Contains 'sql' query and 'explanation'
+        """
+        try:
+            with timed('prompt_build'):
+                inputs = self.build_inputs(user_prompt, conversation_history, conversation_context)
+            with timed('llm'):
+                result = self.chain.invoke(inputs)
+            return self._success(result)
+        except Exception as e:
+            return self._failure(e)
+    
+    async def agenerate(self, user_prompt, conversation_history=None, conversation_context=None):
+        """Async variant of generate that awaits the LLM call instead of blocking a thread"""
+        try:
+            with timed('prompt_build'):
+                inputs = self.build_inputs(user_prompt, conversation_history, conversation_context)
+            with timed('llm'):
+                result = await self.chain.ainvoke(inputs)
+            return self._success(result)
+        except Exception as e:
+            return self._failure(e)
+    
+    def stream(self, user_prompt, conversation_history=None, conversation_context=None):
+        """
+        Yield the model's response text as it is generated
         
+        Runs the prompt and LLM without the output parser, so the caller can pick
+        the SQL out of the partial response with SQLStreamParser. parse_response
+        turns the complete text into a generate()-style result.
+        
+        Args:
+            user_prompt (str): User's natural language question
+            conversation_history (list): Optional list of previous messages
+            conversation_context (str): Optional pre-rendered context block, used instead of the history
+            
+        Yields:
+            str: Pieces of the response text
+        """
+        with timed('prompt_build'):
+            inputs = self.build_inputs(user_prompt, conversation_history, conversation_context)
+        for chunk in self.token_chain.stream(inputs):
+            yield chunk_text(chunk)
+    
+    async def astream(self, user_prompt, conversation_history=None, conversation_context=None):
+        """Async variant of stream that awaits each chunk on the event loop"""
+        with timed('prompt_build'):
+            inputs = self.build_inputs(user_prompt, conversation_history, conversation_context)
+        async for chunk in self.token_chain.astream(inputs):
+            yield chunk_text(chunk)
+    
+    def parse_response(self, text):
+        """Parse a complete streamed response into a generate()-style result"""
+        try:
+            return self._success(self.output_parser.parse(text))
+        except Exception as e:
+            return self._failure(e)
+    
+    def generate_batch(self, requests, max_concurrency):
+        """
+        Convert several prompts to SQL with concurrent LLM calls
+        
+        Args:
+            requests (list): (user_prompt, conversation_history, conversation_context) tuples
+            max_concurrency (int): Most LLM calls in flight at once
+            
+        Returns:
+            list: generate()-style result dicts, in the order of requests
+        """
+        try:
+            with timed('prompt_build'):
+                inputs = [self.build_inputs(*request) for request in requests]
+            with timed('llm'):
+                results = self.chain.batch(inputs, config={'max_concurrency': max_concurrency}, return_exceptions=True)
+        except Exception as e:
+            return [self._failure(e)] * len(requests)
+        return [self._failure(result) if isinstance(result, Exception) else self._success(result) for result in results]
+    
+    async def agenerate_batch(self, requests, max_concurrency):
+        """Async variant of generate_batch that awaits the LLM calls on the event loop"""
+        try:
+            with timed('prompt_build'):
+                inputs = [self.build_inputs(*request) for request in requests]
+            with timed('llm'):
+                results = await self.chain.abatch(inputs, config={'max_concurrency': max_concurrency}, return_exceptions=True)
+        except Exception as e:
+            return [self._failure(e)] * len(requests)
+        return [self._failure(result) if isinstance(result, Exception) else self._success(result) for result in results]
+    
+    @staticmethod
+    def _success(result):
         return {
             'sql': result.get('sql', ''),
             'explanation': result.get('explanation', ''),
             'success': True
         }
     
-    except Exception as e:
+    @staticmethod
+    def _failure(error):
         return {
             'sql': '',
             'explanation': '',
             'success': False,
-            'error': str(e)
+            'error': str(error)
         }
 
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+def get_engine():
+    """Return the process-wide NLToSQLEngine, creating it on first use"""
+    global _default_engine
+    if _default_engine is None:
+        with _default_engine_lock:
+            if _default_engine is None:
+                _default_engine = NLToSQLEngine()
+    return _default_engine
+
+def warm_engine():
+    """
+    Build the process-wide engine in a background thread
+    
+    Lets a server answer /health while the LLM modules load; the first /query
+    waits on the engine lock if it arrives before the warm-up finishes.
+    """
+    def build():
+        try:
+            get_engine()
+        except Exception as e:
+            print(f"Engine warm-up failed, retrying on first request: {e}")
+    
+    thread = threading.Thread(target=build, name='engine-warmup', daemon=True)
+    thread.start()
+    return thread
+
+def set_engine(engine):
+    """Replace the process-wide engine, e.g. with one built around a stub LLM for benchmarks"""
+    global _default_engine
+    with _default_engine_lock:
+        _default_engine = engine
+
+def generate_sql_from_prompt(user_prompt, conversation_history=None):
+    """
+    Convert natural language prompt to SQL query using Google Gemini via LangChain
+    
+    Args:
+        user_prompt (str): User's natural language question
+        conversation_history (list): Optional list of previous messages in format:
+                                    [{'role': 'user', 'content': '...', 'sql': '...', 'explanation': '...'}, ...]
+        
+    Returns:
+        dict: Contains 'sql' query and 'explanation'
+    """
+    return get_engine().generate(user_prompt, conversation_history)
+
+# Statements that could modify data or the connection
+FORBIDDEN_KEYWORDS = {
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
+    'TRUNCATE', 'REPLACE', 'PRAGMA', 'ATTACH', 'DETACH'
+}
+
 def validate_sql_query(sql):
     """
     Basic validation to ensure query is safe
     
+    The query is tokenized, so keywords are only matched as keywords: a value
+    like LIKE '%update%' or a quoted "delete_flag" column is not rejected, and
+    REPLACE(...) is allowed as the string function. Literals are later bound
+    as parameters at execution (see sql_params.parameterize_sql), so the query
+    must not contain placeholders of its own.
+    
     Args:
         sql (str): SQL query to validate
         
     Returns:
         tuple: (is_valid, error_message)
     """
-    sql_upper = sql.upper().strip()
+    try:
+        tokens = tokenize_sql(sql)
+    except SQLSyntaxError as e:
+        return False, f"Malformed query: {e}"
+    while tokens and tokens[-1] == ('op', ';'):
+        tokens.pop()
     
     # Only allow SELECT queries
-    if not sql_upper.startswith('SELECT'):
+    if not tokens or tokens[0][0] != 'word' or tokens[0][1].upper() != 'SELECT':
         return False, "Only SELECT queries are allowed"
     
-    # Forbidden keywords that could modify data
-    forbidden_keywords = [
-        'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
-        'TRUNCATE', 'REPLACE', 'PRAGMA', 'ATTACH', 'DETACH'
-    ]
-    
-    for keyword in forbidden_keywords:
-        if keyword in sql_upper:
-            return False, f"Query contains forbidden keyword: {keyword}"
+    for index, (kind, text) in enumerate(tokens):
+        if kind == 'op' and text == ';':
+            return False, "Only a single statement is allowed"
+        if kind == 'param':
+            return False, f"Query contains a parameter placeholder: {text}"
+        if kind == 'word' and text.upper() in FORBIDDEN_KEYWORDS:
+            is_function_call = index + 1 < len(tokens) and tokens[index + 1] == ('op', '(')
+            if not (text.upper() == 'REPLACE' and is_function_call):
+                return False, f"Query contains forbidden keyword: {text.upper()}"
     
     return True, ""
@@ -0,0 +1,95 @@
+import os
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+from database import execute_sql_query
+
+# Rows returned per page unless the request asks for a different page_size
+QUERY_PAGE_SIZE = int(os.getenv('QUERY_PAGE_SIZE', '500'))
+QUERY_MAX_PAGE_SIZE = int(os.getenv('QUERY_MAX_PAGE_SIZE', '10000'))
+
+# Cursors embed the validated SQL, so they are signed to stop clients from
+# substituting their own. Without a configured secret, cursors are only valid
+# for the lifetime of this process.
+CURSOR_SECRET = (os.getenv('CURSOR_SECRET') or secrets.token_hex(32)).encode('utf-8')
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token is malformed or its signature does not match"""
+
+def resolve_page_size(requested):
+    """Clamp a requested page size to 1..QUERY_MAX_PAGE_SIZE, defaulting to QUERY_PAGE_SIZE"""
+    if requested is None:
+        return QUERY_PAGE_SIZE
+    return max(1, min(int(requested), QUERY_MAX_PAGE_SIZE))
+
+def paginate_sql(sql, page_size, offset):
+    """
+    Wrap a SELECT so it returns a single page
+    
+    One extra row is requested so callers can tell whether another page exists
+    without running a separate COUNT query.
+    """
+    inner = sql.strip().rstrip(';')
+    return f"SELECT * FROM (\n{inner}\n) LIMIT {int(page_size) + 1} OFFSET {int(offset)}"
+
+def _sign(payload):
+    return hmac.new(CURSOR_SECRET, payload, hashlib.sha256).digest()
+
+def encode_cursor(sql, offset, page_size):
+    """Create an opaque, signed token pointing at the page starting at offset"""
+    payload = json.dumps({'sql': sql, 'offset': offset, 'page_size': page_size}, separators=(',', ':')).encode('utf-8')
+    return (base64.urlsafe_b64encode(payload).decode('ascii') + '.'
+            + base64.urlsafe_b64encode(_sign(payload)).decode('ascii'))
+
+def decode_cursor(token):
+    """
+    Verify a cursor token and return its contents
+    
+    Returns:
+        dict: Contains 'sql', 'offset' and 'page_size'
+        
+    Raises:
+        InvalidCursor: If the token is malformed or was not issued by this server
+    """
+    try:
+        payload_part, signature_part = token.split('.')
+        payload = base64.urlsafe_b64decode(payload_part)
+        signature = base64.urlsafe_b64decode(signature_part)
+    except (AttributeError, ValueError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidCursor("Cursor signature does not match")
+    
+    return json.loads(payload)
+
+def fetch_page(sql, page_size, offset=0):
+    """
+    Execute one page of a validated SELECT
+    
+    Args:
+        sql (str): Validated SQL query
+        page_size (int): Maximum rows to return
+        offset (int): Number of rows to skip
+        
+    Returns:
+        dict: execute_sql_query's result (rows as tuples) plus 'has_more',
+              'next_cursor' (None on the last page) and 'offset'
+    """
+    result = execute_sql_query(paginate_sql(sql, page_size, offset), as_dicts=False)
+    if not result['success']:
+        return result
+    
+    # The result may be shared with coalesced callers, so build a new dict instead of trimming in place
+    has_more = len(result['data']) > page_size
+    data = result['data'][:page_size] if has_more else result['data']
+    return {
+        **result,
+        'data': data,
+        'row_count': len(data),
+        'has_more': has_more,
+        'next_cursor': encode_cursor(sql, offset + page_size, page_size) if has_more else None,
+        'offset': offset
+    }
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+def normalize_question(question):
+    """
+    Normalize a natural language question so trivially different phrasings share a cache entry
+
+    Lowercases, collapses whitespace and strips trailing punctuation, so
+    "Top rated movies?" and "  top rated   movies" map to the same key.
+    """
+    return ' '.join(question.lower().split()).rstrip('?.! ')
+
+def make_cache_key(question, conversation_history=None, schema_version=''):
+    """
+    Build a stable cache key from the question, recent history and schema version
+
+    Args:
+        question (str): User's natural language question
+        conversation_history (list): Previous messages sent with the request
+        schema_version (str): Fingerprint of schema.json, so schema edits invalidate entries
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    # Only the last 5 messages reach the prompt, so only those affect the generated SQL
+    recent_history = [
+        {
+            'role': msg.get('role'),
+            'content': normalize_question(msg.get('content', '') or ''),
+            'sql': msg.get('sql', ''),
+        }
+        for msg in (conversation_history or [])[-5:]
+    ]
+    payload = json.dumps({
+        'question': normalize_question(question),
+        'history': recent_history,
+        'schema': schema_version,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class QueryCache:
+    """
+    Thread-safe LRU/TTL cache of question -> (sql, explanation)
+
+    Entries live in memory and, when a path is given, are written through to a
+    small SQLite file so they survive restarts.
+    """
+
+    def __init__(self, max_entries=1000, ttl_seconds=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute('''
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    key TEXT PRIMARY KEY,
+                    sql TEXT NOT NULL,
+                    explanation TEXT,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self._disk.commit()
+
+    def _is_expired(self, created_at):
+        return self.ttl_seconds and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Return the cached {'sql', 'explanation'} dict for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._disk is not None:
+                row = self._disk.execute(
+                    'SELECT sql, explanation, created_at FROM query_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row:
+                    entry = {'sql': row[0], 'explanation': row[1], 'created_at': row[2]}
+                    self._entries[key] = entry
+
+            if entry is None or self._is_expired(entry['created_at']):
+                if entry is not None:
+                    self._delete(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            # An entry loaded from disk can push the memory cache past max_entries
+            self._evict_overflow()
+            self.hits += 1
+            return {'sql': entry['sql'], 'explanation': entry['explanation']}
+
+    def set(self, key, sql, explanation):
+        """Store a generated query, evicting the least recently used entries if full"""
+        entry = {'sql': sql, 'explanation': explanation, 'created_at': time.time()}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if self._disk is not None:
+                self._disk.execute(
+                    'INSERT OR REPLACE INTO query_cache (key, sql, explanation, created_at) VALUES (?, ?, ?, ?)',
+                    (key, sql, explanation, entry['created_at'])
+                )
+                self._disk.commit()
+            self._evict_overflow()
+
+    def _evict_overflow(self):
+        # Called with the lock held, after adding the most recently used entry
+        while len(self._entries) > self.max_entries:
+            oldest_key, _ = self._entries.popitem(last=False)
+            self._delete(oldest_key)
+
+    def _delete(self, key):
+        self._entries.pop(key, None)
+        if self._disk is not None:
+            self._disk.execute('DELETE FROM query_cache WHERE key = ?', (key,))
+            self._disk.commit()
+
+    def clear(self):
+        """Drop every entry from memory and disk"""
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute('DELETE FROM query_cache')
+                self._disk.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'persistent': self._disk is not None,
+            }
+
+def create_query_cache_from_env():
+    """Create a QueryCache configured from QUERY_CACHE_* environment variables"""
+    return QueryCache(
+        max_entries=int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '1000')),
+        ttl_seconds=int(os.getenv('QUERY_CACHE_TTL_SECONDS', '3600')),
+        path=os.getenv('QUERY_CACHE_PATH') or None,
+    )
@@ -0,0 +1,835 @@
+"""
+The /query pipeline shared by the Flask app (app.py) and the ASGI app (asgi.py):
+request parsing, cached SQL generation, validation, paging and response building
+"""
+import os
+import json
+import time
+import asyncio
+import contextlib
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from database import stream_sql_query, query_flight, check_query_cost, DB_POOL_SIZE
+from nl_to_sql import SQLStreamParser, get_engine, validate_sql_query
+from query_cache import create_query_cache_from_env, make_cache_key
+from response_format import RESPONSE_FORMATS, encode_rows
+from singleflight import SingleFlight
+from index_advisor import INDEX_ADVISOR, index_advisor
+from full_text import FTS_REWRITE_LIKE, rewrite_like_predicates
+from metrics import timed, record_stage, result_rows
+from sessions import SESSION_ID_PATTERN, session_store
+from sql_templates import SQL_TEMPLATES, template_matcher
+from pagination import (
+    InvalidCursor, QUERY_PAGE_SIZE, resolve_page_size, paginate_sql, fetch_page, encode_cursor, decode_cursor
+)
+
+# Most questions accepted by one /query/batch request
+QUERY_BATCH_MAX_ITEMS = int(os.getenv('QUERY_BATCH_MAX_ITEMS', '100'))
+# Most LLM calls a batch keeps in flight at once
+QUERY_BATCH_CONCURRENCY = int(os.getenv('QUERY_BATCH_CONCURRENCY', '50'))
+
+# Cache of question -> generated SQL, so repeated questions skip the LLM
+sql_cache = create_query_cache_from_env()
+
+# Longest a question waits on the identical LLM call already in flight
+LLM_COALESCE_TIMEOUT_SECONDS = float(os.getenv('LLM_COALESCE_TIMEOUT_SECONDS', '60'))
+
+# Concurrent identical questions share one LLM call
+llm_flight = SingleFlight('llm', timeout=LLM_COALESCE_TIMEOUT_SECONDS)
+
+# Returned by next() once an iterator run on an executor is exhausted
+_EXHAUSTED = object()
+
+def run_in_executor(executor, fn, *args):
+    """
+    Run a blocking call on executor and return an awaitable for its result
+
+    The call runs in a copy of the caller's context, so the stages it times
+    still reach the request's Server-Timing header.
+    """
+    context = contextvars.copy_context()
+    return asyncio.wrap_future(executor.submit(context.run, fn, *args))
+
+async def iterate_in_executor(executor, iterator):
+    """
+    Yield the items of a blocking generator, advancing it on executor
+
+    The generator is closed when iteration stops for any reason. A fetch still
+    running on executor is left to finish first, since a running generator
+    cannot be closed.
+    """
+    future = None
+    try:
+        while True:
+            future = executor.submit(contextvars.copy_context().run, next, iterator, _EXHAUSTED)
+            item = await asyncio.wrap_future(future)
+            if item is _EXHAUSTED:
+                return
+            yield item
+    finally:
+        if future is None:
+            iterator.close()
+        else:
+            future.add_done_callback(lambda _: iterator.close())
+
+async def _next_or_exhausted(iterator):
+    return await anext(iterator, _EXHAUSTED)
+
+def iterate_from_loop(iterator, loop):
+    """
+    Yield the items of an async iterator from a worker thread, one at a time on loop
+
+    The counterpart of iterate_in_executor, e.g. for feeding a streamed request
+    body to blocking code running on the db executor.
+    """
+    while True:
+        item = asyncio.run_coroutine_threadsafe(_next_or_exhausted(iterator), loop).result()
+        if item is _EXHAUSTED:
+            return
+        yield item
+
+class QueryError(Exception):
+    """An error response: message, HTTP status and any extra response fields"""
+
+    def __init__(self, message, status_code=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.extra = extra
+
+    def to_dict(self):
+        return {'error': self.message, 'status': 'error', **self.extra}
+
+def _check_format(response_format):
+    if response_format not in RESPONSE_FORMATS:
+        raise QueryError(f"Unknown format '{response_format}', expected one of: {', '.join(RESPONSE_FORMATS)}")
+
+def _resolve_page_size(requested):
+    # JSON true/false are bools, 2.7 and Infinity are floats: none of them is a page size
+    if requested is not None and (not isinstance(requested, int) or isinstance(requested, bool)):
+        raise QueryError('page_size must be an integer')
+    return resolve_page_size(requested)
+
+def parse_query_request(data):
+    """
+    Read and validate the fields of a /query request body
+
+    With a 'session_id' the history and its rendered prompt context come from
+    the server-side session store and any 'history' in the body is ignored.
+
+    Returns:
+        dict: 'message', 'history', 'context', 'session_id', 'format', 'page_size' and 'stream'
+
+    Raises:
+        QueryError: If the message is missing, the format is unknown, page_size is not an integer
+            or the session id is malformed
+    """
+    data = data or {}
+    query_request = {
+        'message': data.get('message', ''),
+        'history': data.get('history', []),  # List of previous messages
+        'context': None,  # Pre-rendered history, set for sessions
+        'session_id': data.get('session_id'),
+        'format': data.get('format', 'records'),
+        'page_size': _resolve_page_size(data.get('page_size')),
+        'stream': bool(data.get('stream')),
+    }
+
+    if not query_request['message']:
+        raise QueryError('No message provided')
+    _check_format(query_request['format'])
+
+    session_id = query_request['session_id']
+    if session_id is not None:
+        if not isinstance(session_id, str) or not SESSION_ID_PATTERN.match(session_id):
+            raise QueryError('Invalid session_id, expected 16-128 letters, digits, - or _')
+        query_request['history'], query_request['context'] = session_store.snapshot(session_id)
+    return query_request
+
+def lookup_cached_sql(query_request):
+    """Return (cache_key, cached {'sql', 'explanation'} or None) for a parsed request"""
+    with timed('sql_cache'):
+        cache_key = make_cache_key(query_request['message'], query_request['history'], get_engine().schema_version)
+        return cache_key, sql_cache.get(cache_key)
+
+def match_template(query_request):
+    """Answer the request from a local SQL template, or return None to ask the LLM"""
+    if not SQL_TEMPLATES:
+        return None
+    with timed('template'):
+        return template_matcher.match(query_request['message'])
+
+def coalescing_stats():
+    """Counters for calls that were coalesced onto an identical in-flight call"""
+    return {'llm': llm_flight.stats(), 'sql': query_flight.stats()}
+
+def check_generated_sql(sql_query, explanation=None, cache_hit=False):
+    """
+    Validate generated SQL and prepare it to run
+
+    Returns:
+        str: The SQL to execute
+
+    Raises:
+        QueryError: If the SQL is not a safe SELECT or its plan is too expensive
+    """
+    with timed('validate'):
+        # Validate the SQL query
+        is_valid, validation_error = validate_sql_query(sql_query)
+        if not is_valid:
+            raise QueryError(f"Invalid query: {validation_error}")
+
+        # Turn '%term%' name/title searches the model still wrote with LIKE into FTS lookups
+        if FTS_REWRITE_LIKE and not cache_hit:
+            sql_query = rewrite_like_predicates(sql_query)
+
+        # Reject unbounded scans and cartesian joins before they reach the pool. Results
+        # are always fetched a page at a time, so check the paginated SQL that runs
+        cost = check_query_cost(paginate_sql(sql_query, QUERY_PAGE_SIZE, 0))
+        if not cost['allowed']:
+            raise QueryError(
+                f"Query rejected: {'; '.join(cost['reasons'])}", 400,
+                reasons=cost['reasons'], sql=sql_query, explanation=explanation
+            )
+
+        # Feed the index advisor every query that is about to run
+        if INDEX_ADVISOR:
+            index_advisor.record(sql_query)
+
+    return sql_query
+
+def accept_generated_sql(cache_key, sql_result, cache_hit):
+    """
+    Check a generation result, validate its SQL and cache it
+
+    Returns:
+        tuple: (sql, explanation)
+
+    Raises:
+        QueryError: If generation failed, the SQL is not a safe SELECT or its plan is too expensive
+    """
+    if not sql_result['success']:
+        raise QueryError(f"Failed to generate SQL: {sql_result.get('error', 'Unknown error')}", 500)
+
+    explanation = sql_result['explanation']
+    sql_query = check_generated_sql(sql_result['sql'], explanation, cache_hit)
+
+    # Only cache queries that passed validation
+    if not cache_hit:
+        with timed('sql_cache'):
+            sql_cache.set(cache_key, sql_query, explanation)
+
+    return sql_query, explanation
+
+def accept_session_sql(query_request, cache_key, sql_result, cache_hit):
+    """accept_generated_sql that also adds the exchange to the request's session, if it has one"""
+    session_id = query_request.get('session_id')
+    if session_id is None:
+        return accept_generated_sql(cache_key, sql_result, cache_hit)
+    try:
+        sql_query, explanation = accept_generated_sql(cache_key, sql_result, cache_hit)
+    except QueryError:
+        # The chat shows an error reply, which carries no SQL into later context
+        session_store.record_exchange(session_id, query_request['message'])
+        raise
+    session_store.record_exchange(session_id, query_request['message'], sql_query, explanation)
+    return sql_query, explanation
+
+def start_generation(query_request):
+    """
+    Look the request up in the SQL cache, then the templates
+
+    Returns:
+        tuple: (cache_key, result, source) with source 'cache', 'template' or 'llm';
+               the result is None when the LLM has to answer
+    """
+    cache_key, sql_result = lookup_cached_sql(query_request)
+    if sql_result is not None:
+        return cache_key, {**sql_result, 'success': True}, 'cache'
+    sql_result = match_template(query_request)
+    return cache_key, sql_result, 'llm' if sql_result is None else 'template'
+
+def generate_sql(query_request):
+    """
+    Convert the request's question to validated SQL, reusing a cached query when possible
+
+    Returns:
+        tuple: (sql, explanation, cache_hit)
+    """
+    cache_key, sql_result, source = start_generation(query_request)
+    if sql_result is None:
+        sql_result = llm_flight.do(
+            cache_key, lambda: get_engine().generate(
+                query_request['message'], query_request['history'], query_request['context']
+            )
+        )
+    cache_hit = source == 'cache'
+    sql_query, explanation = accept_session_sql(query_request, cache_key, sql_result, cache_hit)
+    return sql_query, explanation, cache_hit
+
+async def agenerate_sql(query_request, executor):
+    """
+    Async variant of generate_sql that awaits the LLM instead of blocking a thread
+
+    The cache and template lookups (which build the engine if the warm-up has
+    not finished), validation, the cost check and caching run on executor, so
+    only the LLM call is awaited on the event loop.
+    """
+    cache_key, sql_result, source = await run_in_executor(executor, start_generation, query_request)
+    if sql_result is None:
+        # Already built by the cache lookup
+        engine = get_engine()
+        sql_result = await llm_flight.ado(
+            cache_key, lambda: engine.agenerate(
+                query_request['message'], query_request['history'], query_request['context']
+            )
+        )
+    cache_hit = source == 'cache'
+    sql_query, explanation = await run_in_executor(
+        executor, accept_session_sql, query_request, cache_key, sql_result, cache_hit
+    )
+    return sql_query, explanation, cache_hit
+
+def parse_batch_request(data):
+    """
+    Read the questions of a /query/batch request body
+
+    Each question is a string or an object with the /query fields ('message',
+    'history', 'session_id', 'format', 'page_size'); 'format' and 'page_size'
+    at the top level are the defaults for every question.
+
+    Returns:
+        list: One parsed request per question, or the QueryError that question failed with
+
+    Raises:
+        QueryError: If 'questions' is missing, empty or too long
+    """
+    data = data or {}
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        raise QueryError("'questions' must be a non-empty list")
+    if len(questions) > QUERY_BATCH_MAX_ITEMS:
+        raise QueryError(f"Too many questions: {len(questions)} (limit {QUERY_BATCH_MAX_ITEMS})")
+
+    defaults = {'format': data.get('format', 'records'), 'page_size': data.get('page_size')}
+    items = []
+    for question in questions:
+        if isinstance(question, str):
+            question = {'message': question}
+        try:
+            if not isinstance(question, dict):
+                raise QueryError('Each question must be a string or an object with a message')
+            items.append(parse_query_request({**defaults, **question, 'stream': False}))
+        except QueryError as e:
+            items.append(e)
+    return items
+
+def _accept_batch(items, lookups, generated):
+    outcomes = []
+    for item, lookup in zip(items, lookups):
+        if isinstance(item, QueryError):
+            outcomes.append(item)
+            continue
+        cache_key, cached = lookup
+        cache_hit = cached is not None
+        sql_result = {**cached, 'success': True} if cache_hit else generated[cache_key]
+        try:
+            outcomes.append((*accept_session_sql(item, cache_key, sql_result, cache_hit), cache_hit))
+        except QueryError as e:
+            outcomes.append(e)
+    return outcomes
+
+def _batch_misses(items, lookups):
+    """Answer uncached questions from templates; returns ({cache_key: result}, {cache_key: LLM request})"""
+    generated = {}
+    misses = {}
+    for item, lookup in zip(items, lookups):
+        if lookup is None or lookup[1] is not None or lookup[0] in generated or lookup[0] in misses:
+            continue
+        # Questions asked more than once in a batch share one answer
+        sql_result = match_template(item)
+        if sql_result is not None:
+            generated[lookup[0]] = sql_result
+        else:
+            misses[lookup[0]] = (item['message'], item['history'], item['context'])
+    return generated, misses
+
+def _prepare_batch(items):
+    """Cache lookups for every batch item, then (lookups, template answers, LLM requests)"""
+    lookups = [None if isinstance(item, QueryError) else lookup_cached_sql(item) for item in items]
+    return (lookups, *_batch_misses(items, lookups))
+
+def generate_batch_sql(items):
+    """
+    Convert every parsed batch question to validated SQL with one concurrent LLM fan-out
+
+    Cached and template-matched questions skip the LLM; the rest go through the
+    chain's batch() with at most QUERY_BATCH_CONCURRENCY calls in flight.
+
+    Returns:
+        list: (sql, explanation, cache_hit) or a QueryError for each item
+    """
+    lookups, generated, misses = _prepare_batch(items)
+    if misses:
+        generated.update(zip(misses, get_engine().generate_batch(list(misses.values()), QUERY_BATCH_CONCURRENCY)))
+    return _accept_batch(items, lookups, generated)
+
+async def agenerate_batch_sql(items, executor):
+    """
+    Async variant of generate_batch_sql that awaits the LLM calls instead of blocking threads
+
+    Lookups, validation and caching run on executor, as in agenerate_sql.
+    """
+    lookups, generated, misses = await run_in_executor(executor, _prepare_batch, items)
+    if misses:
+        results = await get_engine().agenerate_batch(list(misses.values()), QUERY_BATCH_CONCURRENCY)
+        generated.update(zip(misses, results))
+    return await run_in_executor(executor, _accept_batch, items, lookups, generated)
+
+# Runs batch questions' first pages in parallel for the Flask app (asgi.py uses its own db_executor)
+batch_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='batch-sql')
+
+def execute_batch_item(index, item, outcome):
+    """Run one batch question's first page; returns its entry in the /query/batch results"""
+    try:
+        if isinstance(outcome, QueryError):
+            raise outcome
+        sql_query, explanation, cache_hit = outcome
+        query_result = fetch_page(sql_query, item['page_size'])
+        check_query_result(query_result, sql_query, explanation)
+        result_rows.observe(query_result['row_count'], '/query/batch')
+        return {'index': index, **build_query_response(item, sql_query, explanation, cache_hit, query_result)}
+    except QueryError as e:
+        return {'index': index, **e.to_dict()}
+    except Exception as e:
+        return {'index': index, 'error': str(e), 'status': 'error'}
+
+def build_batch_response(results):
+    """Build the /query/batch body; it succeeds as a whole even when some questions failed"""
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return {
+        'status': 'success',
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'results': results,
+    }
+
+def check_query_result(query_result, sql_query, explanation=None):
+    """Raise a QueryError for a failed execution result"""
+    if not query_result['success']:
+        extra = {'sql': sql_query}
+        if explanation is not None:
+            extra['explanation'] = explanation
+        raise QueryError(f"Query execution failed: {query_result.get('error', 'Unknown error')}", 500, **extra)
+
+def build_query_response(query_request, sql_query, explanation, cache_hit, query_result):
+    """Build the /query success body from the first page of results"""
+    return {
+        'status': 'success',
+        'user_message': query_request['message'],
+        'session_id': query_request.get('session_id'),
+        'sql': sql_query,
+        'explanation': explanation,
+        'columns': query_result['columns'],
+        'row_count': query_result['row_count'],
+        'cached': cache_hit,
+        'format': query_request['format'],
+        'page_size': query_request['page_size'],
+        'has_more': query_result['has_more'],
+        'next_cursor': query_result['next_cursor'],
+        **encode_rows(query_result['columns'], query_result['data'], query_request['format'])
+    }
+
+def parse_page_request(data):
+    """
+    Read and verify the fields of a /query/page request body
+
+    Returns:
+        dict: 'sql', 'offset', 'page_size' from the cursor, plus 'format'
+
+    Raises:
+        QueryError: If the format is unknown, the cursor is invalid or its SQL fails validation
+    """
+    data = data or {}
+    response_format = data.get('format', 'records')
+    _check_format(response_format)
+
+    try:
+        page = decode_cursor(data.get('cursor', ''))
+    except InvalidCursor as e:
+        raise QueryError(f"Invalid cursor: {e}")
+
+    is_valid, validation_error = validate_sql_query(page['sql'])
+    if not is_valid:
+        raise QueryError(f"Invalid query: {validation_error}")
+
+    return {**page, 'format': response_format}
+
+def build_page_response(page_request, query_result):
+    """Build the /query/page success body"""
+    return {
+        'status': 'success',
+        'sql': page_request['sql'],
+        'columns': query_result['columns'],
+        'row_count': query_result['row_count'],
+        'format': page_request['format'],
+        'page_size': page_request['page_size'],
+        'offset': page_request['offset'],
+        'has_more': query_result['has_more'],
+        'next_cursor': query_result['next_cursor'],
+        **encode_rows(query_result['columns'], query_result['data'], page_request['format'])
+    }
+
+def query_result_events(sql_query, explanation, page_size, cached=False, route='/query'):
+    """
+    Yield the first page of query results as event dicts: a 'meta' event with
+    the SQL and columns, then one 'rows' event per fetched batch, then a final
+    'done' event carrying the cursor for the next page, or an 'error' event if
+    execution fails
+    """
+    row_count = 0
+    has_more = False
+    start = time.perf_counter()
+    try:
+        for kind, payload in stream_sql_query(paginate_sql(sql_query, page_size, 0)):
+            if kind == 'columns':
+                yield {'type': 'meta', 'sql': sql_query, 'explanation': explanation,
+                       'columns': payload, 'cached': cached}
+                continue
+            # paginate_sql fetches one extra row to detect a further page
+            remaining = page_size - row_count
+            if len(payload) > remaining:
+                has_more = True
+                payload = payload[:remaining]
+            if not payload:
+                continue
+            row_count += len(payload)
+            yield {'type': 'rows', 'rows': payload}
+        # Runs after the response headers went out, so this only reaches /metrics
+        record_stage('stream', time.perf_counter() - start)
+        result_rows.observe(row_count, route)
+        yield {
+            'type': 'done',
+            'row_count': row_count,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(sql_query, page_size, page_size) if has_more else None
+        }
+    except Exception as e:
+        # Headers are already sent, so errors are reported in-band
+        yield {
+            'type': 'error',
+            'error': f"Query execution failed: {e}",
+            'sql': sql_query,
+            'explanation': explanation
+        }
+
+def stream_query_results(sql_query, explanation, page_size, cached=False):
+    """Yield the first page of query results as NDJSON lines (see query_result_events)"""
+    for event in query_result_events(sql_query, explanation, page_size, cached):
+        yield json.dumps(event) + '\n'
+
+def sse_event(event):
+    """Render an event dict as a server-sent event named by its 'type'"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def _streamed_result(parser, complete):
+    """generate()-style result for a streamed response, once its SQL or the whole response is in"""
+    if parser.sql is not None and not complete:
+        # The explanation is still being generated
+        return {'sql': parser.sql, 'explanation': None, 'success': True}
+    return get_engine().parse_response(parser.text)
+
+def _flight_result(parser, error):
+    """The result handed to followers of a streamed LLM call that ended before its answer was complete"""
+    if parser.sql is not None:
+        # They validate and run the same SQL themselves
+        return {'sql': parser.sql, 'explanation': parser.explanation or '', 'success': True}
+    return {'sql': '', 'explanation': '', 'success': False, 'error': error}
+
+def _finish_events(query_request, cache_key, source, sql_query, explanation):
+    """Cache a streamed answer and add it to the request's session, if it has one"""
+    if source != 'cache':
+        sql_cache.set(cache_key, sql_query, explanation)
+    session_id = query_request.get('session_id')
+    if session_id is not None:
+        session_store.record_exchange(session_id, query_request['message'], sql_query, explanation)
+
+def _fail_events(query_request, error):
+    """Record a failed streamed answer; returns its final 'error' event"""
+    session_id = query_request.get('session_id')
+    if session_id is not None:
+        # The chat shows an error reply, which carries no SQL into later context
+        session_store.record_exchange(session_id, query_request['message'])
+    return sse_event({**error, 'type': 'error', 'status': 'error'})
+
+# Handed to followers when a streaming leader fails before any SQL was generated
+STREAM_ENDED_EARLY = 'The identical request answering this question ended early'
+
+def _drained_result(parser, error):
+    """The flight result once a drained response has ended, with error set if it failed part way"""
+    if error is None:
+        explanation = _streamed_result(parser, complete=True).get('explanation') or parser.explanation or ''
+        return {'sql': parser.sql, 'explanation': explanation, 'success': True}
+    print(f"LLM response ended early after its SQL: {error}")
+    return _flight_result(parser, error)
+
+def _drain_response(tokens, parser, start, cache_key, flight):
+    """
+    Read the rest of a streamed response (the explanation) on a thread of its own
+
+    The leader of an llm_flight call hands its response over once the SQL is
+    in, so followers get the answer as soon as the model finishes, not once
+    the leader's client has read its rows. The thread finishes the call.
+
+    Returns:
+        tuple: (queue.Queue of the remaining token texts, ending with _EXHAUSTED,
+                Future of the result handed to the followers)
+    """
+    texts = queue.Queue()
+    drained = Future()
+
+    def drain():
+        error = STREAM_ENDED_EARLY
+        try:
+            for text in tokens:
+                texts.put(text)
+                parser.feed(text)
+            record_stage('llm', time.perf_counter() - start)
+            error = None
+        except Exception as e:
+            error = str(e)
+        finally:
+            tokens.close()
+            result = _drained_result(parser, error)
+            llm_flight.finish(cache_key, flight, result)
+            drained.set_result(result)
+            texts.put(_EXHAUSTED)
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(drain,), name='llm-drain', daemon=True).start()
+    return texts, drained
+
+# Drain tasks still running; the loop only keeps weak references to tasks
+_drain_tasks = set()
+
+def _adrain_response(tokens, parser, start, flight):
+    """Async variant of _drain_response: (asyncio.Queue of token texts, task resolving to the result)"""
+    texts = asyncio.Queue()
+
+    async def drain():
+        error = STREAM_ENDED_EARLY
+        try:
+            async for text in tokens:
+                texts.put_nowait(text)
+                parser.feed(text)
+            record_stage('llm', time.perf_counter() - start)
+            error = None
+        except Exception as e:
+            error = str(e)
+        finally:
+            await tokens.aclose()
+            result = _drained_result(parser, error)
+            if not flight.done():
+                flight.set_result(result)
+            texts.put_nowait(_EXHAUSTED)
+        return result
+
+    task = asyncio.ensure_future(drain())
+    _drain_tasks.add(task)
+    task.add_done_callback(_drain_tasks.discard)
+    return texts, task
+
+def stream_query_events(query_request):
+    """
+    Yield the /query/events server-sent events for a parsed request
+
+    The model's response is streamed token by token. As soon as its "sql" value
+    has streamed (before the explanation is written) the SQL is validated and
+    its first page runs, so rows arrive while the model is still generating.
+    The explanation and the cursor for the next page come last, in 'done'.
+    Cached and template answers skip straight to validation.
+
+    A stream that calls the LLM leads its llm_flight call, so identical
+    questions arriving meanwhile (on /query or here) wait for its answer
+    instead of calling the LLM again. They receive no tokens and report
+    the source 'coalesced'.
+    The call is finished once the model's response is complete, even if this
+    stream's client is still reading rows.
+
+    Events: 'stage' (generate, validate, execute), 'token', 'sql', 'meta',
+    'rows', then 'done' or 'error'.
+    """
+    tokens = None
+    parser = SQLStreamParser()
+    # The llm_flight call this stream leads, until its result is handed over
+    flight = None
+    # The rest of the response once the SQL is in, read by _drain_response
+    texts = None
+    error = STREAM_ENDED_EARLY
+    try:
+        cache_key, sql_result, source = start_generation(query_request)
+        if sql_result is None:
+            call, leader = llm_flight.begin(cache_key)
+            if leader:
+                flight = call
+            else:
+                source = 'coalesced'
+        yield sse_event({'type': 'stage', 'stage': 'generate', 'source': source})
+
+        if source == 'coalesced':
+            sql_result = llm_flight.wait(call)
+        elif source == 'llm':
+            start = time.perf_counter()
+            tokens = get_engine().stream(
+                query_request['message'], query_request['history'], query_request['context']
+            )
+            for text in tokens:
+                yield sse_event({'type': 'token', 'text': text})
+                if 'sql' in parser.feed(text):
+                    break
+            else:
+                # The response ended without a readable "sql" value; the full parse reports why
+                tokens = None
+                record_stage('llm', time.perf_counter() - start)
+            record_stage('llm_sql', time.perf_counter() - start)
+            sql_result = _streamed_result(parser, complete=tokens is None)
+            if tokens is None:
+                llm_flight.finish(cache_key, flight, sql_result)
+            else:
+                texts, drained = _drain_response(tokens, parser, start, cache_key, flight)
+                tokens = None
+            flight = None
+        if not sql_result['success']:
+            error = sql_result.get('error', 'Unknown error')
+            raise QueryError(f"Failed to generate SQL: {error}", 500)
+        yield sse_event({'type': 'sql', 'sql': sql_result['sql']})
+
+        yield sse_event({'type': 'stage', 'stage': 'validate'})
+        explanation = sql_result['explanation']
+        sql_query = check_generated_sql(sql_result['sql'], explanation, source == 'cache')
+
+        yield sse_event({'type': 'stage', 'stage': 'execute', 'sql': sql_query})
+        with contextlib.closing(query_result_events(
+                sql_query, explanation, query_request['page_size'], source == 'cache', '/query/events')) as events:
+            for event in events:
+                if event['type'] == 'done':
+                    done = event
+                elif event['type'] == 'error':
+                    yield _fail_events(query_request, event)
+                    return
+                else:
+                    yield sse_event(event)
+
+        if texts is not None:
+            # Rows are out; pass on the explanation as the model writes it
+            for text in iter(texts.get, _EXHAUSTED):
+                yield sse_event({'type': 'token', 'text': text})
+            explanation = drained.result()['explanation']
+        _finish_events(query_request, cache_key, source, sql_query, explanation)
+        yield sse_event({**done, 'explanation': explanation})
+
+    except QueryError as e:
+        yield _fail_events(query_request, e.to_dict())
+    except Exception as e:
+        error = str(e)
+        yield _fail_events(query_request, {'error': error, 'status': 'error'})
+    finally:
+        if flight is not None:
+            llm_flight.finish(cache_key, flight, _flight_result(parser, error))
+        if tokens is not None:
+            tokens.close()
+
+async def astream_query_events(query_request, executor):
+    """
+    Async variant of stream_query_events that awaits the model's tokens on the
+    event loop; lookups, validation, caching and row fetches run on executor
+    """
+    tokens = None
+    parser = SQLStreamParser()
+    # The llm_flight future this stream leads, until its result is handed over
+    flight = None
+    # The rest of the response once the SQL is in, read by _adrain_response
+    texts = None
+    error = STREAM_ENDED_EARLY
+    try:
+        cache_key, sql_result, source = await run_in_executor(executor, start_generation, query_request)
+        if sql_result is None:
+            future, leader = llm_flight.abegin(cache_key)
+            if leader:
+                flight = future
+            else:
+                source = 'coalesced'
+        yield sse_event({'type': 'stage', 'stage': 'generate', 'source': source})
+
+        if source == 'coalesced':
+            sql_result = await llm_flight.await_call(future)
+        elif source == 'llm':
+            start = time.perf_counter()
+            tokens = get_engine().astream(
+                query_request['message'], query_request['history'], query_request['context']
+            )
+            complete = True
+            async for text in tokens:
+                yield sse_event({'type': 'token', 'text': text})
+                if 'sql' in parser.feed(text):
+                    complete = False
+                    break
+            if complete:
+                tokens = None
+                record_stage('llm', time.perf_counter() - start)
+            record_stage('llm_sql', time.perf_counter() - start)
+            sql_result = _streamed_result(parser, complete)
+            if complete:
+                flight.set_result(sql_result)
+            else:
+                texts, drained = _adrain_response(tokens, parser, start, flight)
+            tokens = None
+            flight = None
+        if not sql_result['success']:
+            error = sql_result.get('error', 'Unknown error')
+            raise QueryError(f"Failed to generate SQL: {error}", 500)
+        yield sse_event({'type': 'sql', 'sql': sql_result['sql']})
+
+        yield sse_event({'type': 'stage', 'stage': 'validate'})
+        explanation = sql_result['explanation']
+        sql_query = await run_in_executor(executor, check_generated_sql, sql_result['sql'], explanation, source == 'cache')
+
+        yield sse_event({'type': 'stage', 'stage': 'execute', 'sql': sql_query})
+        events = iterate_in_executor(executor, query_result_events(
+            sql_query, explanation, query_request['page_size'], source == 'cache', '/query/events'
+        ))
+        try:
+            async for event in events:
+                if event['type'] == 'done':
+                    done = event
+                elif event['type'] == 'error':
+                    yield _fail_events(query_request, event)
+                    return
+                else:
+                    yield sse_event(event)
+        finally:
+            await events.aclose()
+
+        if texts is not None:
+            # Rows are out; pass on the explanation as the model writes it
+            while True:
+                text = await texts.get()
+                if text is _EXHAUSTED:
+                    break
+                yield sse_event({'type': 'token', 'text': text})
+            explanation = (await drained)['explanation']
+        await run_in_executor(executor, _finish_events, query_request, cache_key, source, sql_query, explanation)
+        yield sse_event({**done, 'explanation': explanation})
+
+    except QueryError as e:
+        yield _fail_events(query_request, e.to_dict())
+    except Exception as e:
+        error = str(e)
+        yield _fail_events(query_request, {'error': error, 'status': 'error'})
+    finally:
+        if flight is not None and not flight.done():
+            flight.set_result(_flight_result(parser, error))
+        if tokens is not None:
+            await tokens.aclose()
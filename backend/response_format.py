@@ -0,0 +1,69 @@
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Supported layouts for query results in the /query response
+RESPONSE_FORMATS = ('records', 'rows', 'columnar')
+
+# Opt-in response compression
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'off').lower() in ('1', 'on', 'true', 'yes')
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+
+def encode_rows(columns, rows, response_format='records'):
+    """
+    Lay out result rows for the response body
+
+    Args:
+        columns (list): Column names, in result order
+        rows (list): Row tuples as returned by SQLite
+        response_format (str): 'records' for a list of {column: value} dicts (default),
+                               'rows' for a list of arrays in column order,
+                               'columnar' for one array of values per column
+
+    Returns:
+        dict: Response fields holding the rows ('data', 'rows' or 'column_values')
+    """
+    if response_format == 'rows':
+        return {'rows': [list(row) for row in rows]}
+    if response_format == 'columnar':
+        return {'column_values': [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]}
+    return {'data': [dict(zip(columns, row)) for row in rows]}
+
+def choose_encoding(accept_encoding):
+    """Pick the best supported content encoding from an Accept-Encoding header, or None"""
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a JSON response body in place if compression is enabled and the client accepts it
+
+    Streaming responses, small bodies and already-encoded responses are left untouched.
+    """
+    if (not RESPONSE_COMPRESSION or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None or len(body) < RESPONSE_COMPRESSION_MIN_BYTES:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=4)
+    else:
+        compressed = gzip.compress(body, compresslevel=5)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(compressed))
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,201 @@
+"""
+Relevant-schema selection for the NL to SQL prompt
+
+Scores each table (its name, description, keywords and column descriptions
+from schema.json) and each few-shot example against the question with a small
+TF-IDF model, then keeps only the matching tables, the tables needed to join
+them, and the most similar examples. This keeps the prompt size proportional
+to the question rather than to the whole schema.
+"""
+import math
+import re
+from collections import Counter, deque
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'does', 'for', 'from',
+    'give', 'has', 'have', 'how', 'i', 'in', 'is', 'it', 'its', 'list', 'me', 'many',
+    'of', 'on', 'or', 'show', 'than', 'that', 'the', 'their', 'them', 'there', 'these',
+    'this', 'to', 'was', 'were', 'what', 'when', 'which', 'with', 'all', 'any', 'over',
+    'above', 'below', 'under', 'more', 'less', 'most', 'each', 'per',
+}
+
+def _stem(word):
+    # Crude suffix stripping so "rated"/"rating" and "movies"/"movie" share a term
+    for suffix in ('ing', 'ed', 's'):
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text):
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem"""
+    words = re.findall(r'[a-z0-9]+', (text or '').lower())
+    return [_stem(word) for word in words if word not in STOPWORDS]
+
+def _column_text(column):
+    parts = [column['name'].replace('_', ' '), column.get('description', '')]
+    if 'unit' in column:
+        parts.append(column['unit'])
+    return ' '.join(parts)
+
+def _table_text(table):
+    parts = [table['name'].replace('_', ' '), table.get('description', '')]
+    parts.extend(table.get('keywords', []))
+    parts.extend(_column_text(column) for column in table['columns'])
+    return ' '.join(parts)
+
+class TfidfIndex:
+    """Minimal TF-IDF index over a fixed set of documents"""
+
+    def __init__(self, documents):
+        token_lists = [tokenize(doc) for doc in documents]
+        document_frequency = Counter(term for tokens in token_lists for term in set(tokens))
+        count = len(documents)
+        self.idf = {term: math.log((1 + count) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        self.vectors = [self._vector(tokens) for tokens in token_lists]
+
+    def _vector(self, tokens):
+        counts = Counter(token for token in tokens if token in self.idf)
+        vector = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def scores(self, text):
+        """Cosine similarity of text against every document, in document order"""
+        query = self._vector(tokenize(text))
+        return [sum(weight * doc.get(term, 0.0) for term, weight in query.items()) for doc in self.vectors]
+
+class SchemaRetriever:
+    """
+    Picks the tables, columns and few-shot examples relevant to a question
+
+    Args:
+        schema (dict): Parsed schema.json
+        examples (list): Few-shot (question, SQL) pairs
+        max_examples (int): Number of examples to keep
+        min_score (float): Similarity a table needs to be selected
+        relative_score (float): Fraction of the best table's score a table also needs, so
+                                weak matches on terms shared by every table are ignored
+        min_columns_to_prune (int): Tables with fewer columns are always sent whole, since
+                                    queries usually select columns the question never names
+    """
+
+    def __init__(self, schema, examples, max_examples=4, min_score=0.08, relative_score=0.3, min_columns_to_prune=10):
+        self.schema = schema
+        self.examples = list(examples)
+        self.max_examples = max_examples
+        self.min_score = min_score
+        self.relative_score = relative_score
+        self.min_columns_to_prune = min_columns_to_prune
+        self.tables = {table['name']: table for table in schema['tables']}
+
+        self.table_names = list(self.tables)
+        self.table_index = TfidfIndex([_table_text(self.tables[name]) for name in self.table_names])
+        self.example_index = TfidfIndex([question for question, _ in self.examples])
+        self.example_tables = [self._tables_in_sql(sql) for _, sql in self.examples]
+
+        # Undirected join graph from the declared relationships, the tables each table
+        # references, and the key columns involved
+        self.graph = {name: set() for name in self.table_names}
+        self.references = {name: set() for name in self.table_names}
+        self.key_columns = {name: {'id'} for name in self.table_names}
+        for rel in schema.get('relationships', []):
+            from_table, from_column = rel['from'].split('.')
+            to_table, to_column = rel['to'].split('.')
+            self.references.setdefault(from_table, set()).add(to_table)
+            self.graph.setdefault(from_table, set()).add(to_table)
+            self.graph.setdefault(to_table, set()).add(from_table)
+            self.key_columns.setdefault(from_table, {'id'}).add(from_column)
+            self.key_columns.setdefault(to_table, {'id'}).add(to_column)
+
+    def _tables_in_sql(self, sql):
+        words = set(re.findall(r'[a-z_]+', sql.lower()))
+        return {name for name in self.table_names if name in words}
+
+    def _mentioned_tables(self, text):
+        text = (text or '').lower()
+        return {
+            name for name in self.table_names
+            if re.search(rf"\b({name}|{name.replace('_', ' ')})\b", text)
+        }
+
+    def _join_path(self, start, goal):
+        """Shortest chain of tables connecting start to goal through the relationships"""
+        previous = {start: None}
+        pending = deque([start])
+        while pending:
+            current = pending.popleft()
+            if current == goal:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = previous[current]
+                return path
+            for neighbour in self.graph.get(current, ()):
+                if neighbour not in previous:
+                    previous[neighbour] = current
+                    pending.append(neighbour)
+        return [start]
+
+    def select_tables(self, text):
+        """
+        Return the names of matching tables plus the tables they reference and any
+        tables needed to join them, in schema order
+        """
+        scores = self.table_index.scores(text)
+        threshold = max(self.min_score, self.relative_score * max(scores, default=0.0))
+        selected = {name for name, score in zip(self.table_names, scores) if score >= threshold}
+
+        # Mentioning a table by name (e.g. in previous SQL from the conversation) always selects it
+        selected |= self._mentioned_tables(text)
+
+        if not selected:
+            return list(self.table_names)
+
+        # Results almost always need the referenced entity's columns (e.g. movies.title for ratings)
+        for name in list(selected):
+            selected |= self.references.get(name, set())
+
+        anchor = next(name for name in self.table_names if name in selected)
+        for name in list(selected):
+            selected.update(self._join_path(anchor, name))
+        return [name for name in self.table_names if name in selected]
+
+    def _prune_columns(self, table, text):
+        if len(table['columns']) < self.min_columns_to_prune:
+            return table
+        index = TfidfIndex([_column_text(column) for column in table['columns']])
+        keys = self.key_columns.get(table['name'], {'id'})
+        columns = [
+            column for column, score in zip(table['columns'], index.scores(text))
+            if score > 0 or column['name'] in keys
+        ]
+        return {**table, 'columns': columns}
+
+    def select_schema(self, text):
+        """Return a schema dict restricted to the tables, columns and relationships relevant to text"""
+        names = set(self.select_tables(text))
+        relationships = [
+            rel for rel in self.schema.get('relationships', [])
+            if rel['from'].split('.')[0] in names and rel['to'].split('.')[0] in names
+        ]
+        return {
+            **self.schema,
+            'tables': [self._prune_columns(self.tables[name], text) for name in self.table_names if name in names],
+            'relationships': relationships,
+        }
+
+    def select_examples(self, text, tables=None):
+        """
+        Return the few-shot examples most similar to the question
+
+        Examples that only use the selected tables are preferred, so the model
+        is shown join patterns it can actually apply.
+        """
+        tables = set(tables or self.table_names)
+        scored = []
+        for position, score in enumerate(self.example_index.scores(text)):
+            fits_schema = self.example_tables[position] <= tables
+            scored.append((score + (0.1 if fits_schema else 0.0), -position))
+        best = sorted(scored, reverse=True)[:self.max_examples]
+        # Keep the original order so related examples stay next to each other
+        return [self.examples[-position] for _, position in sorted(best, key=lambda item: -item[1])]
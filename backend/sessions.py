@@ -0,0 +1,173 @@
+"""
+Server-side conversation sessions
+
+The client sends a session id instead of its whole chat history. Each session
+keeps a ring buffer of its last few messages together with the rendered
+"Previous Conversation" prompt block, which is updated incrementally as
+messages are added instead of being rebuilt on every request. Sessions are
+evicted least recently used first, after a TTL, and when the store exceeds
+its session count or memory budget.
+"""
+import os
+import re
+import time
+import threading
+from collections import OrderedDict, deque
+from nl_to_sql import CONTEXT_MESSAGES, CONTEXT_HEADER, render_context_message
+
+SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', '3600'))
+SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', '10000'))
+SESSION_MAX_BYTES = int(os.getenv('SESSION_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# Client-generated ids (e.g. crypto.randomUUID()); long enough not to be guessed
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,128}$')
+
+# Rough per-session bookkeeping cost on top of the stored text
+_SESSION_OVERHEAD_BYTES = 512
+
+class Session:
+    """
+    The last CONTEXT_MESSAGES messages of one conversation and their rendered prompt block
+
+    Args:
+        max_messages (int): Ring buffer size; older messages drop out of the context
+    """
+
+    def __init__(self, max_messages=CONTEXT_MESSAGES):
+        self.messages = deque(maxlen=max_messages)
+        self._rendered = deque()
+        self._body = ''
+        self.last_used = time.monotonic()
+
+    def append(self, message):
+        """Add a message, rendering only that message and dropping the oldest when full"""
+        if len(self.messages) == self.messages.maxlen:
+            oldest = self._rendered.popleft()
+            self._body = self._body[len(oldest):]
+        rendered = render_context_message(message)
+        self.messages.append(message)
+        self._rendered.append(rendered)
+        self._body += rendered
+
+    @property
+    def context(self):
+        """The conversation block for the prompt, identical to build_conversation_context(history)"""
+        if not self.messages:
+            return ''
+        return CONTEXT_HEADER + self._body + '\n'
+
+    def history(self):
+        """The buffered messages, in the format /query's history field uses"""
+        return list(self.messages)
+
+    def size_bytes(self):
+        """Estimated memory held by the session's messages and rendered context"""
+        return _SESSION_OVERHEAD_BYTES + 2 * len(self._body) + sum(
+            len(value or '') for message in self.messages for value in message.values()
+        )
+
+class SessionStore:
+    """
+    Thread-safe LRU/TTL store of Sessions with a session count and memory cap
+
+    Args:
+        ttl_seconds (int): Idle time after which a session is dropped (0 keeps them until evicted)
+        max_sessions (int): Most sessions kept at once
+        max_bytes (int): Memory budget across all sessions
+    """
+
+    def __init__(self, ttl_seconds=3600, max_sessions=10000, max_bytes=32 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.created = 0
+        self.expired = 0
+        self.evictions = 0
+        self._sessions = OrderedDict()  # session id -> (Session, size in bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, session_id):
+        _, size = self._sessions.pop(session_id)
+        self._bytes -= size
+
+    def _expire(self, now):
+        # Oldest-used sessions are at the front, so stop at the first live one
+        while self._sessions and self.ttl_seconds:
+            session_id, (session, _) = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.ttl_seconds:
+                break
+            self._drop(session_id)
+            self.expired += 1
+
+    def _evict(self):
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+
+    def snapshot(self, session_id):
+        """
+        Return (history, rendered context) for a session, creating it if it is new or expired
+
+        Both are copies, so the caller can use them after other requests add messages.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                session = Session()
+                self._sessions[session_id] = (session, session.size_bytes())
+                self._bytes += session.size_bytes()
+                self.created += 1
+                self._evict()
+            else:
+                session = entry[0]
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session.history(), session.context
+
+    def record_exchange(self, session_id, question, sql='', explanation=''):
+        """Append a user question and the assistant's reply (empty SQL when it failed)"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return  # Evicted while the request was running
+            session, size = entry
+            session.append({'role': 'user', 'content': question})
+            session.append({'role': 'assistant', 'sql': sql, 'explanation': explanation})
+            session.last_used = time.monotonic()
+            new_size = session.size_bytes()
+            self._sessions[session_id] = (session, new_size)
+            self._sessions.move_to_end(session_id)
+            self._bytes += new_size - size
+            self._evict()
+
+    def delete(self, session_id):
+        """Forget a session; returns whether it existed"""
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id)
+            return True
+
+    def stats(self):
+        """Session count, memory use and expiry/eviction counters"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'sessions': len(self._sessions),
+                'bytes': self._bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'created': self.created,
+                'expired': self.expired,
+                'evictions': self.evictions,
+            }
+
+session_store = SessionStore(
+    ttl_seconds=SESSION_TTL_SECONDS,
+    max_sessions=SESSION_MAX_SESSIONS,
+    max_bytes=SESSION_MAX_BYTES,
+)
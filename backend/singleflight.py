@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+class _Call:
+    """An in-flight computation that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Deduplicate concurrent identical calls
+
+    While a call for a key is running, later callers with the same key wait for
+    it and share its result (or exception) instead of starting their own. Once
+    the call finishes the key is forgotten, so this never serves stale results;
+    caching is left to QueryCache and friends.
+
+    Results are shared between callers and must be treated as read-only.
+    Followers give up with TimeoutError after timeout seconds (None waits for
+    as long as the leader takes).
+    """
+
+    def __init__(self, name, timeout=None):
+        self.name = name
+        self.timeout = timeout
+        self.executions = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run fn() for key, or wait for the identical call already in flight"""
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result)
+        return result
+
+    def begin(self, key):
+        """
+        Join the call in flight for key, or become its leader
+
+        For leaders that produce the result themselves rather than through a
+        function, e.g. while streaming it. The leader must pass its result to
+        finish(); followers receive it from wait().
+
+        Returns:
+            tuple: (call, leader)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.executions += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Hand a leader's result (or exception) to the followers of its call and forget the key"""
+        call.result = result
+        call.error = error
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    def _timed_out(self):
+        return TimeoutError(f"Timed out after {self.timeout:g}s waiting for the identical {self.name} call in flight")
+
+    def wait(self, call):
+        """Wait for the leader of a call joined with begin() and return its result"""
+        if not call.done.wait(self.timeout):
+            raise self._timed_out()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key, coro_fn):
+        """Async variant of do: await coro_fn() for key, or the identical call already in flight"""
+        future = self._async_calls.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            return await self.await_call(future)
+
+        with self._lock:
+            self.executions += 1
+        future = asyncio.ensure_future(coro_fn())
+        self._async_calls[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._async_calls.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._async_calls.pop(key, None))
+
+    async def await_call(self, future):
+        """Async variant of wait for the future of a call joined with abegin()"""
+        try:
+            # Shield so a cancelled or timed out follower doesn't cancel the shared call
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out() from None
+
+    def abegin(self, key):
+        """
+        Async variant of begin: (future, leader)
+
+        The leader resolves the future with set_result(); followers await it
+        with await_call().
+        """
+        future = self._async_calls.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            return future, False
+
+        with self._lock:
+            self.executions += 1
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        future.add_done_callback(lambda _: self._async_calls.pop(key, None))
+        return future, True
+
+    def stats(self):
+        """Return how many calls ran and how many were coalesced onto an in-flight call"""
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'coalesced_ratio': round(self.coalesced / calls, 4) if calls else 0.0,
+                'in_flight': len(self._calls) + len(self._async_calls),
+            }
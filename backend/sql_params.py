@@ -0,0 +1,153 @@
+"""
+SQL tokenizing and literal lifting
+
+Generated SQL arrives with its values written inline (`LIKE '%nolan%'`,
+`> 500`). parameterize_sql turns it into a query shape with `?` placeholders
+plus the values to bind, so the same question shape with different values
+reuses one prepared statement, one cached plan check and one validation
+result. Literals are only lifted where SQLite accepts a parameter:
+ORDER BY / GROUP BY column positions, result column expressions (whose text
+becomes the column name) and aliases stay as written.
+"""
+import re
+from functools import lru_cache
+
+# Ordered by how often each kind occurs, since the first matching alternative wins
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<blob>[xX]'[0-9a-fA-F]*')
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<op>[(),.=<>!+|%*]|-(?!-)|/(?!\*))
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<param>\?\d*|[:@$][A-Za-z_]\w*)
+  | (?P<unterminated>['"`\[]|/\*)
+  | (?P<symbol>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Keywords that end a SELECT's result column list or an ORDER BY / GROUP BY term list
+_CLAUSE_KEYWORDS = {
+    'from', 'where', 'group', 'order', 'having', 'limit', 'offset', 'window',
+    'union', 'intersect', 'except', 'values',
+}
+# What may follow a column position in ORDER BY / GROUP BY
+_POSITION_FOLLOWERS = {',', ')', ';', None, 'asc', 'desc', 'nulls', 'collate'} | _CLAUSE_KEYWORDS
+
+class SQLSyntaxError(ValueError):
+    """The SQL could not be tokenized (e.g. an unterminated string)"""
+
+def _scan(sql):
+    # (kind, text, whether whitespace or a comment came before it)
+    tokens = []
+    spaced = False
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ('space', 'comment'):
+            spaced = True
+            continue
+        if kind == 'unterminated':
+            raise SQLSyntaxError(f"Unterminated {match.group()} at position {match.start()}")
+        tokens.append(('op' if kind == 'symbol' else kind, match.group(), spaced))
+        spaced = False
+    return tokens
+
+def tokenize_sql(sql):
+    """
+    Split SQL into (kind, text) tokens, dropping whitespace and comments
+
+    Kinds: 'string', 'blob', 'quoted' (identifier), 'number', 'word' (keyword or
+    identifier), 'param' (an existing placeholder) and 'op'.
+
+    Raises:
+        SQLSyntaxError: On an unterminated string, identifier or comment
+    """
+    return [(kind, text) for kind, text, _ in _scan(sql)]
+
+def _literal_value(kind, text):
+    if kind == 'string':
+        return text[1:-1].replace("''", "'")
+    if text[:2].lower() == '0x':
+        return int(text, 16)
+    if any(c in text for c in '.eE'):
+        return float(text)
+    return int(text)
+
+@lru_cache(maxsize=4096)
+def parameterize_sql(sql):
+    """
+    Lift literals out of a SELECT into bound parameters
+
+    Args:
+        sql (str): SQL with inline literals
+
+    Returns:
+        tuple: (shape, params) where shape is the SQL with `?` in place of each
+               lifted literal and params is the tuple of their values, in order
+
+    Results are memoized by SQL text, so re-running the same query (a cached
+    question, the next page) does not tokenize it again.
+
+    Raises:
+        SQLSyntaxError: If the SQL cannot be tokenized
+    """
+    tokens = _scan(sql)
+    while tokens and tokens[-1][:2] == ('op', ';'):
+        tokens.pop()
+
+    parts = []
+    params = []
+    depth = 0
+    select_lists = []   # Paren depths of SELECTs whose result column list we are in
+    position_lists = set()  # Paren depths of ORDER BY / GROUP BY term lists
+    previous = None
+    for index, (kind, text, spaced) in enumerate(tokens):
+        lowered = text.lower() if kind in ('word', 'op') else None
+
+        if lowered == '(':
+            depth += 1
+        elif lowered == ')':
+            depth -= 1
+            while select_lists and select_lists[-1] > depth:
+                select_lists.pop()
+            position_lists = {d for d in position_lists if d <= depth}
+        elif kind == 'word':
+            if lowered == 'select':
+                select_lists.append(depth)
+            elif lowered in _CLAUSE_KEYWORDS:
+                if select_lists and select_lists[-1] == depth:
+                    select_lists.pop()
+                position_lists.discard(depth)
+            elif lowered == 'by' and previous in ('order', 'group'):
+                position_lists.add(depth)
+
+        lift = kind in ('string', 'number') and not (
+            (select_lists and depth >= select_lists[-1])
+            or previous == 'as'
+            or (kind == 'number' and depth in position_lists and previous in ('by', ',')
+                and _next_word(tokens, index) in _POSITION_FOLLOWERS)
+            or (kind == 'number' and _next_word(tokens, index) in ('preceding', 'following'))
+        )
+        # Runs of whitespace and comments become one space; unaliased result
+        # columns keep their exact text, which SQLite uses as the column name
+        if spaced and parts:
+            parts.append(' ')
+        if lift:
+            parts.append('?')
+            params.append(_literal_value(kind, text))
+        else:
+            parts.append(text)
+        previous = lowered
+
+    return ''.join(parts), tuple(params)
+
+def _next_word(tokens, index):
+    if index + 1 >= len(tokens):
+        return None
+    kind, text, _ = tokens[index + 1]
+    return text.lower() if kind in ('word', 'op') else text
+
+def params_key(params):
+    """Hashable cache key for bound values; 2 and 2.0 differ (e.g. in division) so types are kept"""
+    return tuple((type(value).__name__, value) for value in params)
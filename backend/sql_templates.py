@@ -0,0 +1,208 @@
+"""
+Local SQL templates for common question shapes
+
+Questions like "movies directed by X", "which movies did X act in", "movies
+that made over N million" and "count movies by genre" are answered without
+the LLM: a pattern extracts the parameters, people and genres are checked
+against the distinct values in the database, and the template's SQL is
+filled in. Anything that does not match, or names someone not in the
+database, falls through to Gemini.
+"""
+import os
+import re
+import threading
+from database import get_pool
+from query_cache import normalize_question
+from metrics import template_lookups
+
+SQL_TEMPLATES = os.getenv('SQL_TEMPLATES', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+_MOVIES = r'(?:movies|films)'
+
+# (name, question patterns, SQL with {parameters}, explanation)
+TEMPLATES = [
+    (
+        'directed_by',
+        [
+            rf'^(?:show |list |find )?(?:all )?(?:the )?{_MOVIES} directed by (?P<director>.+)$',
+            rf'^(?:which|what) {_MOVIES} (?:did|has) (?P<director>.+?) direct(?:ed)?$',
+        ],
+        "SELECT DISTINCT m.title, m.year FROM movies m JOIN cast c ON m.id = c.movie_id "
+        "WHERE c.person_name = {director} AND c.role_type = 'Director' ORDER BY m.year DESC",
+        "Lists the movies directed by {director}, newest first",
+    ),
+    (
+        'acted_in',
+        [
+            rf'^(?:which|what) {_MOVIES} (?:did|has) (?P<actor>.+?) (?:act|acted|star|starred|appear|appeared) in$',
+            rf'^(?:show |list |find )?(?:all )?(?:the )?{_MOVIES} (?:with|starring|featuring) (?P<actor>.+)$',
+        ],
+        "SELECT DISTINCT m.title, m.year FROM movies m JOIN cast c ON m.id = c.movie_id "
+        "WHERE c.person_name = {actor} AND c.role_type = 'Actor' ORDER BY m.year DESC",
+        "Lists the movies {actor} acted in, newest first",
+    ),
+    (
+        'revenue_over',
+        [
+            rf'^(?:show |list )?(?:all )?(?:the )?{_MOVIES} (?:that |which )?(?:made|grossed|earned) '
+            r'(?:over|more than|above) \$?(?P<revenue>\d+(?:\.\d+)?) ?(?P<unit>million|billion|m|bn|b)(?: dollars)?$',
+            rf'^(?:show |list )?(?:all )?(?:the )?{_MOVIES} with (?:a )?box office (?:over|more than|above) '
+            r'\$?(?P<revenue>\d+(?:\.\d+)?) ?(?P<unit>million|billion|m|bn|b)(?: dollars)?$',
+        ],
+        "SELECT f.title, f.year, f.total_revenue FROM movie_facts f "
+        "WHERE f.total_revenue > {revenue} ORDER BY f.total_revenue DESC",
+        "Lists movies with total revenue over {revenue} million USD, highest first",
+    ),
+    (
+        'count_by_genre',
+        [
+            rf'^(?:count|number of) {_MOVIES} (?:by|per|in each|for each) genre$',
+            rf'^how many {_MOVIES} (?:are there )?(?:by|per|in each|for each) genre$',
+        ],
+        "SELECT genre, movie_count as count FROM genre_summary ORDER BY count DESC",
+        "Counts the movies in each genre, largest first",
+    ),
+    (
+        'genre',
+        [
+            rf'^(?:show |list |find )?(?:all )?(?:the )?(?P<genre>[\w -]+?) {_MOVIES}$',
+            rf'^(?:show |list |find )?(?:all )?(?:the )?{_MOVIES} in the (?P<genre>[\w -]+?) genre$',
+        ],
+        "SELECT m.title, m.year FROM movies m WHERE m.genre = {genre} ORDER BY m.year DESC",
+        "Lists {genre} movies, newest first",
+    ),
+]
+
+_COMPILED = [
+    (name, [re.compile(pattern) for pattern in patterns], sql, explanation)
+    for name, patterns, sql, explanation in TEMPLATES
+]
+
+# Person parameters and the cast.role_type they must have
+_PERSON_ROLES = {'director': 'Director', 'actor': 'Actor'}
+_UNIT_MILLIONS = {'million': 1, 'm': 1, 'billion': 1000, 'bn': 1000, 'b': 1000}
+
+def sql_literal(value):
+    """Render a validated parameter as a SQL literal"""
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _fold(text):
+    # "Sci-Fi", "sci fi" and "scifi" are the same genre
+    return re.sub(r'[^a-z0-9]', '', text.lower())
+
+# The FTS index finds the rows containing the name's words, LIKE (case-insensitive)
+# then keeps the exact name or, for a bare last name, names ending in it
+_PERSON_SQL = (
+    "SELECT DISTINCT c.person_name FROM cast_fts JOIN cast c ON c.id = cast_fts.rowid "
+    "WHERE cast_fts MATCH ? AND c.role_type = ? AND c.person_name LIKE ? ESCAPE '\\' LIMIT 2"
+)
+
+def _like_literal(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def find_person(conn, text, role):
+    """The stored name for a full or unambiguous last name with that role, else None"""
+    key = ' '.join(text.lower().split())
+    if not re.search(r'\w', key):
+        return None
+    match = 'person_name : "' + key.replace('"', '""') + '"'
+    names = conn.execute(_PERSON_SQL, (match, role, _like_literal(key))).fetchall()
+    if names:
+        return names[0][0]
+    if ' ' in key:
+        return None
+    names = conn.execute(_PERSON_SQL, (match, role, '% ' + _like_literal(key))).fetchall()
+    return names[0][0] if len(names) == 1 else None
+
+def find_genre(conn, text):
+    """The stored genre for text, ignoring case and punctuation, else None"""
+    genres = {_fold(row[0]): row[0] for row in conn.execute('SELECT genre FROM genre_summary')}
+    return genres.get(_fold(text))
+
+class TemplateMatcher:
+    """
+    Answers questions that match a template
+
+    People and genres pulled from a question are looked up when it matches:
+    a name through the cast FTS index, a genre in the small genre_summary
+    table. Nothing is cached, so newly loaded people match at once and writes
+    cost the matcher nothing.
+    """
+
+    def __init__(self, templates=_COMPILED):
+        self.templates = templates
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_template = {}
+        self._lock = threading.Lock()
+
+    def _bind(self, params):
+        """Validate and convert extracted parameters; None when an entity is unknown"""
+        bound = {}
+        for key, value in params.items():
+            if key == 'unit':
+                continue
+            if key in _PERSON_ROLES:
+                with get_pool().connection() as conn:
+                    value = find_person(conn, value, _PERSON_ROLES[key])
+            elif key == 'genre':
+                with get_pool().connection() as conn:
+                    value = find_genre(conn, value)
+            elif key == 'revenue':
+                value = float(value) * _UNIT_MILLIONS[params['unit']]
+                value = int(value) if value.is_integer() else value
+            if value is None:
+                return None
+            bound[key] = value
+        return bound
+
+    def match(self, question):
+        """
+        Answer a question from a template
+
+        Returns:
+            dict: generate()-style {'sql', 'explanation', 'success', 'template'}, or None to use the LLM
+        """
+        text = normalize_question(question)
+        for name, patterns, sql, explanation in self.templates:
+            for pattern in patterns:
+                found = pattern.match(text)
+                if not found:
+                    continue
+                params = self._bind(found.groupdict())
+                if params is None:
+                    continue
+                self._record(name)
+                return {
+                    'sql': sql.format(**{key: sql_literal(value) for key, value in params.items()}),
+                    'explanation': explanation.format(**params),
+                    'success': True,
+                    'template': name,
+                }
+        self._record(None)
+        return None
+
+    def _record(self, name):
+        template_lookups.inc('hit' if name else 'miss')
+        with self._lock:
+            if name is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.hits_by_template[name] = self.hits_by_template.get(name, 0) + 1
+
+    def stats(self):
+        """Template hits and misses, and the share of questions that skipped the LLM"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': SQL_TEMPLATES,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'by_template': dict(self.hits_by_template),
+            }
+
+template_matcher = TemplateMatcher()
@@ -0,0 +1,61 @@
+"""
+Bulk loading into a database that a server is already reading from
+
+Run from backend/ with: python -m unittest discover tests
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configuration is read at import time, so point it at a throwaway database first
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(), 'movies.db')
+
+from database import DATABASE_PATH, init_db, execute_sql_query
+from bulk_load import bulk_load, next_movie_id, synthetic_catalog
+
+def movie_count():
+    return execute_sql_query('SELECT COUNT(*) AS n FROM movies')['data'][0]['n']
+
+class LoadAfterQueryTest(unittest.TestCase):
+    """The read pool stays connected after the first query, as on a live server"""
+
+    @classmethod
+    def setUpClass(cls):
+        init_db()
+
+    def setUp(self):
+        self.assertTrue(execute_sql_query('SELECT COUNT(*) FROM movies')['success'])
+
+    def test_append_continues_after_existing_ids(self):
+        before = movie_count()
+        result = bulk_load(synthetic_catalog(20, 3, first_id=next_movie_id()))
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['journal_mode'], 'wal')
+        self.assertEqual(movie_count(), before + 20)
+
+    def test_replace(self):
+        result = bulk_load(synthetic_catalog(30, 3), replace=True)
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(movie_count(), 30)
+
+    def test_failed_replace_keeps_existing_rows(self):
+        before = movie_count()
+        duplicate = {'id': 1, 'title': 'Duplicate', 'year': 2000, 'genre': 'Drama', 'director': 'Nobody'}
+        result = bulk_load({'movies': [duplicate, duplicate]}, replace=True)
+        self.assertFalse(result['success'])
+        self.assertEqual(movie_count(), before)
+
+    def test_journal_mode_is_restored(self):
+        bulk_load(synthetic_catalog(5, 2, first_id=next_movie_id()))
+        conn = sqlite3.connect(DATABASE_PATH)
+        try:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        finally:
+            conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,41 @@ import Sidebar from './components/Sidebar'
 import ChatWindow from './components/ChatWindow'
 import './App.css'
 
+// Parse a server-sent events response body, calling onEvent with each event's JSON data as it arrives
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  const dispatch = (block) => {
+    const data = block
+      .split('\n')
+      .filter(line => line.startsWith('data:'))
+      .map(line => line.slice(5).trim())
+      .join('\n')
+    if (data) onEvent(JSON.parse(data))
+  }
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // Events are separated by a blank line
+    const blocks = buffer.split('\n\n')
+    buffer = blocks.pop()
+    blocks.forEach(dispatch)
+  }
+
+  if (buffer.trim()) dispatch(buffer)
+}
+
+// Id of the backend's server-side session holding a chat's history
+const newSessionKey = () => crypto.randomUUID()
+
 function App() {
   const [sessions, setSessions] = useState([
-    { id: 1, title: 'New Chat 1', messages: [] }
+    { id: 1, key: newSessionKey(), title: 'New Chat 1', messages: [] }
   ])
   const [activeSessionId, setActiveSessionId] = useState(1)
 
@@ -14,6 +46,7 @@ function App() {
   const handleNewChat = () => {
     const newSession = {
       id: Date.now(),
+      key: newSessionKey(),
       title: `New Chat ${sessions.length + 1}`,
       messages: []
     }
@@ -21,25 +54,152 @@ function App() {
     setActiveSessionId(newSession.id)
   }
 
-  const handleSendMessage = async (message) => {
-    // Get the current active session to extract its history
-    const currentSession = sessions.find(s => s.id === activeSessionId)
-    
-    // Convert message history to the format expected by backend
-    const conversationHistory = currentSession?.messages.map(msg => {
-      if (msg.isUser) {
+  // Append a message to a session
+  const addMessage = (sessionId, message) => {
+    setSessions(prev => prev.map(s => {
+      if (s.id === sessionId) {
+        return { ...s, messages: [...s.messages, message] }
+      }
+      return s
+    }))
+  }
+
+  // Apply an update function to one message of a session
+  const updateMessage = (sessionId, messageId, update) => {
+    setSessions(prev => prev.map(s => {
+      if (s.id === sessionId) {
         return {
-          role: 'user',
-          content: msg.text
+          ...s,
+          messages: s.messages.map(m => (m.id === messageId ? update(m) : m))
         }
-      } else {
-        return {
-          role: 'assistant',
-          sql: msg.queryResult?.sql || '',
-          explanation: msg.queryResult?.explanation || ''
+      }
+      return s
+    }))
+  }
+
+  // Render /query/events progress, then the result batches, into a single bot message as they arrive
+  const handleStreamedResponse = async (response, sessionId) => {
+    const botMessageId = Date.now()
+    let started = false
+
+    const updateProgress = (update) => {
+      updateMessage(sessionId, botMessageId, m => ({ ...m, progress: { ...m.progress, ...update(m.progress) } }))
+    }
+
+    await readEventStream(response, (event) => {
+      if (event.type === 'stage' && event.stage === 'generate') {
+        started = true
+        addMessage(sessionId, {
+          id: botMessageId,
+          text: null,
+          progress: { stage: 'generate', source: event.source, response: '', rowCount: 0 },
+          isUser: false
+        })
+      } else if (event.type === 'stage') {
+        updateProgress(() => ({ stage: event.stage }))
+      } else if (event.type === 'token') {
+        updateProgress(progress => ({ response: progress.response + event.text }))
+      } else if (event.type === 'sql') {
+        updateProgress(() => ({ sql: event.sql }))
+      } else if (event.type === 'meta') {
+        updateMessage(sessionId, botMessageId, m => ({
+          ...m,
+          queryResult: {
+            sql: event.sql,
+            explanation: event.explanation,
+            data: [],
+            columns: event.columns,
+            row_count: 0,
+            streaming: true
+          }
+        }))
+      } else if (event.type === 'rows') {
+        updateMessage(sessionId, botMessageId, m => ({
+          ...m,
+          progress: { ...m.progress, rowCount: m.progress.rowCount + event.rows.length },
+          queryResult: {
+            ...m.queryResult,
+            data: [...m.queryResult.data, ...event.rows],
+            row_count: m.queryResult.row_count + event.rows.length
+          }
+        }))
+      } else if (event.type === 'done') {
+        updateMessage(sessionId, botMessageId, m => ({
+          ...m,
+          progress: { ...m.progress, stage: 'done' },
+          queryResult: {
+            ...m.queryResult,
+            explanation: event.explanation,
+            row_count: event.row_count,
+            streaming: false,
+            hasMore: event.has_more,
+            nextCursor: event.next_cursor
+          }
+        }))
+      } else if (event.type === 'error') {
+        if (started) {
+          updateMessage(sessionId, botMessageId, m => ({
+            ...m,
+            text: event.error,
+            progress: { ...m.progress, failed: true },
+            queryResult: m.queryResult && { ...m.queryResult, streaming: false }
+          }))
+        } else {
+          addMessage(sessionId, { id: botMessageId, text: event.error, isUser: false })
         }
       }
-    }) || []
+    })
+  }
+
+  // Fetch the next page of a result table and append it to the message
+  const handleLoadMore = async (messageId) => {
+    const sessionId = activeSessionId
+    const message = sessions.find(s => s.id === sessionId)?.messages.find(m => m.id === messageId)
+    const cursor = message?.queryResult?.nextCursor
+    if (!cursor) return
+
+    updateMessage(sessionId, messageId, m => ({
+      ...m,
+      queryResult: { ...m.queryResult, loadingMore: true }
+    }))
+
+    try {
+      const response = await fetch('http://localhost:5001/query/page', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ cursor, format: 'rows' })
+      })
+      const data = await response.json()
+
+      if (data.status !== 'success') {
+        throw new Error(data.error || 'Could not load more results')
+      }
+
+      updateMessage(sessionId, messageId, m => ({
+        ...m,
+        queryResult: {
+          ...m.queryResult,
+          data: [...m.queryResult.data, ...data.rows],
+          row_count: m.queryResult.row_count + data.row_count,
+          hasMore: data.has_more,
+          nextCursor: data.next_cursor,
+          loadingMore: false
+        }
+      }))
+    } catch (error) {
+      console.error('Error loading more results:', error)
+      updateMessage(sessionId, messageId, m => ({
+        ...m,
+        queryResult: { ...m.queryResult, loadingMore: false }
+      }))
+    }
+  }
+
+  const handleSendMessage = async (message) => {
+    // The backend keeps the chat's history; only its session id is sent
+    const currentSession = sessions.find(s => s.id === activeSessionId)
 
     // Add user message immediately and update title if it's the first message
     setSessions(sessions.map(session => {
@@ -63,23 +223,31 @@ function App() {
       return session
     }))
 
-    // Call backend API with conversation history
+    // Call backend API with the chat's session id
     try {
-      const response = await fetch('http://localhost:5001/query', {
+      // Progress, SQL and rows arrive as server-sent events while the query is generated and run
+      const response = await fetch('http://localhost:5001/query/events', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({ 
           message,
-          history: conversationHistory  // Send chat history for context
+          session_id: currentSession.key,  // History for context lives on the server
+          format: 'rows'  // Send each row as an array instead of repeating column names
         })
       })
 
+      // Accepted requests stream back as events; invalid ones still get a single JSON error body
+      if (response.headers.get('Content-Type')?.includes('text/event-stream')) {
+        await handleStreamedResponse(response, activeSessionId)
+        return
+      }
+
       const data = await response.json()
 
       // Handle response based on status
-      if (data.status === 'success' && data.data) {
+      if (data.status === 'success') {
         // Add bot response with query results
         setSessions(prev => prev.map(s => {
           if (s.id === activeSessionId) {
@@ -93,9 +261,13 @@ function App() {
                   queryResult: {
                     sql: data.sql,
                     explanation: data.explanation,
-                    data: data.data,
+                    // Compact formats send rows as arrays ('rows') or one array per column ('columnar')
+                    data: data.rows ?? data.data,
+                    columnValues: data.column_values,
                     columns: data.columns,
-                    row_count: data.row_count
+                    row_count: data.row_count,
+                    hasMore: data.has_more,
+                    nextCursor: data.next_cursor
                   },
                   isUser: false 
                 }
@@ -156,6 +328,7 @@ function App() {
       <ChatWindow
         session={activeSession}
         onSendMessage={handleSendMessage}
+        onLoadMore={handleLoadMore}
       />
     </div>
   )
@@ -2,7 +2,55 @@ import { useState, useRef, useEffect } from 'react'
 import ResultsTable from './ResultsTable'
 import './ChatWindow.css'
 
-function ChatWindow({ session, onSendMessage }) {
+// Stages reported by /query/events, in order; 'done' marks them all complete
+const PROGRESS_STAGES = ['generate', 'validate', 'execute', 'done']
+
+const GENERATE_LABELS = {
+  llm: 'Generating SQL',
+  cache: 'Reusing cached SQL',
+  template: 'Matching a query template',
+  coalesced: 'Waiting on an identical question'
+}
+
+const PROGRESS_ICONS = { complete: '✓', active: '…', failed: '✕', pending: '○' }
+
+// Checklist of the generate, validate and execute stages of a streamed answer
+function QueryProgress({ progress }) {
+  const current = PROGRESS_STAGES.indexOf(progress.stage)
+  const steps = [
+    { label: GENERATE_LABELS[progress.source] ?? 'Generating SQL' },
+    { label: 'Validating SQL' },
+    {
+      label: 'Running query',
+      detail: progress.rowCount > 0 ? `${progress.rowCount} rows` : null
+    }
+  ]
+
+  return (
+    <div className="query-progress">
+      <ol className="progress-steps">
+        {steps.map((step, index) => {
+          const status = index < current ? 'complete'
+            : index > current ? 'pending'
+            : progress.failed ? 'failed' : 'active'
+          return (
+            <li key={step.label} className={`progress-step ${status}`}>
+              <span className="progress-icon">{PROGRESS_ICONS[status]}</span>
+              {step.label}
+              {step.detail && <span className="progress-detail"> · {step.detail}</span>}
+            </li>
+          )
+        })}
+      </ol>
+      {/* The model's response as it streams, until its SQL is complete */}
+      {progress.stage === 'generate' && !progress.failed && progress.response && (
+        <pre className="progress-response">{progress.response}</pre>
+      )}
+    </div>
+  )
+}
+
+function ChatWindow({ session, onSendMessage, onLoadMore }) {
   const [inputValue, setInputValue] = useState('')
   const messagesEndRef = useRef(null)
 
@@ -51,14 +99,20 @@ function ChatWindow({ session, onSendMessage }) {
                   {message.isUser ? '👤' : '🤖'}
                 </div>
                 <div className="message-content">
+                  {message.progress && <QueryProgress progress={message.progress} />}
                   {message.text && <div className="message-text">{message.text}</div>}
                   {message.queryResult && (
                     <ResultsTable
                       data={message.queryResult.data}
+                      columnValues={message.queryResult.columnValues}
                       columns={message.queryResult.columns}
                       sql={message.queryResult.sql}
                       explanation={message.queryResult.explanation}
                       rowCount={message.queryResult.row_count}
+                      streaming={message.queryResult.streaming}
+                      hasMore={message.queryResult.hasMore}
+                      loadingMore={message.queryResult.loadingMore}
+                      onLoadMore={() => onLoadMore(message.id)}
                     />
                   )}
                 </div>
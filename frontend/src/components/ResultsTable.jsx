@@ -1,7 +1,20 @@
 import './ResultsTable.css'
 
-function ResultsTable({ data, columns, sql, explanation, rowCount }) {
-  if (!data || data.length === 0) {
+// Rows are objects keyed by column name, or arrays in column order in the compact formats
+const cellValue = (row, col, colIdx) => (Array.isArray(row) ? row[colIdx] : row[col])
+
+// Rebuild row arrays from the columnar format (one array of values per column)
+const columnarToRows = (columnValues) => {
+  const count = columnValues[0]?.length ?? 0
+  return Array.from({ length: count }, (_, rowIdx) => columnValues.map(values => values[rowIdx]))
+}
+
+function ResultsTable({
+  data: rowData, columnValues, columns, sql, explanation, rowCount, streaming, hasMore, loadingMore, onLoadMore
+}) {
+  const data = columnValues ? columnarToRows(columnValues) : rowData
+
+  if ((!data || data.length === 0) && !streaming) {
     return (
       <div className="results-container">
         {explanation && (
@@ -36,7 +49,8 @@ function ResultsTable({ data, columns, sql, explanation, rowCount }) {
       )}
       
       <div className="results-summary">
-        Found <strong>{rowCount}</strong> result{rowCount !== 1 ? 's' : ''}
+        {hasMore ? 'Showing first' : 'Found'} <strong>{rowCount}</strong> result{rowCount !== 1 ? 's' : ''}
+        {streaming && <span className="results-loading"> (loading more...)</span>}
       </div>
 
       <div className="table-wrapper">
@@ -52,13 +66,19 @@ function ResultsTable({ data, columns, sql, explanation, rowCount }) {
             {data.map((row, rowIdx) => (
               <tr key={rowIdx}>
                 {columns.map((col, colIdx) => (
-                  <td key={colIdx}>{row[col] ?? 'N/A'}</td>
+                  <td key={colIdx}>{cellValue(row, col, colIdx) ?? 'N/A'}</td>
                 ))}
               </tr>
             ))}
           </tbody>
         </table>
       </div>
+
+      {hasMore && !streaming && (
+        <button className="load-more-btn" onClick={onLoadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading...' : 'Load more results'}
+        </button>
+      )}
     </div>
   )
 }